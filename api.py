@@ -0,0 +1,359 @@
+"""Asyncio JSON and WebSocket API over the same games as the Streamlit app.
+
+For the mobile app and any other client that isn't a browser on mafia.py.
+It is a Starlette app served by uvicorn, both of which come with Streamlit,
+and it plays through the same engine and storage (MAFIA_DB and friends), so
+API and Streamlit players can sit in one game:
+
+    python api.py --host 0.0.0.0 --port 8765
+
+Requests and responses are JSON. Create and join return a token. Every
+other call needs it as "Authorization: Bearer <token>", and the WebSocket
+takes it as ?token=:
+
+    POST /games                 {"name"}              -> {"game_id", "name", "token", "state"}
+    POST /games/{id}/join       {"name"}              -> {"game_id", "name", "token", "state"}
+    GET  /games/{id}                                  -> {"state"}
+    POST /games/{id}/start                            -> {"state"}   (host only)
+    POST /games/{id}/actions    {"action", "target"}  -> {"state"}
+    WS   /games/{id}/ws?token=...
+
+state is engine.player_view, what that player may see. Refused moves come
+back as 409 with {"error"}. On connect the WebSocket sends {"type": "state",
+"state"}. After every vote or phase change, whichever process made it, it
+sends {"type": "diff", "version", "changes"}, where changes holds the
+top-level keys of the view that changed; a change the player can't see
+sends nothing. When the game is deleted it sends
+{"type": "gone"} and closes.
+
+A game with subscribers gets one watcher task. The watcher checks the game's
+version every MAFIA_API_POLL_SECONDS, or straight away after a write through
+this API, and loads the game once for all of its subscribers. An idle
+connection costs a socket and a queue, with no thread and no poll of its own.
+Storage calls run in worker threads so SQLite never blocks the event loop.
+Tokens are an HMAC of the game id and player name under MAFIA_API_SECRET. If
+that is not set, a random secret is used and tokens stop working when the
+process restarts.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sys
+import uuid
+
+try:
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route, WebSocketRoute
+except ImportError:  # pragma: no cover - both are Streamlit dependencies
+    sys.exit("api.py needs Starlette and uvicorn, which come with Streamlit: pip install streamlit")
+
+import storage
+from engine import JOIN, START, InvalidAction, everyone_voted, player_view, submit_action
+from scheduler import set_deadline, start_scheduler
+
+POLL_SECONDS = float(os.environ.get("MAFIA_API_POLL_SECONDS", "0.5"))
+SECRET = os.environ.get("MAFIA_API_SECRET", "").encode() or secrets.token_bytes(32)
+# Pushes a subscriber may fall behind by before it gets a full state instead of diffs.
+QUEUE_SIZE = 64
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- TOKENS ---
+def _sign(game_id, name):
+    return hmac.new(SECRET, f"{game_id}\0{name}".encode(), hashlib.sha256).hexdigest()
+
+def issue_token(game_id, name):
+    encoded = base64.urlsafe_b64encode(name.encode()).decode().rstrip("=")
+    return f"{encoded}.{_sign(game_id, name)}"
+
+def token_player(game_id, token):
+    """The player this game's token was issued to, or None if it isn't one"""
+    encoded, _, signature = (token or "").partition(".")
+    try:
+        name = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+    except ValueError:  # bad base64 or not UTF-8
+        return None
+    return name if hmac.compare_digest(signature, _sign(game_id, name)) else None
+
+
+# --- SUBSCRIPTIONS ---
+class Subscriber:
+    """One WebSocket: who is on it, what it was last sent, and its outgoing queue"""
+
+    __slots__ = ("name", "view", "queue")
+
+    def __init__(self, name):
+        self.name = name
+        self.view = None
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def push(self, view):
+        """Queue the changes since the last view sent, or the whole view if there's none"""
+        if self.view is None:
+            message = {"type": "state", "state": view}
+        else:
+            changes = {k: v for k, v in view.items() if k != "version" and self.view.get(k) != v}
+            changes.update({k: None for k in self.view.keys() - view.keys()})
+            if not changes:
+                return  # e.g. someone else's vote, which this player doesn't get to see
+            message = {"type": "diff", "version": view["version"], "changes": changes}
+        try:
+            self.queue.put_nowait(json.dumps(message))
+            self.view = view
+        except asyncio.QueueFull:
+            self.view = None  # too far behind; the next push resends everything
+
+    def close(self, last=None):
+        """Ask the connection to close once it has sent what's queued, then last"""
+        for message in (last, None) if last else (None,):
+            if self.queue.full():
+                self.queue.get_nowait()  # nobody reads a dropped diff once the socket is closing
+            self.queue.put_nowait(message)
+
+
+class GameChannel:
+    """The subscribers of one game and its watcher task"""
+
+    def __init__(self, game_id):
+        self.game_id = game_id
+        self.subscribers = set()
+        self.version = None
+        self.wake = asyncio.Event()
+        self.task = None
+
+
+class Hub:
+    """Every game with subscribers in this process; one watcher task per game"""
+
+    def __init__(self, poll=POLL_SECONDS):
+        self.poll = poll
+        self.channels = {}
+
+    def subscribe(self, game_id, subscriber, game):
+        channel = self.channels.get(game_id)
+        if channel is None:
+            channel = self.channels[game_id] = GameChannel(game_id)
+            channel.version = game.version
+            channel.task = asyncio.create_task(self.watch(channel))
+        channel.subscribers.add(subscriber)
+        subscriber.push(player_view(game, subscriber.name))
+
+    def unsubscribe(self, game_id, subscriber):
+        channel = self.channels.get(game_id)
+        if channel is not None:
+            channel.subscribers.discard(subscriber)
+            channel.wake.set()  # lets the watcher notice it has nobody left
+
+    def notify(self, game_id):
+        """Check a game right away, e.g. after this process wrote to it"""
+        channel = self.channels.get(game_id)
+        if channel is not None:
+            channel.wake.set()
+
+    async def watch(self, channel):
+        try:
+            while channel.subscribers:
+                try:
+                    await asyncio.wait_for(channel.wake.wait(), self.poll)
+                except asyncio.TimeoutError:
+                    pass
+                channel.wake.clear()
+                if not channel.subscribers:
+                    break
+                try:
+                    if await asyncio.to_thread(storage.get_version, channel.game_id) == channel.version:
+                        continue
+                    game = await asyncio.to_thread(storage.load_game, channel.game_id)
+                except Exception as e:  # keep watching through a locked or busy database
+                    print(f"api: {channel.game_id}: {e!r}")
+                    continue
+                if game is None:
+                    for subscriber in channel.subscribers:
+                        subscriber.close(json.dumps({"type": "gone"}))
+                    break
+                channel.version = game.version
+                views = {}
+                for subscriber in channel.subscribers:
+                    if subscriber.name not in views:
+                        views[subscriber.name] = player_view(game, subscriber.name)
+                    subscriber.push(views[subscriber.name])
+        finally:
+            if self.channels.get(channel.game_id) is channel:
+                del self.channels[channel.game_id]
+
+
+hub = Hub()
+
+
+# --- HTTP ---
+async def json_body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise ApiError(400, "Request body must be JSON.")
+    if not isinstance(body, dict):
+        raise ApiError(400, "Request body must be a JSON object.")
+    return body
+
+def player_name(body):
+    name = body.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ApiError(400, "name is required.")
+    return name.strip()
+
+def authorize(request):
+    """(game_id, name) for a request carrying a valid token for its game"""
+    game_id = request.path_params["game_id"]
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    name = token_player(game_id, token) if scheme.lower() == "bearer" else None
+    if name is None:
+        raise ApiError(401, "Missing or invalid player token.")
+    return game_id, name
+
+def load(game_id):
+    game = storage.load_game(game_id)
+    if game is None:
+        raise ApiError(404, "Game not found.")
+    return game
+
+def joined(game_id, name, game, status=200):
+    return JSONResponse(
+        {"game_id": game_id, "name": name, "token": issue_token(game_id, name), "state": player_view(game, name)},
+        status_code=status,
+    )
+
+async def create(request):
+    name = player_name(await json_body(request))
+    game_id = str(uuid.uuid4())[:6]
+    game = await asyncio.to_thread(storage.create_game, game_id, name)
+    return joined(game_id, name, game, 201)
+
+async def join(request):
+    game_id = request.path_params["game_id"]
+    name = player_name(await json_body(request))
+    game = await asyncio.to_thread(storage.record_event, game_id, JOIN, {"name": name})
+    if game is None:
+        raise ApiError(404, "Game not found.")
+    hub.notify(game_id)
+    return joined(game_id, name, game)
+
+async def show(request):
+    game_id, name = authorize(request)
+    game = await asyncio.to_thread(load, game_id)
+    return JSONResponse({"state": player_view(game, name)})
+
+async def start(request):
+    game_id, name = authorize(request)
+
+    def deal():
+        if load(game_id).host != name:
+            raise ApiError(403, "Only the host can start the game.")
+        # The seed is logged with the event so the deal can be replayed
+        game = storage.record_event(game_id, START, {"seed": secrets.randbits(32)}, after=set_deadline)
+        if game is None:
+            raise ApiError(404, "Game not found.")
+        return game
+
+    game = await asyncio.to_thread(deal)
+    hub.notify(game_id)
+    return JSONResponse({"state": player_view(game, name)})
+
+async def act(request):
+    game_id, name = authorize(request)
+    body = await json_body(request)
+
+    def vote():
+        game = load(game_id)
+        cast = submit_action(game, name, body.get("action"), body.get("target"))
+        if not storage.submit_vote(game_id, game.phase, game.day_count, name, cast["action"], cast["target"], game.deal):
+            raise InvalidAction("This phase is already over.")
+        # Whoever sees the last vote advances the phase, as on the Streamlit page.
+        # Check a fresh copy: votes cast alongside this one aren't in game.
+        game = load(game_id)
+        if everyone_voted(game):
+            return storage.transition_game(game_id, game.phase, game.day_count, after=set_deadline) or load(game_id)
+        return game
+
+    game = await asyncio.to_thread(vote)
+    hub.notify(game_id)
+    return JSONResponse({"state": player_view(game, name)})
+
+
+# --- WEBSOCKET ---
+async def subscribe(websocket):
+    game_id = websocket.path_params["game_id"]
+    name = token_player(game_id, websocket.query_params.get("token"))
+    game = await asyncio.to_thread(storage.load_game, game_id) if name is not None else None
+    if game is None:
+        await websocket.close(code=4401 if name is None else 4404)
+        return
+    await websocket.accept()
+    subscriber = Subscriber(name)
+    hub.subscribe(game_id, subscriber, game)
+
+    async def read_until_closed():
+        # Clients have nothing to say; reading is how a disconnect shows up.
+        try:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            subscriber.close()
+
+    reader = asyncio.create_task(read_until_closed())
+    try:
+        while (message := await subscriber.queue.get()) is not None:
+            await websocket.send_text(message)
+        if not reader.done():
+            await websocket.close()  # the game is gone; the client is still there
+    except Exception:  # the client went away mid-send
+        pass
+    finally:
+        reader.cancel()
+        hub.unsubscribe(game_id, subscriber)
+
+
+async def api_error(request, error):
+    return JSONResponse({"error": str(error)}, status_code=error.status)
+
+async def invalid_action(request, error):
+    return JSONResponse({"error": str(error)}, status_code=409)
+
+app = Starlette(
+    routes=[
+        Route("/games", create, methods=["POST"]),
+        Route("/games/{game_id}", show, methods=["GET"]),
+        Route("/games/{game_id}/join", join, methods=["POST"]),
+        Route("/games/{game_id}/start", start, methods=["POST"]),
+        Route("/games/{game_id}/actions", act, methods=["POST"]),
+        WebSocketRoute("/games/{game_id}/ws", subscribe),
+    ],
+    exception_handlers={ApiError: api_error, InvalidAction: invalid_action},
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the JSON/WebSocket game API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", default=storage.DB_PATH)
+    args = parser.parse_args()
+
+    storage.init_db(args.db)
+    start_scheduler()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""Server cost per connected player, Streamlit page against the JSON/WebSocket API.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_api --players 100 --per-game 10
+    python -m benchmarks.bench_api --only api --players 5000
+
+Starts mafia.py under `streamlit run` and api.py as two servers on one
+temporary database. For each of them, --players clients join games of
+--per-game players. Streamlit clients speak the browser's protocol over
+the websocket at /_stcore/stream: they fill in the Join Game form, then
+rerun the page's auto-rerun fragments every MAFIA_POLL_SECONDS, as an open
+tab does. API clients join over HTTP and hold one WebSocket each. Once the
+games are started, the benchmark reads the server process's resident
+memory and CPU from /proc and reports, per player:
+
+- memory held by a connected player,
+- CPU while nothing happens (--idle seconds),
+- how long a forced phase change took to reach each player (p50/p99),
+  and the server CPU from the change until everyone had seen it, idle
+  polling included.
+
+Every Streamlit tab reruns its fragments on a timer whether or not
+anything changed, so a few hundred tabs can saturate one server process.
+Past that point the Streamlit numbers measure a queue, and players who
+did not see the change within --settle seconds are left out of p50/p99.
+
+Linux only. Thousands of connections need `ulimit -n` above twice
+--players, since both ends of every socket are in this machine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TICKS = os.sysconf("SC_CLK_TCK")
+# script_finished status of a run cut short by st.rerun(); the whole page runs next.
+FINISHED_EARLY_FOR_RERUN = 2
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    return kb / 1024
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / TICKS  # utime + stime
+
+def wait_for(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except urllib.error.HTTPError:
+            return  # up, just not a GET route
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] if samples else float("nan")
+
+
+# --- STREAMLIT CLIENT ---
+class Page:
+    """One browser tab on mafia.py, speaking Streamlit's protobuf protocol"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.widgets = {}
+        self.fragments = {}
+        self.noticed = None
+
+    async def run(self, states=(), fragment_id=""):
+        """Ask for a rerun and read until it is done; True if it turned into a whole-page run"""
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        if fragment_id:
+            message.rerun_script.fragment_id = fragment_id
+            message.rerun_script.is_auto_rerun = True
+        for widget_id, field, value in states:
+            widget = message.rerun_script.widget_states.widgets.add()
+            widget.id = widget_id
+            setattr(widget, field, value)
+        await self.ws.send(message.SerializeToString())
+        reran = False
+        fragments = {}
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(self.ws.recv(), 60))
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                widget = getattr(element, element.WhichOneof("type"))
+                if getattr(widget, "id", ""):
+                    self.widgets[widget.label] = widget.id
+            elif kind == "auto_rerun":
+                fragments[forward.auto_rerun.fragment_id] = forward.auto_rerun.interval
+            elif kind == "script_finished":
+                if forward.script_finished != FINISHED_EARLY_FOR_RERUN:
+                    if reran or not fragment_id:
+                        self.fragments = fragments  # a page run replaces the browser's timers
+                    return reran
+                reran = True
+
+    async def join(self, game_id, name):
+        await self.run()
+        mode = (self.widgets["Select an option:"], "string_value", "Join Game")
+        await self.run([mode])
+        await self.run([
+            mode,
+            (self.widgets["Enter your name:"], "string_value", name),
+            (self.widgets["Enter Game ID:"], "string_value", game_id),
+            (self.widgets["Join Game"], "trigger_value", True),
+        ])
+
+    async def poll(self, since):
+        """Rerun every auto-rerun fragment on its interval, noting the first page rerun after since[0]"""
+        interval = min(self.fragments.values(), default=2.0)
+        await asyncio.sleep(random.uniform(0, interval))
+        while True:
+            started = time.monotonic()
+            for fragment_id in list(self.fragments):
+                if await self.run(fragment_id=fragment_id):
+                    if since[0] and self.noticed is None:
+                        self.noticed = time.monotonic() - since[0]
+                    break  # the page run replaced the fragments; the old ids get no answer
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+async def streamlit_players(port, games, per_game, in_flight):
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    limit = asyncio.Semaphore(in_flight)
+    pages, sockets = [], []
+
+    async def connect(game_id, name):
+        async with limit:
+            ws = await websockets.connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=60)
+            sockets.append(ws)
+            page = Page(ws)
+            await page.join(game_id, name)
+            pages.append(page)
+
+    await asyncio.gather(*(connect(g, f"p{i}") for g in games for i in range(1, per_game)))
+    return pages, sockets
+
+
+# --- API CLIENT ---
+def post(url, body, token=None):
+    request = urllib.request.Request(url, json.dumps(body).encode(), {"Content-Type": "application/json"})
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+class Listener:
+    """One API WebSocket, noting the first phase change after since[0]"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.noticed = None
+
+    async def listen(self, since):
+        async for raw in self.ws:
+            message = json.loads(raw)
+            if since[0] and self.noticed is None and "phase" in message.get("changes", {}):
+                self.noticed = time.monotonic() - since[0]
+
+
+async def api_players(port, games, per_game, in_flight):
+    limit = asyncio.Semaphore(in_flight)
+    listeners, sockets = [], []
+
+    async def connect(game_id, name):
+        async with limit:
+            token = (await asyncio.to_thread(
+                post, f"http://127.0.0.1:{port}/games/{game_id}/join", {"name": name}
+            ))["token"]
+            ws = await websockets.connect(f"ws://127.0.0.1:{port}/games/{game_id}/ws?token={token}", open_timeout=60)
+            sockets.append(ws)
+            await ws.recv()  # the full state
+            listeners.append(Listener(ws))
+
+    await asyncio.gather(*(connect(g, f"p{i}") for g in games for i in range(1, per_game)))
+    return listeners, sockets
+
+
+# --- BENCHMARK ---
+async def measure(label, server, storage, players, args):
+    """Connect the players, start their games, idle, then force a phase change"""
+    from engine import START, NIGHT
+
+    games = [f"{label}{g}" for g in range(-(-players // (args.per_game - 1)))]
+    for game_id in games:
+        storage.create_game(game_id, "host")  # the host plays no part; every client is a joiner
+    base_rss = rss_mb(server.pid)
+
+    connect = streamlit_players if label == "streamlit" else api_players
+    clients, sockets = await connect(args.port[label], games, args.per_game, args.in_flight)
+    since = [None]
+    tasks = [asyncio.create_task(c.poll(since) if label == "streamlit" else c.listen(since)) for c in clients]
+    for game_id in games:
+        storage.record_event(game_id, START, {"seed": 1})
+    await asyncio.sleep(args.settle)  # every page notices the start and reruns
+
+    start_cpu, start = cpu_seconds(server.pid), time.monotonic()
+    await asyncio.sleep(args.idle)
+    idle_rate = (cpu_seconds(server.pid) - start_cpu) / (time.monotonic() - start)
+    rss = rss_mb(server.pid)
+
+    start_cpu = cpu_seconds(server.pid)
+    since[0] = time.monotonic()
+    for game_id in games:
+        storage.transition_game(game_id, NIGHT, 1, force=True)
+    deadline = since[0] + args.settle
+    while time.monotonic() < deadline and any(c.noticed is None for c in clients):
+        await asyncio.sleep(0.05)
+    spread_cpu = cpu_seconds(server.pid) - start_cpu
+
+    failed = sum(task.done() and not task.cancelled() and task.exception() is not None for task in tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+    latencies = [c.noticed for c in clients if c.noticed is not None]
+    n = len(clients)
+    return {
+        "players": n,
+        "rss_base_mb": base_rss,
+        "kb_per_player": (rss - base_rss) * 1024 / n,
+        "idle_cpu_ms_per_player_s": idle_rate * 1e3 / n,
+        "idle_cpu_pct": idle_rate * 100,
+        "failed": failed,
+        "noticed": len(latencies),
+        "notice_p50_s": percentile(latencies, 0.5),
+        "notice_p99_s": percentile(latencies, 0.99),
+        "phase_change_cpu_ms_per_player": spread_cpu * 1e3 / n,
+    }
+
+
+def start_server(label, port, env):
+    if label == "streamlit":
+        command = [
+            sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, "mafia.py"),
+            "--server.headless", "true", "--server.port", str(port), "--browser.gatherUsageStats", "false",
+        ]
+        ready = f"http://127.0.0.1:{port}/_stcore/health"
+    else:
+        command = [sys.executable, os.path.join(ROOT, "api.py"), "--port", str(port)]
+        ready = f"http://127.0.0.1:{port}/games"
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(ready)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=100, help="connected players per server, rounded up to whole games")
+    parser.add_argument("--per-game", type=int, default=10, help="players per game, counting a host who isn't connected")
+    parser.add_argument("--idle", type=float, default=10, help="seconds of idle CPU to sample")
+    parser.add_argument("--settle", type=float, default=30, help="seconds to wait for everyone to see a change")
+    parser.add_argument("--in-flight", type=int, default=20, help="clients joining at once")
+    parser.add_argument("--only", choices=("streamlit", "api"))
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            MAFIA_DB=os.path.join(tmp, "bench.db"),
+            MAFIA_SWEEP_SECONDS="0",
+            # Phases only change when the benchmark says so
+            MAFIA_NIGHT_SECONDS="3600",
+            MAFIA_DAY_SECONDS="3600",
+        )
+        os.environ.update(env)
+        import storage
+
+        storage.init_db()
+        labels = [args.only] if args.only else ["streamlit", "api"]
+        args.port = {label: free_port() for label in labels}
+        results = {}
+        for label in labels:
+            server = start_server(label, args.port[label], env)
+            try:
+                results[label] = asyncio.run(measure(label, server, storage, args.players, args))
+            finally:
+                server.terminate()
+                server.wait()
+
+    rows = [
+        ("server RSS before players", "rss_base_mb", "{:.0f} MB"),
+        ("memory per player", "kb_per_player", "{:.0f} KB"),
+        ("idle CPU per player", "idle_cpu_ms_per_player_s", "{:.3f} ms/s"),
+        ("idle CPU, whole server", "idle_cpu_pct", "{:.1f} %"),
+        ("clients that failed", "failed", "{}"),
+        ("players who saw the change", "noticed", "{}"),
+        ("phase change seen, p50", "notice_p50_s", "{:.2f} s"),
+        ("phase change seen, p99", "notice_p99_s", "{:.2f} s"),
+        ("CPU per player while it spread", "phase_change_cpu_ms_per_player", "{:.2f} ms"),
+    ]
+    print(f"{args.players} players in games of {args.per_game}")
+    print(f"{'':<30}" + "".join(f"{label:>14}" for label in labels))
+    for title, key, fmt in rows:
+        print(f"{title:<30}" + "".join(f"{fmt.format(results[label][key]):>14}" for label in labels))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Compare the pooled WAL connection layer against opening a connection per call.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_db --ops 2000 --threads 4
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+import storage
+from engine import GameState
+
+
+def sample_game(n_players=8):
+    players = [f"player{i}" for i in range(n_players)]
+    return {
+        "host": players[0],
+        "players": players,
+        "started": True,
+        "roles": {p: "villager" for p in players},
+        "phase": "night",
+        "votes": {},
+        "day_count": 1,
+        "night_results": {},
+        "game_over": False,
+        "winner": "",
+    }
+
+
+# --- OPEN-PER-CALL BASELINE (the original mafia.py behaviour) ---
+LEGACY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS games (
+        id TEXT PRIMARY KEY,
+        host TEXT,
+        players TEXT,
+        started INTEGER,
+        roles TEXT,
+        phase TEXT,
+        votes TEXT,
+        day_count INTEGER DEFAULT 1,
+        night_results TEXT,
+        game_over INTEGER DEFAULT 0,
+        winner TEXT
+    )
+"""
+LEGACY_SAVE = """
+    INSERT OR REPLACE INTO games (id, host, players, started, roles, phase, votes, day_count, night_results, game_over, winner)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+LEGACY_LOAD = "SELECT host, players, started, roles, phase, votes, day_count, night_results, game_over, winner FROM games WHERE id = ?"
+LEGACY_EXISTS = "SELECT 1 FROM games WHERE id = ?"
+
+def legacy_save(path, game_id, game_data):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute(LEGACY_SAVE, (
+        game_id,
+        game_data["host"],
+        json.dumps(game_data["players"]),
+        int(game_data["started"]),
+        json.dumps(game_data["roles"]),
+        game_data["phase"],
+        json.dumps(game_data.get("votes", {})),
+        game_data.get("day_count", 1),
+        json.dumps(game_data.get("night_results", {})),
+        int(game_data.get("game_over", False)),
+        game_data.get("winner", "")
+    ))
+    conn.commit()
+    conn.close()
+
+def legacy_load(path, game_id):
+    conn = sqlite3.connect(path)
+    row = conn.execute(LEGACY_LOAD, (game_id,)).fetchone()
+    conn.close()
+    return row
+
+def legacy_exists(path, game_id):
+    conn = sqlite3.connect(path)
+    exists = conn.execute(LEGACY_EXISTS, (game_id,)).fetchone() is not None
+    conn.close()
+    return exists
+
+
+def run(label, save, load, exists, ops, threads):
+    """Drive a save/load/exists mix (like one rerun) from several threads"""
+    errors = []
+    per_thread = ops // threads
+
+    def worker():
+        game_id = uuid.uuid4().hex[:6]
+        game = sample_game()
+        for _ in range(per_thread):
+            try:
+                exists(game_id)
+                save(game_id, game)
+                load(game_id)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total = per_thread * threads
+    print(f"{label:<14} {total:>6} reruns in {elapsed:7.3f}s  "
+          f"{total / elapsed:9.0f} reruns/s  {elapsed / total * 1e6:8.1f} us/rerun  "
+          f"{len(errors)} lock errors")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=2000, help="save+load+exists cycles in total")
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        pooled_path = os.path.join(tmp, "pooled.db")
+        conn = sqlite3.connect(legacy_path)
+        conn.execute(LEGACY_SCHEMA)
+        conn.close()
+
+        # No game cache, so every load and exists check goes through the pool
+        storage.init_db(pooled_path, "sqlite", cache_size=0)
+
+        legacy = run(
+            "open-per-call",
+            lambda g, d: legacy_save(legacy_path, g, d),
+            lambda g: legacy_load(legacy_path, g),
+            lambda g: legacy_exists(legacy_path, g),
+            args.ops, args.threads,
+        )
+        pooled = run(
+            "pooled WAL",
+            lambda g, d: storage.save_game(g, GameState.from_dict(d)),
+            storage.load_game,
+            storage.game_exists,
+            args.ops, args.threads,
+        )
+        print(f"speedup: {legacy / pooled:.1f}x")
+        storage.get_backend().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Server CPU per voting interaction, whole-page reruns against fragment reruns.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_fragments --players 10 --picks 50
+
+Sets up a day phase with --players alive players and drives mafia.py
+through Streamlit's AppTest. Before the voting sections became fragments,
+every interaction reran the whole script: title, sidebar, load_game, the
+player lists and the vote status. The "whole page" column reproduces that
+with a full run. The "fragment" column reruns only the fragment the
+interaction belongs to, which is what the browser asks for now. Times are
+CPU seconds on the script thread, with the compiled script shared between
+runs as a server shares it, so AppTest's own overhead is left out. A
+follow-up st.rerun() inside the interaction counts towards it.
+"""
+import argparse
+import contextlib
+import functools
+import os
+import tempfile
+import time
+import warnings
+
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import local_script_runner
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mafia.py")
+
+
+def day_game(storage, game_id, players):
+    """A started game in its first day with everyone alive and nobody voted"""
+    from engine import JOIN, NIGHT, START
+
+    storage.create_game(game_id, "p0")
+    for i in range(1, players):
+        storage.record_event(game_id, JOIN, {"name": f"p{i}"})
+    game = storage.record_event(game_id, START, {"seed": 1})
+    villager = next(p for p in game.players if game.role_of(p) == "villager")
+    actions = {"mafia": "kill", "doctor": "save", "detective": "investigate"}
+    for player in game.players:
+        action = actions.get(game.role_of(player))
+        if action:
+            # The doctor saves whoever the mafia pick, so nobody dies.
+            storage.submit_vote(game_id, NIGHT, 1, player, action, villager)
+    storage.transition_game(game_id, NIGHT, 1)
+
+
+def session(game_id, name):
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.session_state["game_id"] = game_id
+    at.session_state["name"] = name
+    return at.run()
+
+def fragment_id(at, name):
+    """The id AppTest registered for the fragment wrapping the function called name"""
+    for fid, fragment in at._fragment_storage._fragments.items():
+        for cell in fragment.__closure__ or ():
+            if getattr(cell.cell_contents, "__name__", None) == name:
+                return fid
+    raise KeyError(name)
+
+class ScriptCPU:
+    """Thread CPU spent running the script, summed over every run AppTest starts"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._run_script = local_script_runner.LocalScriptRunner._run_script
+        cpu = self
+
+        def _run_script(runner, rerun_data):
+            start = time.thread_time()
+            try:
+                return cpu._run_script(runner, rerun_data)
+            finally:
+                cpu.seconds += time.thread_time() - start
+        local_script_runner.LocalScriptRunner._run_script = _run_script
+
+
+CPU = ScriptCPU()
+# AppTest compiles the script afresh for every run; a server compiles it once per process.
+_SCRIPT_CACHE = local_script_runner.ScriptCache()
+local_script_runner.ScriptCache = lambda: _SCRIPT_CACHE
+
+@contextlib.contextmanager
+def fragment_rerun(fid):
+    """Make AppTest's next run a rerun of one fragment, the way the browser requests it"""
+    original = local_script_runner.RerunData
+    local_script_runner.RerunData = functools.partial(original, fragment_id_queue=[fid])
+    try:
+        yield
+    finally:
+        local_script_runner.RerunData = original
+
+def run(at, fragment):
+    """Script CPU seconds for one interaction's rerun, whole page or just fragment"""
+    start = CPU.seconds
+    if fragment:
+        with fragment_rerun(fragment_id(at, fragment)):
+            at.run()
+    else:
+        at.run()
+    return CPU.seconds - start
+
+
+def picks(at, count, fragment):
+    """Change the elimination target back and forth"""
+    total = 0.0
+    for i in range(count):
+        box = next(s for s in at.selectbox if s.label.startswith("Choose someone to eliminate"))
+        box.set_value(box.options[1 + i % (len(box.options) - 1)])
+        total += run(at, fragment and "day_vote")
+    return total / count
+
+def votes(sessions, fragment):
+    """Everyone but the last player votes, each from their own page"""
+    total = 0.0
+    for at in sessions:
+        box = next(s for s in at.selectbox if s.label.startswith("Choose someone to eliminate"))
+        box.set_value(box.options[1])
+        next(b for b in at.button if b.label == "Vote to Eliminate").click()
+        total += run(at, fragment and "day_vote")
+    return total / len(sessions)
+
+def status_updates(at, count, fragment):
+    """An idle page noticing other players' votes"""
+    return sum(run(at, fragment and "vote_status") for _ in range(count)) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=10)
+    parser.add_argument("--picks", type=int, default=50, help="target changes to time")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["MAFIA_DB"] = os.path.join(tmp, "bench.db")
+        os.environ["MAFIA_SWEEP_SECONDS"] = "0"
+        import storage
+
+        storage.init_db()
+        results = {}
+        for label, fragment in (("whole page", False), ("fragment", True)):
+            game_id = f"bench-{label.replace(' ', '-')}"
+            day_game(storage, game_id, args.players)
+            names = [f"p{i}" for i in range(args.players)]
+            pages = [session(game_id, name) for name in names]
+            watcher, voters = pages[-1], pages[:-1]
+            results[label] = {
+                "pick a target": picks(voters[0], args.picks, fragment),
+                "cast a vote": votes(voters, fragment),
+                "see others' votes": status_updates(watcher, args.picks, fragment),
+            }
+
+    print(f"{args.players}-player day, server CPU per interaction")
+    print(f"{'interaction':<20}{'whole page':>12}{'fragment':>12}{'saved':>8}")
+    for interaction in results["whole page"]:
+        before, after = results["whole page"][interaction], results["fragment"][interaction]
+        print(f"{interaction:<20}{before * 1e3:9.2f} ms{after * 1e3:9.2f} ms{1 - after / before:8.0%}")
+
+
+if __name__ == "__main__":
+    main()
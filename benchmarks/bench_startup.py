@@ -0,0 +1,90 @@
+"""Measure what moving init_db() out of the rerun path saves per rerun.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --games 2000 --reruns 500
+
+mafia.py used to call init_db() at the top of the script, so every rerun
+from every client took the write lock, read the games table's columns and
+re-ran every CREATE ... IF NOT EXISTS (and in events mode scanned for games
+without a snapshot). Now it runs once per process behind st.cache_resource,
+and later calls into the migration code cost one PRAGMA user_version read.
+This times all three against a database holding --games games, in both
+storage modes. In events mode init() still looks for games without a
+snapshot, which keeps it slow; that now happens once per process too.
+"""
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+import streamlit as st
+
+from engine import JOIN
+from storage.sqlite import ADDED_COLUMNS, SCHEMA, SQLiteBackend, transaction
+
+
+def legacy_init(backend):
+    """init() as it ran on every rerun before migrations were versioned"""
+    conn = backend.connect()
+    with transaction(conn):
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(games)")]
+        for column, ddl in ADDED_COLUMNS:
+            if column not in columns:
+                conn.execute(f"ALTER TABLE games ADD COLUMN {column} {ddl}")
+        now = time.time()
+        conn.execute("UPDATE games SET created = ?, updated = ? WHERE updated IS NULL", (now, now))
+        for statement in SCHEMA:
+            conn.execute(statement)
+        if backend.event_sourced:
+            backend._snapshot_unlogged_games(conn)
+
+
+def populate(backend, games):
+    for i in range(games):
+        backend.create_game(f"g{i}", "host")
+        backend.record_event(f"g{i}", JOIN, {"name": "guest"})
+
+
+def per_call(fn, reruns):
+    start = time.perf_counter()
+    for _ in range(reruns):
+        fn()
+    return (time.perf_counter() - start) / reruns * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=2000, help="games in the database")
+    parser.add_argument("--reruns", type=int, default=500)
+    args = parser.parse_args()
+
+    # Outside `streamlit run` st.cache_resource warns about the missing runtime; it still caches.
+    warnings.filterwarnings("ignore")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, event_sourced in (("tables", False), ("events", True)):
+            backend = SQLiteBackend(os.path.join(tmp, f"{mode}.db"), event_sourced=event_sourced)
+            backend.init()
+            populate(backend, args.games)
+
+            @st.cache_resource
+            def open_storage():
+                backend.init()
+                return True
+
+            before = per_call(lambda: legacy_init(backend), args.reruns)
+            migrated = per_call(backend.init, args.reruns)
+            cached = per_call(open_storage, args.reruns)
+            backend.close()
+
+            print(f"-- {mode} mode, {args.games} games")
+            print(f"init() on every rerun (before) {before:10.1f} us/rerun, holding the write lock")
+            print(f"init() with user_version       {migrated:10.1f} us/rerun")
+            print(f"cached once per process        {cached:10.1f} us/rerun  "
+                  f"({before - cached:.1f} us saved per rerun)")
+
+
+if __name__ == "__main__":
+    main()
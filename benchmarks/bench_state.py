@@ -0,0 +1,126 @@
+"""Time the game-state operations the rules use at 10, 100 and 1000 players.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_state --players 10,100,1000
+
+Each operation runs against the indexed GameState and against the plain
+list/dict code it replaced, so the "x" column shows how much each one grows
+from the smallest game to the largest. Membership, kills, win checks and
+vote counts should stay flat; anything that has to list players grows.
+"""
+import argparse
+import itertools
+import time
+
+from engine import (
+    DAY, MAFIA, NIGHT, GameState, assign_roles, check_winner, everyone_voted, join, tally_day_votes,
+)
+from engine.state import NIGHT_ACTIONS, TOWN_ROLES
+
+
+def started_game(players):
+    state = GameState.new("p0")
+    for i in range(1, players):
+        join(state, f"p{i}")
+    assign_roles(state, seed=1)
+    return state
+
+
+def day_votes(state):
+    """Everyone but the last player has voted, spread over a few targets"""
+    names = list(state.players)
+    state.phase = DAY
+    for i, name in enumerate(names[:-1]):
+        state.votes[name] = {"action": "eliminate", "target": names[i % 7]}
+    return state
+
+
+# --- The list/dict code these operations used before the indexed state ---
+def legacy_check_winner(players, roles):
+    mafia = [p for p in players if roles.get(p) == MAFIA]
+    town = [p for p in players if roles.get(p) in TOWN_ROLES]
+    return "villagers" if not mafia else "mafia" if len(mafia) >= len(town) else None
+
+def legacy_all_voted(players, roles, votes):
+    voters = [p for p in players if roles.get(p) in NIGHT_ACTIONS]
+    return bool(voters) and all(p in votes for p in voters)
+
+def legacy_tally(players, votes):
+    counts, skips = {}, 0
+    for voter, vote in votes.items():
+        if voter in players:
+            if vote["action"] == "skip":
+                skips += 1
+            else:
+                counts[vote["target"]] = counts.get(vote["target"], 0) + 1
+    return counts, skips
+
+
+def operations(players):
+    """(name, indexed callable, legacy callable) for one game size"""
+    state = started_game(players)
+    names = list(state.players)
+    listed, roles = list(names), dict(state.roles)
+    victims = itertools.cycle(names[players // 4: players // 4 + 8])
+    last = names[-1]
+
+    def kill():
+        victim = next(victims)
+        state.players.remove(victim)
+        state.players.append(victim)
+
+    def legacy_kill():
+        victim = next(victims)
+        listed.remove(victim)
+        listed.append(victim)
+
+    night = state.copy()
+    night.phase = NIGHT
+    day = day_votes(state.copy())
+    day_votes_dict = dict(day.votes)
+
+    return [
+        ("is alive", lambda: last in state.players, lambda: last in listed),
+        ("kill", kill, legacy_kill),
+        ("win check", lambda: check_winner(state), lambda: legacy_check_winner(listed, roles)),
+        ("other mafia", lambda: state.alive_with_role(MAFIA), lambda: [p for p in listed if roles.get(p) == MAFIA]),
+        ("all voted", lambda: everyone_voted(night), lambda: legacy_all_voted(listed, roles, night.votes)),
+        ("day tally", lambda: tally_day_votes(day), lambda: legacy_tally(listed, day_votes_dict)),
+        ("eliminated", lambda: state.eliminated(), lambda: [p for p in roles if p not in listed]),
+    ]
+
+
+def timed(fn, budget=0.05):
+    """Microseconds per call, repeating until the budget is spent"""
+    calls, start = 0, time.perf_counter()
+    while True:
+        for _ in range(100):
+            fn()
+        calls += 100
+        elapsed = time.perf_counter() - start
+        if elapsed > budget:
+            return elapsed / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", default="10,100,1000", help="comma-separated game sizes")
+    args = parser.parse_args()
+    sizes = [int(n) for n in args.players.split(",")]
+
+    results = {}
+    for n in sizes:
+        for name, indexed, legacy in operations(n):
+            results.setdefault(name, []).append((timed(indexed), timed(legacy)))
+
+    header = "".join(f"{f'{n} players':>23}" for n in sizes)
+    print(f"{'operation':<12}{header}{'indexed x':>11}{'legacy x':>10}")
+    for name, rows in results.items():
+        cells = "".join(f"{new:9.2f} / {old:8.2f} us" for new, old in rows)
+        print(f"{name:<12}{cells}{rows[-1][0] / rows[0][0]:10.1f}x{rows[-1][1] / rows[0][1]:9.1f}x")
+    print("cells are indexed / legacy; x is the growth from the smallest to the largest game")
+
+
+if __name__ == "__main__":
+    main()
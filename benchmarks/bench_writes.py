@@ -0,0 +1,105 @@
+"""Compare whole-row saves with dirty-field partial updates and compact JSON.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_writes --ops 2000 --players 10
+
+For each kind of write it reports the time spent in the write transaction
+(which is how long the writer lock is held) and the bytes appended to the
+WAL per write, for three setups: the old whole-row save with default
+json.dumps, whole-row with compact JSON, and partial updates with compact
+JSON.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from engine import JOIN, START
+from storage.sqlite import SQLiteBackend
+
+SETUPS = (
+    ("whole row", dict(partial=False, compact=False)),
+    ("whole row, compact", dict(partial=False, compact=True)),
+    ("partial, compact", dict(partial=True, compact=True)),
+)
+
+
+def started_game(backend, game_id, players):
+    backend.create_game(game_id, "player0")
+    for i in range(1, players):
+        backend.record_event(game_id, JOIN, {"name": f"player{i}"})
+    backend.record_event(game_id, START, {"seed": 7})
+    # Give the night some results so the JSON columns aren't empty.
+    game = backend.load_game(game_id)
+    game.night_results = {"death": "player1", "investigation": "player2 is a **VILLAGER**"}
+    game.day_results = {"eliminated": "player3", "role": "villager"}
+    backend.save_game(game_id, game)
+
+
+def vote(backend, game_id, i):
+    """One vote through load + save_game, as the compare-and-swap path writes it"""
+    game = backend.load_game(game_id)
+    voter = game.players[i % len(game.players)]
+    game.votes[voter] = {"action": "kill", "target": game.players[(i + 1) % len(game.players)]}
+    start = time.perf_counter()
+    backend.save_game(game_id, game, expected_version=game.version)
+    return time.perf_counter() - start
+
+def join(backend, game_id, i):
+    """One player joining a lobby through record_event"""
+    start = time.perf_counter()
+    backend.record_event(game_id, JOIN, {"name": f"joiner{i}"})
+    return time.perf_counter() - start
+
+def deadline(backend, game_id, i):
+    """Only a scalar column changes, e.g. a phase timer being pushed back"""
+    game = backend.load_game(game_id)
+    game.deadline = time.time() + i
+    start = time.perf_counter()
+    backend.save_game(game_id, game, expected_version=game.version)
+    return time.perf_counter() - start
+
+WRITES = (("vote", vote), ("join", join), ("deadline", deadline))
+
+
+def measure(path, setup, write, ops, players):
+    backend = SQLiteBackend(path, **setup)
+    backend.init()
+    conn = backend.connect()
+    games = [f"g{i}" for i in range(max(1, ops // 50))]
+    for game_id in games:
+        if write is join:
+            backend.create_game(game_id, "host")
+        else:
+            started_game(backend, game_id, players)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("PRAGMA wal_autocheckpoint=0")
+    wal = path + "-wal"
+    wal_before = os.path.getsize(wal) if os.path.exists(wal) else 0
+    held = sum(write(backend, games[i % len(games)], i) for i in range(ops))
+    wal_bytes = os.path.getsize(wal) - wal_before
+    backend.close()
+    return held / ops * 1e6, wal_bytes / ops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=2000, help="writes per kind and setup")
+    parser.add_argument("--players", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, write in WRITES:
+            print(f"-- {name}")
+            baseline = None
+            for label, setup in SETUPS:
+                path = os.path.join(tmp, f"{name}-{label.replace(' ', '').replace(',', '-')}.db")
+                us, wal = measure(path, setup, write, args.ops, args.players)
+                baseline = baseline or (us, wal)
+                print(f"{label:<20} {us:8.1f} us/write  {wal:8.0f} WAL bytes/write  "
+                      f"{baseline[0] / us:4.2f}x speed  {wal / baseline[1]:4.0%} of the bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""Load-test the storage layer by playing many concurrent games end to end.
+
+Every lobby gets one thread per player. Each thread behaves like a browser
+tab: it reruns (game_exists + load_game), joins, votes through the engine
+and submit_vote, and tries transition_game once its phase is complete,
+until the game is over. Lobbies can be spread over several processes.
+
+Run from the repository root:
+
+    python -m benchmarks.loadtest --lobbies 20 --players 8
+    python -m benchmarks.loadtest --lobbies 40 --players 10 --processes 4 --json results.json
+    python -m benchmarks.loadtest --db mafia.db --think 0.2
+    python -m benchmarks.loadtest --backend sqlite,sharded --shards 8 --think 0
+
+Prints p50/p95/p99 latency and throughput per operation, plus lost votes,
+lock errors and other errors, and exits non-zero if any vote was lost.
+With several backends each gets a fresh database and the same games, and
+the write throughput of each is compared against the first. Reads are left
+out because their count mostly measures how fast idle tabs poll.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import storage
+from engine import (
+    CREATE, DAY_RESOLVED, JOIN, NIGHT_RESOLVED, START, GameState, InvalidAction, apply_event, required_voters,
+    submit_action, valid_targets,
+)
+
+OPERATIONS = ("create", "exists", "load", "join", "start", "vote", "transition")
+WRITES = ("create", "join", "start", "vote", "transition")
+
+
+class Recorder:
+    """Thread-safe latency samples and error counts for one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.accepted_votes = defaultdict(set)
+
+    def timed(self, op, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            kind = "lock" if "locked" in str(e) or "busy" in str(e) else "sqlite"
+            with self._lock:
+                self.errors[kind] += 1
+        except InvalidAction:
+            with self._lock:
+                self.errors["invalid"] += 1
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.latencies[op].append(elapsed)
+
+    def vote_accepted(self, game_id, phase, day_count, name):
+        with self._lock:
+            self.accepted_votes[game_id].add((phase, day_count, name))
+
+
+def play_player(rec, game_id, name, is_host, num_players, think, deadline, rng):
+    """One browser tab: poll the game and act on it until it is over"""
+    if is_host:
+        rec.timed("create", storage.create_game, game_id, name)
+    else:
+        while not rec.timed("exists", storage.game_exists, game_id):
+            if time.time() > deadline:
+                return
+            time.sleep(think or 0.001)
+        rec.timed("join", storage.record_event, game_id, JOIN, {"name": name})
+
+    while time.time() < deadline:
+        rec.timed("exists", storage.game_exists, game_id)
+        game = rec.timed("load", storage.load_game, game_id)
+        if game is None or game.game_over:
+            return
+        if not game.started:
+            if is_host and len(game.players) == num_players:
+                rec.timed("start", storage.record_event, game_id, START, {"seed": rng.getrandbits(32)})
+        elif game.is_alive(name):
+            voters = required_voters(game)
+            if name in voters and name not in game.votes:
+                vote = submit_action(game, name, *pick_vote(game, name, rng))
+                if rec.timed("vote", storage.submit_vote, game_id, game.phase, game.day_count,
+                             name, vote["action"], vote["target"], game.deal):
+                    rec.vote_accepted(game_id, game.phase, game.day_count, name)
+            elif all(v in game.votes for v in voters):
+                rec.timed("transition", storage.transition_game, game_id, game.phase, game.day_count)
+        if think:
+            time.sleep(think * rng.uniform(0.5, 1.5))
+
+def pick_vote(game, name, rng):
+    if game.phase == "day":
+        targets = valid_targets(game, name)
+        if not targets or rng.random() < 0.1:
+            return "skip", None
+        return "eliminate", rng.choice(targets)
+    action = {"mafia": "kill", "doctor": "save", "detective": "investigate"}[game.role_of(name)]
+    return action, rng.choice(valid_targets(game, name))
+
+
+def counted_votes(game_id):
+    """(phase, day_count, voter) for every vote the game holds now or held when a phase resolved.
+
+    Earlier phases come from replaying the event log, the current one from
+    the stored game, so a vote the log can't replay or the store dropped
+    is missing here even though submit_vote accepted it.
+    """
+    counted = set()
+    replayed = None
+    for _, event_type, payload, _ in storage.game_events(game_id):
+        if event_type == CREATE:
+            replayed = GameState.new(payload["host"])
+            continue
+        if event_type in (NIGHT_RESOLVED, DAY_RESOLVED):
+            counted.update((replayed.phase, replayed.day_count, voter) for voter in replayed.votes)
+        try:
+            apply_event(replayed, event_type, payload)
+        except InvalidAction:
+            pass
+    game = storage.load_game(game_id)
+    if game is not None:
+        counted.update((game.phase, game.day_count, voter) for voter in game.votes)
+    return counted, game
+
+
+def run_lobbies(backend, db_path, shards, cache_size, lobby_ids, num_players, think, timeout, seed):
+    """Play a batch of lobbies in this process; returns raw samples for merging"""
+    storage.init_db(db_path, backend, shards, cache_size)
+    rec = Recorder()
+    deadline = time.time() + timeout
+    threads = []
+    for game_id in lobby_ids:
+        for p in range(num_players):
+            rng = random.Random(f"{seed}-{game_id}-{p}")
+            t = threading.Thread(
+                target=play_player,
+                args=(rec, game_id, f"player{p}", p == 0, num_players, think, deadline, rng),
+            )
+            threads.append(t)
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lost = 0
+    finished = 0
+    for game_id in lobby_ids:
+        counted, game = counted_votes(game_id)
+        lost += len(rec.accepted_votes[game_id] - counted)
+        finished += bool(game and game.game_over)
+    cache = storage.cache_stats()
+    storage.get_backend().close()
+    return {
+        "latencies": dict(rec.latencies),
+        "errors": dict(rec.errors),
+        "accepted_votes": sum(len(votes) for votes in rec.accepted_votes.values()),
+        "lost_votes": lost,
+        "finished": finished,
+        "cache": cache,
+        "elapsed": elapsed,
+    }
+
+
+def percentile(sorted_samples, q):
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+def summarize(results, wall):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for r in results:
+        for op, samples in r["latencies"].items():
+            latencies[op].extend(samples)
+        for kind, count in r["errors"].items():
+            errors[kind] += count
+    operations = {}
+    for op in OPERATIONS:
+        samples = sorted(latencies.get(op, ()))
+        operations[op] = {
+            "count": len(samples),
+            "per_second": len(samples) / wall if wall else 0.0,
+            "p50_ms": percentile(samples, 0.50) * 1e3,
+            "p95_ms": percentile(samples, 0.95) * 1e3,
+            "p99_ms": percentile(samples, 0.99) * 1e3,
+        }
+    return {
+        "operations": operations,
+        "errors": {"lock": errors.pop("lock", 0), **errors},
+        "accepted_votes": sum(r["accepted_votes"] for r in results),
+        "lost_votes": sum(r["lost_votes"] for r in results),
+        "finished_games": sum(r["finished"] for r in results),
+        "writes_per_second": sum(operations[op]["count"] for op in WRITES) / wall if wall else 0.0,
+        "cache_hits": sum(r["cache"]["hits"] for r in results if r["cache"]),
+        "cache_misses": sum(r["cache"]["misses"] for r in results if r["cache"]),
+        "wall_seconds": wall,
+    }
+
+
+def run_backend(args, backend, db_path):
+    """Play every lobby against one backend and summarize it"""
+    storage.init_db(db_path, backend, args.shards, args.cache_size)
+    storage.get_backend().close()
+
+    run_id = f"{os.getpid()}{int(time.time()) % 100000}"
+    lobby_ids = [f"lt{run_id}-{i}" for i in range(args.lobbies)]
+    batches = [lobby_ids[i::args.processes] for i in range(args.processes)]
+    common = (args.players, args.think, args.timeout, args.seed)
+    start = time.perf_counter()
+    if args.processes == 1:
+        results = [run_lobbies(backend, db_path, args.shards, args.cache_size, lobby_ids, *common)]
+    else:
+        with ProcessPoolExecutor(args.processes) as pool:
+            futures = [
+                pool.submit(run_lobbies, backend, db_path, args.shards, args.cache_size, b, *common)
+                for b in batches
+            ]
+            results = [f.result() for f in futures]
+    summary = summarize(results, time.perf_counter() - start)
+    summary["config"] = {
+        "backend": backend,
+        "shards": args.shards if backend == "sharded" else None,
+        "cache_size": args.cache_size,
+        "lobbies": args.lobbies,
+        "players": args.players,
+        "processes": args.processes,
+        "think": args.think,
+        "seed": args.seed,
+        "storage_mode": storage.STORAGE_MODE,
+        "sqlite": sqlite3.sqlite_version,
+    }
+    return summary
+
+def report(summary):
+    config = summary["config"]
+    shards = f" ({config['shards']} shards)" if config["shards"] else ""
+    print(f"== {config['backend']}{shards}")
+    print(f"{'operation':<11} {'count':>7} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for op, s in summary["operations"].items():
+        print(f"{op:<11} {s['count']:>7} {s['per_second']:>9.1f} {s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f}")
+    print(f"games finished: {summary['finished_games']}/{config['lobbies']} in {summary['wall_seconds']:.1f}s"
+          f" ({summary['writes_per_second']:.1f} writes/s)")
+    print(f"votes lost:     {summary['lost_votes']}/{summary['accepted_votes']}")
+    print(f"errors:         {summary['errors']}")
+    lookups = summary["cache_hits"] + summary["cache_misses"]
+    if lookups:
+        print(f"cache hits:     {summary['cache_hits']}/{lookups} ({summary['cache_hits'] / lookups:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lobbies", type=int, default=20)
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=1, help="spread lobbies over this many processes")
+    parser.add_argument("--think", type=float, default=0.05, help="mean seconds between reruns per player")
+    parser.add_argument("--timeout", type=float, default=300, help="give up on unfinished games after this long")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default=storage.BACKEND,
+                        help=f"comma-separated backends to compare, from {', '.join(storage.BACKENDS)}")
+    parser.add_argument("--shards", type=int, default=storage.SHARDS, help="files for the sharded backend")
+    parser.add_argument("--cache-size", type=int, default=storage.CACHE_SIZE,
+                        help="games kept in the load_game cache, 0 to turn it off")
+    parser.add_argument("--db", help="database file to use (default: a fresh temporary file)")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH ('-' for stdout)")
+    args = parser.parse_args()
+
+    backends = args.backend.split(",")
+    for backend in backends:
+        if backend not in storage.BACKENDS:
+            parser.error(f"unknown backend {backend!r}")
+        if backend == "memory" and args.processes > 1:
+            parser.error("the memory backend cannot be shared between processes")
+
+    summaries = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            db_path = args.db or os.path.join(tmp, f"loadtest-{backend}.db")
+            summaries.append(run_backend(args, backend, db_path))
+            report(summaries[-1])
+    base = summaries[0]
+    for summary in summaries[1:]:
+        print(f"{summary['config']['backend']} vs {backends[0]}: "
+              f"{summary['writes_per_second'] / base['writes_per_second']:.1f}x write throughput, "
+              f"{summary['finished_games']} vs {base['finished_games']} games finished")
+
+    if args.json:
+        text = json.dumps({"runs": summaries}, indent=2)
+        if args.json == "-":
+            print(text)
+        else:
+            with open(args.json, "w") as f:
+                f.write(text + "\n")
+
+    if any(s["lost_votes"] for s in summaries):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""Headless bot players, for filling lobbies and soak-testing a server.
+
+A Bot is one player. It joins through the same JOIN event as the Join Game
+form, picks its night action and day vote with a policy, checks it with
+engine.submit_action and casts it with storage.submit_vote, like a page
+does. Whichever bot sees a phase complete advances it with transition_game.
+Policies:
+
+- random: any valid target; by day a few skip.
+- majority: pile onto whoever leads the vote so far. Mafia never target
+  each other and agree on one kill, as they would among themselves.
+- informed: majority, except a bot detective investigates people it hasn't
+  looked at yet, and town bots vote out anyone it found to be mafia, as if
+  the detective spoke up in the discussion.
+
+One BotPool per process plays every bot. Its thread checks each game's
+version every MAFIA_BOT_POLL_SECONDS. When a game has changed, or one of its
+bots is done thinking, a worker from a pool of MAFIA_BOT_WORKERS loads it
+once for all of its bots. A thousand bots in a hundred games therefore cost
+a hundred version checks per poll, not a thousand polling threads. Bots
+think for MAFIA_BOT_THINK_SECONDS, give or take half, before they act, so
+people in the same game can keep up. Bots live in process memory. A
+restarted server forgets them, and the phase timers resolve phases without
+their votes.
+
+Run as a script, it plays bots-only games back to back as a soak test:
+
+    python bots.py --games 100 --players 8 --duration 600
+    python bots.py --games 20 --policy informed --think 0.5 --db soak.db --json soak.json
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import storage
+from engine import DAY, DETECTIVE, JOIN, MAFIA, NIGHT, START, InvalidAction, everyone_voted, submit_action, valid_targets
+from engine.state import NIGHT_ACTIONS
+from scheduler import set_deadline, start_scheduler
+
+THINK_SECONDS = float(os.environ.get("MAFIA_BOT_THINK_SECONDS", "3"))
+POLL_SECONDS = float(os.environ.get("MAFIA_BOT_POLL_SECONDS", "0.25"))
+WORKERS = int(os.environ.get("MAFIA_BOT_WORKERS", "8"))
+DAY_SKIP_RATE = 0.1
+
+
+# --- POLICIES ---
+# Each takes (game, bot, board) and returns (action, target). board maps
+# players to the roles bot detectives in this game have found.
+def random_policy(game, bot, board):
+    """Any valid target; by day a few bots skip"""
+    if game.phase == NIGHT:
+        return NIGHT_ACTIONS[game.role_of(bot.name)], bot.rng.choice(valid_targets(game, bot.name))
+    if bot.rng.random() < DAY_SKIP_RATE:
+        return "skip", None
+    return "eliminate", bot.rng.choice(valid_targets(game, bot.name))
+
+def majority_policy(game, bot, board):
+    """Join whoever leads the vote so far, or start a vote of one's own"""
+    role = game.role_of(bot.name)
+    action = NIGHT_ACTIONS[role] if game.phase == NIGHT else "eliminate"
+    targets = valid_targets(game, bot.name)
+    if role == MAFIA:
+        targets = [p for p in targets if game.role_of(p) != MAFIA] or targets
+    if action in ("kill", "eliminate"):
+        leaders = [p for p in game.votes.leaders(action) if p in targets]
+        if leaders:
+            return action, min(leaders, key=game.players.seat)
+    return action, bot.rng.choice(targets)
+
+def informed_policy(game, bot, board):
+    """Majority, plus whatever a bot detective has found out"""
+    role = game.role_of(bot.name)
+    if game.phase == NIGHT and role == DETECTIVE:
+        fresh = [p for p in valid_targets(game, bot.name) if p not in board]
+        if fresh:
+            return "investigate", bot.rng.choice(fresh)
+    elif game.phase == DAY and role != MAFIA:
+        exposed = [p for p, found in board.items() if found == MAFIA and p != bot.name and p in game.players]
+        if exposed:
+            return "eliminate", min(exposed, key=game.players.seat)
+    return majority_policy(game, bot, board)
+
+POLICIES = {"random": random_policy, "majority": majority_policy, "informed": informed_policy}
+
+
+class Bot:
+    """One headless player and the policy that picks its votes"""
+
+    def __init__(self, name, policy="random", think=THINK_SECONDS, rng=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown bot policy {policy!r}, expected one of {tuple(POLICIES)}")
+        self.name = name
+        self.policy = policy
+        self.think = think
+        self.rng = rng or random.Random()
+        self.ready_at = 0.0
+        self._turn = None
+
+    def owes_vote(self, game):
+        """Whether the current phase is waiting for this bot"""
+        if not game.started or game.game_over or self.name in game.votes or not game.is_alive(self.name):
+            return False
+        return game.phase == DAY or (game.phase == NIGHT and game.role_of(self.name) in NIGHT_ACTIONS)
+
+    def ready(self, game, now):
+        """Whether this bot votes now; its think time starts when it first sees a phase"""
+        if not self.owes_vote(game):
+            return False
+        turn = game.phase, game.day_count
+        if turn != self._turn:
+            self._turn = turn
+            self.ready_at = now + self.think * self.rng.uniform(0.5, 1.5)
+        return now >= self.ready_at
+
+    def vote(self, game, board):
+        """Pick a vote and record it on game; raises InvalidAction if the rules refuse it"""
+        action, target = POLICIES[self.policy](game, self, board)
+        vote = submit_action(game, self.name, action, target)
+        if action == "investigate":
+            board[target] = game.role_of(target)
+        return vote
+
+
+class BotGame:
+    """The bots playing one game, and what the pool last saw of it"""
+
+    def __init__(self, game_id, start_at=None):
+        self.game_id = game_id
+        self.bots = []
+        self.board = {}
+        # A bot host starts the game once this many players have joined.
+        self.start_at = start_at
+        self.version = None
+        self.changed = time.time()
+        self.wake_at = 0.0
+        self.busy = False
+        self.over = False
+
+
+class BotPool(threading.Thread):
+    """Daemon thread that hands games whose bots have something to do to a pool of workers"""
+
+    def __init__(self, workers=WORKERS, interval=POLL_SECONDS, on_finish=None):
+        super().__init__(name="mafia-bots", daemon=True)
+        self.interval = interval
+        # Called as on_finish(game_id, game) from a worker when a game ends.
+        self.on_finish = on_finish
+        self.stats = {"started": 0, "votes": 0, "transitions": 0, "finished": 0, "errors": 0}
+        self._workers = ThreadPoolExecutor(workers, thread_name_prefix="mafia-bot")
+        self._games = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def add(self, game_id, bots, start_at=None):
+        with self._lock:
+            entry = self._games.get(game_id)
+            if entry is None:
+                entry = self._games[game_id] = BotGame(game_id, start_at)
+            entry.bots.extend(bots)
+            entry.wake_at = 0.0
+
+    def remove(self, game_id):
+        with self._lock:
+            self._games.pop(game_id, None)
+
+    def games(self):
+        with self._lock:
+            return list(self._games.values())
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+        metrics.inc(f"bot_{name}", amount)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            now = time.time()
+            for entry in self.games():
+                if entry.busy:
+                    continue
+                try:
+                    version = storage.get_version(entry.game_id)
+                except Exception as e:  # keep polling through a locked or busy database
+                    self.count("errors")
+                    print(f"bots: {entry.game_id}: {e!r}")
+                    continue
+                if version != entry.version or now >= entry.wake_at:
+                    entry.busy = True
+                    self._workers.submit(self._play, entry)
+
+    def _play(self, entry):
+        try:
+            self.play(entry)
+        except Exception as e:
+            self.count("errors")
+            print(f"bots: {entry.game_id}: {e!r}")
+        finally:
+            entry.busy = False
+
+    @metrics.timed("bot_turn")
+    def play(self, entry, now=None):
+        """Load the game once and let every bot in it that's ready vote; advances a finished phase"""
+        now = now or time.time()
+        game = storage.load_game(entry.game_id)
+        if game is None:
+            self.remove(entry.game_id)
+            return
+        if game.version != entry.version:
+            entry.version, entry.changed = game.version, now
+        entry.wake_at = math.inf
+
+        if game.game_over:
+            if not entry.over:
+                entry.over = True
+                self.count("finished")
+                if self.on_finish:
+                    self.on_finish(entry.game_id, game)
+            return
+        entry.over = False
+
+        if not game.started:
+            if entry.start_at and len(game.players) >= entry.start_at and any(b.name == game.host for b in entry.bots):
+                try:
+                    record_start(entry.game_id)
+                    self.count("started")
+                except InvalidAction:
+                    pass  # a person in the lobby pressed Start first
+            return
+
+        phase, day_count = game.phase, game.day_count
+        thinking = []
+        for bot in entry.bots:
+            if bot.ready(game, now):
+                vote = bot.vote(game, entry.board)
+                if not storage.submit_vote(
+                    entry.game_id, phase, day_count, bot.name, vote["action"], vote["target"], game.deal
+                ):
+                    return  # the phase moved on; the version change brings this game back
+                self.count("votes")
+            elif bot.owes_vote(game):
+                thinking.append(bot.ready_at)
+        entry.wake_at = min(thinking, default=math.inf)
+
+        if everyone_voted(game):
+            if storage.transition_game(entry.game_id, phase, day_count, after=set_deadline) is not None:
+                self.count("transitions")
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self._workers.shutdown(wait=True)
+
+
+def record_start(game_id, seed=None):
+    """Deal roles the way the Start Game button does"""
+    seed = random.getrandbits(32) if seed is None else seed
+    return storage.record_event(game_id, START, {"seed": seed}, after=set_deadline)
+
+def add_bots(game_id, count, policy="random", think=THINK_SECONDS, pool=None, start_at=None):
+    """Join count bots named "Bot N" to a lobby and hand them to the pool; returns their names.
+
+    Stops early if the game starts or disappears while they join.
+    """
+    pool = pool or start_pool()
+    game = storage.load_game(game_id)
+    joined = []
+    for n in itertools.count(1):
+        if len(joined) == count or game is None or game.started:
+            break
+        name = f"Bot {n}"
+        if name in game.players:
+            continue
+        try:
+            game = storage.record_event(game_id, JOIN, {"name": name})
+        except InvalidAction:
+            game = storage.load_game(game_id)  # someone took the name, or the host started
+            continue
+        if game is not None:
+            joined.append(Bot(name, policy, think))
+    pool.add(game_id, joined, start_at)
+    return [bot.name for bot in joined]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def start_pool():
+    """Start this process's bot pool once and return it"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or not _pool.is_alive():
+            _pool = BotPool()
+            _pool.start()
+    return _pool
+
+
+# --- SOAK TEST ---
+class Soak:
+    """Keeps --games bots-only games running, replacing each one as it ends"""
+
+    def __init__(self, args, policies):
+        self.args = args
+        self.policies = policies
+        self.stop_at = time.time() + args.duration if args.duration else math.inf
+        self.pool = BotPool(args.workers, args.poll, on_finish=self.finished)
+        self.results = {"games": 0, "mafia": 0, "villagers": 0, "days": 0}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def new_game(self):
+        n = next(self._ids)
+        game_id = f"soak{os.getpid()}-{n}"
+        policy = self.policies[n % len(self.policies)]
+        storage.create_game(game_id, "Bot 1")
+        self.pool.add(game_id, [Bot("Bot 1", policy, self.args.think)], start_at=self.args.players)
+        add_bots(game_id, self.args.players - 1, policy, self.args.think, self.pool)
+
+    def finished(self, game_id, game):
+        with self._lock:
+            self.results["games"] += 1
+            self.results[game.winner] = self.results.get(game.winner, 0) + 1
+            self.results["days"] += game.day_count
+        self.pool.remove(game_id)
+        if time.time() < self.stop_at:
+            self.new_game()
+
+    def stalled(self, now):
+        return [e.game_id for e in self.pool.games() if not e.over and now - e.changed > self.args.stall]
+
+    def report(self, elapsed):
+        with self._lock:
+            results = dict(self.results)
+        stats = dict(self.pool.stats)
+        games = results["games"]
+        return {
+            **results,
+            **stats,
+            "running": len(self.pool.games()),
+            "stalled": self.stalled(time.time()),
+            "elapsed": elapsed,
+            "games_per_minute": games / elapsed * 60 if elapsed else 0.0,
+            "votes_per_second": stats["votes"] / elapsed if elapsed else 0.0,
+            "mafia_win_rate": results["mafia"] / games if games else 0.0,
+            "days_per_game": results["days"] / games if games else 0.0,
+        }
+
+
+def print_report(report):
+    print(
+        f"{report['elapsed']:7.0f}s  {report['games']:6d} games ({report['games_per_minute']:7.1f}/min, "
+        f"mafia {report['mafia_win_rate']:4.0%}, {report['days_per_game']:.1f} days)  "
+        f"{report['running']:4d} running  {report['votes_per_second']:8.1f} votes/s  "
+        f"{report['errors']} errors  {len(report['stalled'])} stalled"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak-test the server with bots-only games.")
+    parser.add_argument("--games", type=int, default=20, help="games kept running at once")
+    parser.add_argument("--players", type=int, default=8, help="bots per game")
+    parser.add_argument("--policy", default=",".join(POLICIES), help="comma-separated policies, one per game in turn")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds each bot thinks before acting")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to start new games for, 0 for until Ctrl-C")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="seconds between version checks")
+    parser.add_argument("--stall", type=float, default=60.0, help="seconds without a change before a game counts as stalled")
+    parser.add_argument("--report", type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument("--db", default=storage.DB_PATH)
+    parser.add_argument("--backend", choices=storage.BACKENDS, default=storage.BACKEND)
+    parser.add_argument("--scheduler", action="store_true", help="also run the phase timers and sweeper in this process")
+    parser.add_argument("--json", help="write the final report to this file")
+    args = parser.parse_args()
+    policies = args.policy.split(",")
+    unknown = [p for p in policies if p not in POLICIES]
+    if unknown:
+        parser.error(f"unknown policy {', '.join(unknown)}; choose from {', '.join(POLICIES)}")
+
+    storage.init_db(args.db, args.backend)
+    if args.scheduler:
+        start_scheduler()
+    soak = Soak(args, policies)
+    soak.pool.start()
+    for _ in range(args.games):
+        soak.new_game()
+
+    start = time.time()
+    next_report = start + args.report
+    try:
+        # After --duration no new games start; wait for the running ones to end or stall.
+        while soak.pool.games():
+            time.sleep(0.5)
+            now = time.time()
+            if now >= soak.stop_at and len(soak.stalled(now)) == len(soak.pool.games()):
+                break
+            if now >= next_report:
+                next_report += args.report
+                print_report(soak.report(now - start))
+    except KeyboardInterrupt:
+        pass
+    soak.pool.stop()
+    report = soak.report(time.time() - start)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if report["errors"] or report["stalled"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Pure-Python Mafia rules, shared by the Streamlit app, tools and other frontends.
+
+Nothing in this package touches Streamlit or SQLite.
+"""
+from engine.state import (
+    DAY, DETECTIVE, DOCTOR, LOBBY, MAFIA, MIN_PLAYERS, NIGHT, STATE_FIELDS, VILLAGER, GameState, Roles,
+    Roster, Vote, Votes,
+)
+from engine.rules import (
+    InvalidAction, assign_roles, check_winner, everyone_voted, join, mafia_count, required_voters, reset,
+    resolve_day, resolve_night, submit_action, tally_day_votes, valid_targets,
+)
+from engine.events import (
+    CREATE, DAY_RESOLVED, EVENT_TYPES, JOIN, NIGHT_RESOLVED, RESET, START, VOTE, apply_event, replay,
+)
+from engine.view import player_view
+from engine.chat import (
+    CHANNELS, MAFIA_CHANNEL, MAX_MESSAGE_LENGTH, PUBLIC, check_message, postable_channels, readable_channels,
+)
+
+__all__ = [
+    "DAY", "DETECTIVE", "DOCTOR", "LOBBY", "MAFIA", "MIN_PLAYERS", "NIGHT", "STATE_FIELDS", "VILLAGER",
+    "GameState", "Roles", "Roster", "Vote", "Votes", "InvalidAction", "assign_roles", "check_winner",
+    "everyone_voted", "join", "mafia_count", "required_voters", "reset", "resolve_day", "resolve_night",
+    "submit_action", "tally_day_votes", "valid_targets",
+    "CREATE", "DAY_RESOLVED", "EVENT_TYPES", "JOIN", "NIGHT_RESOLVED", "RESET", "START", "VOTE",
+    "apply_event", "replay",
+    "CHANNELS", "MAFIA_CHANNEL", "MAX_MESSAGE_LENGTH", "PUBLIC", "check_message", "postable_channels",
+    "readable_channels", "player_view",
+]
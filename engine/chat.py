@@ -0,0 +1,41 @@
+from typing import Tuple
+
+from engine.rules import InvalidAction
+from engine.state import MAFIA, NIGHT, GameState
+
+PUBLIC = "all"
+MAFIA_CHANNEL = "mafia"
+CHANNELS = (PUBLIC, MAFIA_CHANNEL)
+MAX_MESSAGE_LENGTH = 500
+
+
+def is_mafia_member(state: GameState, player: str) -> bool:
+    """Alive and dealt mafia: exactly whose kill votes submit_action accepts at night"""
+    return state.started and not state.game_over and state.is_alive(player) and state.role_of(player) == MAFIA
+
+def readable_channels(state: GameState, player: str) -> Tuple[str, ...]:
+    """The channels whose messages a player is shown"""
+    return CHANNELS if is_mafia_member(state, player) else (PUBLIC,)
+
+def postable_channels(state: GameState, player: str) -> Tuple[str, ...]:
+    """Where a player may post right now; the mafia channel only opens at night"""
+    if player not in state.players:
+        return ()
+    if state.phase == NIGHT and is_mafia_member(state, player):
+        return CHANNELS
+    return (PUBLIC,)
+
+def check_message(state: GameState, player: str, channel: str, text: str) -> str:
+    """Validate a chat message and return its text, trimmed"""
+    if channel not in CHANNELS:
+        raise InvalidAction(f"There is no {channel} channel.")
+    if channel not in postable_channels(state, player):
+        if player not in state.players:
+            raise InvalidAction("Only players still in the game can chat.")
+        raise InvalidAction("Only the mafia can use their channel, and only at night.")
+    text = text.strip()
+    if not text:
+        raise InvalidAction("Message is empty.")
+    if len(text) > MAX_MESSAGE_LENGTH:
+        raise InvalidAction(f"Messages are limited to {MAX_MESSAGE_LENGTH} characters.")
+    return text
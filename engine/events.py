@@ -0,0 +1,55 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from engine.rules import InvalidAction, assign_roles, join, reset, resolve_day, resolve_night, submit_action
+from engine.state import GameState
+
+CREATE = "create"
+JOIN = "join"
+START = "start"
+VOTE = "vote"
+NIGHT_RESOLVED = "night_resolved"
+DAY_RESOLVED = "day_resolved"
+RESET = "reset"
+
+EVENT_TYPES = (CREATE, JOIN, START, VOTE, NIGHT_RESOLVED, DAY_RESOLVED, RESET)
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+def apply_event(state: GameState, event_type: str, payload: Dict[str, Any]) -> Any:
+    """Apply one logged event to a game, exactly as it was applied live.
+
+    Returns whatever the underlying rule returns. Resolution events return
+    None when the phase is not finished, in which case nothing was changed.
+    A recorded "deadline" is copied onto the state so replays keep timers.
+    """
+    if event_type == JOIN:
+        result = join(state, payload["name"])
+    elif event_type == START:
+        result = assign_roles(state, seed=payload["seed"])
+    elif event_type == VOTE:
+        result = submit_action(state, payload["voter"], payload["action"], payload.get("target"))
+    elif event_type == NIGHT_RESOLVED:
+        result = resolve_night(state, force=payload.get("force", False))
+        if result is None:
+            return None
+    elif event_type == DAY_RESOLVED:
+        result = resolve_day(state, force=payload.get("force", False))
+        if result is None:
+            return None
+    elif event_type == RESET:
+        result = reset(state)
+    else:
+        raise InvalidAction(f"Unknown event {event_type!r}")
+    if "deadline" in payload:
+        state.deadline = payload["deadline"]
+    return result
+
+def replay(events: Iterable[Event], state: Optional[GameState] = None) -> Optional[GameState]:
+    """Rebuild a game from its events, optionally starting from a snapshot"""
+    for event_type, payload in events:
+        if event_type == CREATE:
+            state = GameState.new(payload["host"])
+        else:
+            apply_event(state, event_type, payload)
+    return state
@@ -0,0 +1,238 @@
+import random
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from engine.state import (
+    DAY, DAY_ACTIONS, DETECTIVE, DOCTOR, LOBBY, MAFIA, MIN_PLAYERS, NIGHT, NIGHT_ACTIONS,
+    TOWN_ROLES, VILLAGER, GameState, Vote,
+)
+
+
+class InvalidAction(ValueError):
+    """Raised when a player tries something the rules don't allow right now"""
+
+
+def mafia_count(num_players: int) -> int:
+    return max(1, num_players // 3)
+
+def assign_roles(state: GameState, seed: Optional[int] = None) -> Dict[str, str]:
+    """Deal roles to everyone in the lobby and start the first night"""
+    if state.started:
+        raise InvalidAction("Game has already started!")
+    if len(state.players) < MIN_PLAYERS:
+        raise InvalidAction(f"Need at least {MIN_PLAYERS} players to start.")
+
+    players = state.players[:]
+    random.Random(seed).shuffle(players)
+    num_mafia = mafia_count(len(players))
+
+    roles = {p: VILLAGER for p in state.players}
+    for p in players[:num_mafia]:
+        roles[p] = MAFIA
+    # Ensure we have enough players for special roles
+    remaining = players[num_mafia:]
+    if len(remaining) > 0:
+        roles[remaining[0]] = DOCTOR
+    if len(remaining) > 1:
+        roles[remaining[1]] = DETECTIVE
+
+    state.roles = roles
+    state.started = True
+    state.phase = NIGHT
+    state.day_count = 1
+    state.votes = {}
+    state.deal += 1
+    return roles
+
+def join(state: GameState, player: str) -> None:
+    """Add a player to the lobby"""
+    if state.started:
+        raise InvalidAction("Game has already started!")
+    if player in state.players:
+        raise InvalidAction(f"{player} is already in this game.")
+    state.players.append(player)
+
+def reset(state: GameState) -> None:
+    """Send a game back to its lobby, keeping whoever is still alive"""
+    state.started = False
+    state.phase = LOBBY
+    state.roles = {}
+    state.votes = {}
+    state.day_count = 1
+    state.night_results = {}
+    state.day_results = {}
+    state.game_over = False
+    state.winner = ""
+    state.deadline = None
+
+
+def valid_targets(state: GameState, player: str) -> List[str]:
+    """Who a player may pick for their action in the current phase"""
+    if state.phase == NIGHT and state.role_of(player) == DOCTOR:
+        return list(state.players)
+    return [p for p in state.players if p != player]
+
+def required_voters(state: GameState) -> List[str]:
+    """Alive players whose vote the current phase is waiting for"""
+    if state.phase == NIGHT:
+        voters = [p for role in NIGHT_ACTIONS for p in state.alive_with_role(role)]
+        return sorted(voters, key=state.players.seat)
+    if state.phase == DAY:
+        return list(state.players)
+    return []
+
+def everyone_voted(state: GameState) -> bool:
+    """Whether every required voter has voted, without listing them.
+
+    submit_action only takes votes from required voters, so comparing
+    counts is enough.
+    """
+    if state.phase == NIGHT:
+        expected = sum(state.alive_count(role) for role in NIGHT_ACTIONS)
+    elif state.phase == DAY:
+        expected = len(state.players)
+    else:
+        return False
+    return expected > 0 and len(state.votes) >= expected
+
+def submit_action(state: GameState, player: str, action: str, target: Optional[str]) -> Vote:
+    """Validate a vote and record it on the state"""
+    if state.game_over or not state.started:
+        raise InvalidAction("The game is not running.")
+    if not state.is_alive(player):
+        raise InvalidAction("Eliminated players cannot vote.")
+    if player in state.votes:
+        raise InvalidAction("You have already voted this phase.")
+    if state.phase == NIGHT:
+        if NIGHT_ACTIONS.get(state.role_of(player)) != action:
+            raise InvalidAction(f"You cannot {action} tonight.")
+    elif action not in DAY_ACTIONS:
+        raise InvalidAction(f"You cannot {action} during the day.")
+    if action == "skip":
+        target = None
+    elif target not in valid_targets(state, player):
+        raise InvalidAction(f"{target} is not a valid target.")
+
+    vote = {"action": action, "target": target}
+    state.votes[player] = vote
+    return vote
+
+
+def check_winner(state: GameState) -> Optional[str]:
+    """Check if the game has ended and return the winner"""
+    alive_mafia = state.alive_count(MAFIA)
+    alive_villagers = sum(state.alive_count(role) for role in TOWN_ROLES)
+
+    if alive_mafia == 0:
+        return "villagers"
+    elif alive_mafia >= alive_villagers:
+        return "mafia"
+
+    return None
+
+def process_night_actions(state: GameState) -> dict:
+    """Apply the night's kill, save and investigation and return results.
+
+    Reads the tallies state.votes keeps, so this doesn't depend on how many
+    votes there are. submit_action only accepts each role's own action, so
+    counting by action is counting by role. Tied kill votes go to whoever of
+    the tied targets has the lowest seat.
+    """
+    votes = state.votes
+    results = {}
+
+    seat = state.players.seat
+    kill_target = votes.leader("kill", seat)
+    save_target = votes.leader("save", seat)
+    investigated = votes.leader("investigate", seat)
+    # Read before the kill below takes the victim's role away
+    role_found = state.roles.get(investigated, "unknown") if investigated else None
+
+    # Process kill vs save
+    if kill_target:
+        if kill_target == save_target:
+            results["death"] = None
+            results["saved"] = save_target
+        else:
+            results["death"] = kill_target
+            if kill_target in state.players:
+                state.players.remove(kill_target)
+            state.roles.pop(kill_target, None)
+
+    if investigated:
+        results["investigation"] = f"{investigated} is a **{role_found.upper()}**"
+
+    return results
+
+def tally_day_votes(state: GameState) -> Tuple[Mapping[str, int], int]:
+    """Votes per elimination target, and skips, read from the running tallies.
+
+    Votes are cleared every phase and only alive players can cast one, so
+    every counted vote is from someone alive.
+    """
+    return state.votes.targets("eliminate"), state.votes.count("skip")
+
+def process_day_votes(state: GameState) -> dict:
+    """Tally the day vote, remove the eliminated player and return results"""
+    votes = state.votes
+
+    results = {"eliminated": None}
+    if not votes.count("eliminate"):
+        results["reason"] = "skip"
+        return results
+
+    leaders = votes.leaders("eliminate")
+    if len(leaders) == 1 and votes.top("eliminate") > votes.count("skip"):
+        eliminated = leaders.pop()
+        if eliminated in state.players:
+            state.players.remove(eliminated)
+        results["eliminated"] = eliminated
+        results["role"] = state.roles.get(eliminated, "unknown")
+    else:
+        results["reason"] = "tie"
+    return results
+
+def _finish_if_won(state: GameState) -> bool:
+    winner = check_winner(state)
+    if winner:
+        state.game_over = True
+        state.winner = winner
+    return bool(winner)
+
+def resolve_night(state: GameState, force: bool = False) -> Optional[dict]:
+    """Resolve a finished night and move to day; None while votes are missing.
+
+    With force the night resolves with whatever actions came in, as when its timer runs out.
+    """
+    if state.phase != NIGHT:
+        return None
+    if not force and not everyone_voted(state):
+        return None
+
+    results = process_night_actions(state)
+    if not _finish_if_won(state):
+        state.night_results = results
+        state.votes = {}
+        state.phase = DAY
+    return results
+
+def resolve_day(state: GameState, force: bool = False) -> Optional[dict]:
+    """Resolve a finished day vote and move to the next night; None while votes are missing.
+
+    With force anyone who has not voted is counted as a skip.
+    """
+    if state.phase != DAY:
+        return None
+    if force:
+        for p in state.players:
+            state.votes.setdefault(p, {"action": "skip", "target": None})
+    elif not everyone_voted(state):
+        return None
+
+    results = process_day_votes(state)
+    state.day_results = results
+    if not _finish_if_won(state):
+        state.votes = {}
+        state.phase = NIGHT
+        state.day_count += 1
+        state.night_results = {}
+    return results
@@ -0,0 +1,468 @@
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set
+
+MAFIA = "mafia"
+DOCTOR = "doctor"
+DETECTIVE = "detective"
+VILLAGER = "villager"
+
+TOWN_ROLES = (VILLAGER, DOCTOR, DETECTIVE)
+NIGHT_ACTIONS = {MAFIA: "kill", DOCTOR: "save", DETECTIVE: "investigate"}
+DAY_ACTIONS = ("eliminate", "skip")
+
+LOBBY = "lobby"
+NIGHT = "night"
+DAY = "day"
+
+MIN_PLAYERS = 4
+
+# A vote is {"action": ..., "target": ...}, exactly as it is stored and sent over the wire.
+Vote = Dict[str, Optional[str]]
+
+
+class Votes(dict):
+    """The phase's votes by voter, with per-action tallies kept up to date as they change.
+
+    Adding, replacing or removing a vote adjusts the counts in O(1), so
+    rendering the vote status or resolving the phase never walks every vote.
+    For each action it also keeps the targets grouped by how many votes they
+    have, which makes the current leaders a lookup. Vote dicts must be
+    replaced rather than edited in place, or the tallies go stale.
+    """
+
+    __slots__ = ("_totals", "_counts", "_groups", "_top")
+
+    def __init__(self, votes: Optional[Mapping[str, Vote]] = None):
+        super().__init__()
+        self._totals: Dict[str, int] = {}
+        self._counts: Dict[str, Dict[Optional[str], int]] = {}
+        self._groups: Dict[str, Dict[int, Set[Optional[str]]]] = {}
+        self._top: Dict[str, int] = {}
+        if votes:
+            self.update(votes)
+
+    def _add(self, vote: Vote) -> None:
+        action, target = vote["action"], vote.get("target")
+        self._totals[action] = self._totals.get(action, 0) + 1
+        counts = self._counts.setdefault(action, {})
+        groups = self._groups.setdefault(action, {})
+        count = counts.get(target, 0)
+        if count:
+            groups[count].discard(target)
+        counts[target] = count + 1
+        groups.setdefault(count + 1, set()).add(target)
+        if count + 1 > self._top.get(action, 0):
+            self._top[action] = count + 1
+
+    def _remove(self, vote: Vote) -> None:
+        action, target = vote["action"], vote.get("target")
+        self._totals[action] -= 1
+        counts, groups = self._counts[action], self._groups[action]
+        count = counts[target]
+        groups[count].discard(target)
+        if count == 1:
+            del counts[target]
+        else:
+            counts[target] = count - 1
+            groups[count - 1].add(target)
+        if not groups[count] and self._top[action] == count:
+            self._top[action] = count - 1
+
+    def __setitem__(self, voter: str, vote: Vote) -> None:
+        old = dict.get(self, voter)
+        if old is not None:
+            self._remove(old)
+        dict.__setitem__(self, voter, vote)
+        self._add(vote)
+
+    def __delitem__(self, voter: str) -> None:
+        self._remove(self[voter])
+        dict.__delitem__(self, voter)
+
+    _missing = object()
+
+    def pop(self, voter, default=_missing):
+        if voter in self:
+            vote = self[voter]
+            del self[voter]
+            return vote
+        if default is Votes._missing:
+            raise KeyError(voter)
+        return default
+
+    def popitem(self):
+        voter, vote = dict.popitem(self)
+        self._remove(vote)
+        return voter, vote
+
+    def setdefault(self, voter, vote=None):
+        if voter not in self:
+            self[voter] = vote
+        return self[voter]
+
+    def update(self, *args, **kwargs) -> None:
+        for voter, vote in dict(*args, **kwargs).items():
+            self[voter] = vote
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self) -> None:
+        dict.clear(self)
+        for tallies in (self._totals, self._counts, self._groups, self._top):
+            tallies.clear()
+
+    def copy(self) -> "Votes":
+        return Votes(self)
+
+    def __reduce__(self):
+        # Rebuild through __init__ so copies and pickles recount instead of adding twice.
+        return Votes, (dict(self),)
+
+    def count(self, action: str) -> int:
+        """How many votes for this action have been cast"""
+        return self._totals.get(action, 0)
+
+    def targets(self, action: str) -> Mapping[Optional[str], int]:
+        """Votes per target for this action, as a read-only live view"""
+        return MappingProxyType(self._counts.get(action, {}))
+
+    def top(self, action: str) -> int:
+        """The most votes any one target has for this action"""
+        return self._top.get(action, 0)
+
+    def leaders(self, action: str) -> Set[Optional[str]]:
+        """Targets sharing the most votes for this action"""
+        top = self.top(action)
+        return set(self._groups[action][top]) if top else set()
+
+    def leader(self, action: str, seat: Callable[[Optional[str]], Optional[int]]) -> Optional[str]:
+        """The target with the most votes for this action, ties going to the lowest seat.
+
+        seat maps a target to its seat (normally state.players.seat), so ties
+        never depend on vote or hash order. A tied target without a seat
+        comes after every seated one.
+        """
+        leaders = self.leaders(action)
+        if len(leaders) <= 1:
+            return next(iter(leaders), None)
+        def order(target):
+            number = seat(target)
+            return number is None, number or 0, str(target)
+        return min(leaders, key=order)
+
+
+class Roster:
+    """Alive players in seat order, with O(1) membership, removal and seat lookup.
+
+    Each player gets a dense integer seat number when they're added; numbers
+    only grow, so comparing two seats compares who sat down first. Once
+    linked to the game's Roles it also keeps the alive players of each role,
+    which makes role counts O(1). Iterating, len() and `in` work as on the
+    list this replaces; indexing builds that list once and keeps it until
+    the roster changes.
+    """
+
+    __slots__ = ("_seats", "_next", "_order", "_roles", "_by_role")
+
+    def __init__(self, players: Iterable[str] = ()):
+        self._seats: Dict[str, int] = {}
+        self._next = 0
+        self._order: Optional[List[str]] = None
+        self._roles: Optional["Roles"] = None
+        self._by_role: Dict[str, Set[str]] = {}
+        for player in players:
+            self.append(player)
+
+    def append(self, player: str) -> None:
+        if player in self._seats:
+            raise ValueError(f"{player} is already seated")
+        self._seats[player] = self._next
+        self._next += 1
+        self._order = None
+        role = self._roles.get(player) if self._roles is not None else None
+        if role is not None:
+            self._by_role.setdefault(role, set()).add(player)
+
+    def remove(self, player: str) -> None:
+        if self._seats.pop(player, None) is None:
+            raise ValueError(f"{player} is not seated")
+        self._order = None
+        role = self._roles.get(player) if self._roles is not None else None
+        if role is not None:
+            self._by_role[role].discard(player)
+
+    def seat(self, player: Optional[str]) -> Optional[int]:
+        """The player's seat number, or None if they aren't alive"""
+        return self._seats.get(player)
+
+    def role_count(self, role: str) -> int:
+        """How many alive players have this role"""
+        return len(self._by_role.get(role, ()))
+
+    def with_role(self, role: str) -> List[str]:
+        """Alive players with this role, in seat order"""
+        return sorted(self._by_role.get(role, ()), key=self._seats.__getitem__)
+
+    def _link(self, roles: "Roles") -> None:
+        self._roles = roles
+        self._by_role = {}
+        for player in self._seats:
+            role = roles.get(player)
+            if role is not None:
+                self._by_role.setdefault(role, set()).add(player)
+
+    def _recast(self, player: str, old: Optional[str], new: Optional[str]) -> None:
+        if player not in self._seats:
+            return
+        if old is not None:
+            self._by_role[old].discard(player)
+        if new is not None:
+            self._by_role.setdefault(new, set()).add(player)
+
+    def _list(self) -> List[str]:
+        if self._order is None:
+            self._order = list(self._seats)
+        return self._order
+
+    def __getitem__(self, index):
+        return self._list()[index]
+
+    def index(self, player: str) -> int:
+        return self._list().index(player)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._seats)
+
+    def __len__(self) -> int:
+        return len(self._seats)
+
+    def __contains__(self, player) -> bool:
+        return player in self._seats
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Roster):
+            return list(self._seats) == list(other._seats)
+        if isinstance(other, (list, tuple)):
+            return list(self._seats) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Roster({list(self._seats)!r})"
+
+    def copy(self) -> "Roster":
+        return Roster(self._seats)
+
+    def __reduce__(self):
+        return Roster, (list(self._seats),)
+
+
+class Roles(dict):
+    """Each dealt player's role; changes are passed on to the linked Roster's role index"""
+
+    __slots__ = ("_roster",)
+
+    def __init__(self, roles: Optional[Mapping[str, str]] = None):
+        super().__init__()
+        self._roster: Optional[Roster] = None
+        if roles:
+            self.update(roles)
+
+    def _recast(self, player, old, new) -> None:
+        if self._roster is not None and old != new:
+            self._roster._recast(player, old, new)
+
+    def __setitem__(self, player: str, role: str) -> None:
+        old = dict.get(self, player)
+        dict.__setitem__(self, player, role)
+        self._recast(player, old, role)
+
+    def __delitem__(self, player: str) -> None:
+        old = self[player]
+        dict.__delitem__(self, player)
+        self._recast(player, old, None)
+
+    _missing = object()
+
+    def pop(self, player, default=_missing):
+        if player in self:
+            role = self[player]
+            del self[player]
+            return role
+        if default is Roles._missing:
+            raise KeyError(player)
+        return default
+
+    def popitem(self):
+        player, role = dict.popitem(self)
+        self._recast(player, role, None)
+        return player, role
+
+    def setdefault(self, player, role=None):
+        if player not in self:
+            self[player] = role
+        return self[player]
+
+    def update(self, *args, **kwargs) -> None:
+        for player, role in dict(*args, **kwargs).items():
+            self[player] = role
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self) -> None:
+        for player, role in list(self.items()):
+            del self[player]
+
+    def copy(self) -> "Roles":
+        return Roles(self)
+
+    def __reduce__(self):
+        return Roles, (dict(self),)
+
+
+@dataclass
+class GameState:
+    """Everything the rules need to know about one game"""
+
+    host: str
+    players: Roster = field(default_factory=Roster)
+    started: bool = False
+    roles: Roles = field(default_factory=Roles)
+    phase: str = LOBBY
+    votes: Votes = field(default_factory=Votes)
+    day_count: int = 1
+    night_results: dict = field(default_factory=dict)
+    day_results: dict = field(default_factory=dict)
+    game_over: bool = False
+    winner: str = ""
+    version: int = 0
+    # Wall-clock time (time.time()) when the current phase times out, if any.
+    deadline: Optional[float] = None
+    # How many times roles have been dealt. A restart reuses night 1, so votes
+    # are checked against this as well as the phase and day they were cast in.
+    deal: int = 0
+    # The game as it was last loaded or saved, for dirty_fields(). Never mutated.
+    _clean: Optional["GameState"] = field(default=None, repr=False, compare=False)
+
+    def __setattr__(self, name, value):
+        # Keep the indexed containers whatever gets assigned, e.g. `state.votes = {}` after a phase.
+        if name == "votes" and not isinstance(value, Votes):
+            value = Votes(value)
+        elif name == "players" or name == "roles":
+            kind = Roster if name == "players" else Roles
+            if not isinstance(value, kind):
+                value = kind(value)
+            old = self.__dict__.get("roles")
+            if name == "roles" and old is not None and old is not value:
+                old._roster = None
+            object.__setattr__(self, name, value)
+            players, roles = self.__dict__.get("players"), self.__dict__.get("roles")
+            if players is not None and roles is not None:
+                roles._roster = players
+                players._link(roles)
+            return
+        object.__setattr__(self, name, value)
+
+    def __setstate__(self, state):
+        # copy.deepcopy and pickle restore fields through __setattr__ so the indexes are relinked.
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def new(cls, host: str) -> "GameState":
+        return cls(host=host, players=[host])
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GameState":
+        return cls(
+            host=data["host"],
+            players=Roster(data.get("players", [])),
+            started=bool(data.get("started", False)),
+            roles=Roles(data.get("roles", {})),
+            phase=data.get("phase", LOBBY),
+            votes=Votes(data.get("votes", {})),
+            day_count=data.get("day_count") or 1,
+            night_results=data.get("night_results") or {},
+            day_results=data.get("day_results") or {},
+            game_over=bool(data.get("game_over", False)),
+            winner=data.get("winner") or "",
+            version=data.get("version", 0),
+            deadline=data.get("deadline"),
+            deal=data.get("deal", 0),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "host": self.host,
+            "players": list(self.players),
+            "started": self.started,
+            "roles": dict(self.roles),
+            "phase": self.phase,
+            "votes": dict(self.votes),
+            "day_count": self.day_count,
+            "night_results": self.night_results,
+            "day_results": self.day_results,
+            "game_over": self.game_over,
+            "winner": self.winner,
+            "version": self.version,
+            "deadline": self.deadline,
+            "deal": self.deal,
+        }
+
+    def copy(self) -> "GameState":
+        """An independent copy: the engine may mutate it without touching this one"""
+        return GameState(
+            host=self.host,
+            players=self.players.copy(),
+            started=self.started,
+            roles=self.roles.copy(),
+            phase=self.phase,
+            votes=Votes({voter: dict(vote) for voter, vote in self.votes.items()}),
+            day_count=self.day_count,
+            night_results=dict(self.night_results),
+            day_results=dict(self.day_results),
+            game_over=self.game_over,
+            winner=self.winner,
+            version=self.version,
+            deadline=self.deadline,
+            deal=self.deal,
+            _clean=self._clean,
+        )
+
+    def mark_clean(self) -> None:
+        """Remember the current state as stored; dirty_fields() compares against it"""
+        self._clean = None
+        self._clean = self.copy()
+
+    def dirty_fields(self) -> Set[str]:
+        """Names of the fields changed since mark_clean(), or all of them if never marked"""
+        if self._clean is None:
+            return set(STATE_FIELDS)
+        return {name for name in STATE_FIELDS if getattr(self, name) != getattr(self._clean, name)}
+
+    def is_alive(self, player: str) -> bool:
+        return player in self.players
+
+    def role_of(self, player: str) -> Optional[str]:
+        return self.roles.get(player)
+
+    def alive_with_role(self, role: str) -> List[str]:
+        return self.players.with_role(role)
+
+    def alive_count(self, role: str) -> int:
+        return self.players.role_count(role)
+
+    def eliminated(self) -> List[str]:
+        """Players who were dealt a role and are no longer alive"""
+        players = self.players
+        return [p for p in self.roles if p not in players]
+
+
+# Every persisted field, in declaration order; version is bookkeeping, not state.
+STATE_FIELDS = tuple(f.name for f in fields(GameState) if f.name not in ("version", "_clean"))
@@ -0,0 +1,52 @@
+from typing import Any, Dict
+
+from engine.rules import tally_day_votes, valid_targets
+from engine.state import DAY, DAY_ACTIONS, DETECTIVE, MAFIA, NIGHT, NIGHT_ACTIONS, GameState
+
+
+def player_view(state: GameState, player: str) -> Dict[str, Any]:
+    """What one player may see of a game, as JSON-ready data.
+
+    The same things the Streamlit page shows them: their own role, fellow
+    mafia to the mafia, the detective's report to the detective, the day's
+    running tally, and everyone's role once the game is over.
+    """
+    role = state.role_of(player)
+    alive = state.is_alive(player)
+    view = {
+        "version": state.version,
+        "host": state.host,
+        "players": list(state.players),
+        "eliminated": state.eliminated(),
+        "started": state.started,
+        "phase": state.phase,
+        "day_count": state.day_count,
+        "deadline": state.deadline,
+        "game_over": state.game_over,
+        "winner": state.winner,
+        "you": player,
+        "role": role,
+        "alive": alive,
+        "night_results": {k: v for k, v in state.night_results.items() if k != "investigation"},
+        "day_results": state.day_results,
+        "vote": state.votes.get(player),
+        "actions": [],
+        "targets": [],
+    }
+    if role == MAFIA and alive:
+        view["mafia"] = state.alive_with_role(MAFIA)
+    if role == DETECTIVE and "investigation" in state.night_results:
+        view["investigation"] = state.night_results["investigation"]
+    if state.phase == DAY and state.started:
+        targets, skips = tally_day_votes(state)
+        view["tally"] = {"targets": dict(targets), "skips": skips, "voted": len(state.votes), "of": len(state.players)}
+    if state.game_over:
+        view["roles"] = dict(state.roles)
+    elif state.started and alive and player not in state.votes:
+        if state.phase == NIGHT and role in NIGHT_ACTIONS:
+            view["actions"] = [NIGHT_ACTIONS[role]]
+        elif state.phase == DAY:
+            view["actions"] = list(DAY_ACTIONS)
+        if view["actions"]:
+            view["targets"] = valid_targets(state, player)
+    return view
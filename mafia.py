@@ -1,157 +1,234 @@
 import streamlit as st
-import sqlite3
 import uuid
-import json
-import random
+import os
+import secrets
 import time
+from collections import deque
 
-# --- DATABASE SETUP ---
-def init_db():
-    conn = sqlite3.connect("mafia.db")
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS games (
-            id TEXT PRIMARY KEY,
-            host TEXT,
-            players TEXT,
-            started INTEGER,
-            roles TEXT,
-            phase TEXT,
-            votes TEXT,
-            day_count INTEGER DEFAULT 1,
-            night_results TEXT,
-            game_over INTEGER DEFAULT 0,
-            winner TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def save_game(game_id, game_data):
-    conn = sqlite3.connect("mafia.db")
-    c = conn.cursor()
-    c.execute("""
-        INSERT OR REPLACE INTO games (id, host, players, started, roles, phase, votes, day_count, night_results, game_over, winner)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        game_id,
-        game_data["host"],
-        json.dumps(game_data["players"]),
-        int(game_data["started"]),
-        json.dumps(game_data["roles"]),
-        game_data["phase"],
-        json.dumps(game_data.get("votes", {})),
-        game_data.get("day_count", 1),
-        json.dumps(game_data.get("night_results", {})),
-        int(game_data.get("game_over", False)),
-        game_data.get("winner", "")
-    ))
-    conn.commit()
-    conn.close()
-
-def load_game(game_id):
-    conn = sqlite3.connect("mafia.db")
-    c = conn.cursor()
-    c.execute("SELECT host, players, started, roles, phase, votes, day_count, night_results, game_over, winner FROM games WHERE id = ?", (game_id,))
-    row = c.fetchone()
-    conn.close()
-    if not row:
-        return None
-    return {
-        "host": row[0],
-        "players": json.loads(row[1]),
-        "started": bool(row[2]),
-        "roles": json.loads(row[3]),
-        "phase": row[4],
-        "votes": json.loads(row[5]) if row[5] else {},
-        "day_count": row[6] if row[6] else 1,
-        "night_results": json.loads(row[7]) if row[7] else {},
-        "game_over": bool(row[8]),
-        "winner": row[9] if row[9] else ""
-    }
-
-def game_exists(game_id):
-    conn = sqlite3.connect("mafia.db")
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM games WHERE id = ?", (game_id,))
-    exists = c.fetchone() is not None
-    conn.close()
-    return exists
-
-def check_win_condition(game):
-    """Check if the game has ended and return the winner"""
-    alive_players = game["players"]
-    roles = game["roles"]
-    
-    # Count alive mafia and villagers
-    alive_mafia = [p for p in alive_players if roles.get(p) == "mafia"]
-    alive_villagers = [p for p in alive_players if roles.get(p) in ["villager", "doctor", "detective"]]
-    
-    if len(alive_mafia) == 0:
-        return "villagers"
-    elif len(alive_mafia) >= len(alive_villagers):
-        return "mafia"
-    
-    return None
-
-def process_night_actions(game):
-    """Process all night actions and return results"""
-    votes = game.get("votes", {})
-    roles = game["roles"]
-    results = {}
-    
-    # Get mafia kill votes
-    mafia_votes = []
-    for player, vote in votes.items():
-        if roles.get(player) == "mafia" and vote.get("action") == "kill":
-            mafia_votes.append(vote["target"])
-    
-    # Determine kill target (majority vote among mafia)
-    kill_target = None
-    if mafia_votes:
-        kill_target = max(set(mafia_votes), key=mafia_votes.count)
-    
-    # Get doctor save
-    save_target = None
-    for player, vote in votes.items():
-        if roles.get(player) == "doctor" and vote.get("action") == "save":
-            save_target = vote["target"]
-            break
-    
-    # Get detective investigation
-    investigate_result = ""
-    for player, vote in votes.items():
-        if roles.get(player) == "detective" and vote.get("action") == "investigate":
-            investigated = vote["target"]
-            role_found = roles.get(investigated, "unknown")
-            investigate_result = f"{investigated} is a **{role_found.upper()}**"
-            break
-    
-    # Process kill vs save
-    if kill_target:
-        if kill_target == save_target:
-            results["death"] = None
-            results["saved"] = save_target
+from streamlit.errors import StreamlitAPIException
+
+import bots
+import metrics
+from engine import (
+    DAY, JOIN, MAFIA_CHANNEL, MIN_PLAYERS, NIGHT, PUBLIC, RESET, START, InvalidAction, check_message,
+    everyone_voted, postable_channels, readable_channels, submit_action, tally_day_votes, valid_targets
+)
+from engine import rules
+from scheduler import set_deadline, start_scheduler
+from storage import (
+    cache_stats, init_db, create_game, load_game, game_exists, get_version, load_messages, post_message,
+    record_event, submit_vote, transition_game
+)
+
+# How often each open page checks whether its game has changed.
+POLL_SECONDS = float(os.environ.get("MAFIA_POLL_SECONDS", "2"))
+# Chat messages each page keeps on screen.
+CHAT_SHOWN = 100
+CHANNEL_LABELS = {PUBLIC: "Everyone", MAFIA_CHANNEL: "🔪 Mafia only"}
+
+
+def cast_vote(game, game_id, name, action, target):
+    """Check a vote against the rules, then record it; shows an error if refused"""
+    try:
+        vote = submit_action(game, name, action, target)
+    except InvalidAction as e:
+        st.error(str(e))
+        return False
+    return submit_vote(game_id, game.phase, game.day_count, name, vote["action"], vote["target"], game.deal)
+
+def page_key(game):
+    """What the page shows outside the voting fragments; when it changes the whole page reruns"""
+    return game.started, game.phase, game.day_count, game.game_over, len(game.players)
+
+@st.fragment(run_every=POLL_SECONDS)
+def watch_game(game_id, key, deadline):
+    """Rerun the whole page only once the game has moved past what it shows.
+
+    A vote only bumps the version; the voting fragments pick it up themselves.
+    """
+    if get_version(game_id) != st.session_state.get("seen_version"):
+        game = load_game(game_id)
+        if game is None or page_key(game) != key:
+            st.rerun()
+        st.session_state.seen_version = game.version
+    if deadline:
+        st.caption(f"⏳ {max(0, int(deadline - time.time()))}s left in this phase")
+
+def load_phase(game_id, phase):
+    """Reload the game for a fragment rerun, or rerun the page if it has left this phase"""
+    game = load_game(game_id)
+    if game is None or game.game_over or game.phase != phase:
+        st.rerun()
+    return game
+
+def rerun_fragment():
+    """Rerun only the calling fragment, or the whole page if it ran as part of a full rerun"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def advance_if_done(game, game_id):
+    """Whoever sees the last vote first advances the phase; everyone else just rereads it"""
+    if everyone_voted(game):
+        transition_game(game_id, game.phase, game.day_count, after=set_deadline)
+        st.rerun()
+
+@st.fragment
+@metrics.timed("fragment_night_action")
+def night_action(game_id, name):
+    """This player's night action; choosing and submitting only rerun this fragment"""
+    game = load_phase(game_id, NIGHT)
+    role = game.role_of(name)
+    votes = game.votes
+
+    # Only allow alive players to vote
+    if game.is_alive(name) and name not in votes:
+        if role == "mafia":
+            other_mafia = [p for p in game.alive_with_role("mafia") if p != name]
+            if other_mafia:
+                st.info(f"🤝 Other mafia members: {', '.join(other_mafia)}")
+            else:
+                st.info("🤝 You are the only mafia member.")
+
+            target = st.selectbox("Choose someone to kill:", valid_targets(game, name))
+            if st.button("Submit Kill Vote") and cast_vote(game, game_id, name, "kill", target):
+                st.success("Kill vote submitted!")
+                rerun_fragment()
+
+        elif role == "doctor":
+            target = st.selectbox("Choose someone to save:", valid_targets(game, name))
+            if st.button("Submit Save") and cast_vote(game, game_id, name, "save", target):
+                st.success("Save submitted!")
+                rerun_fragment()
+
+        elif role == "detective":
+            target = st.selectbox("Investigate player:", valid_targets(game, name))
+            if st.button("Submit Investigation") and cast_vote(game, game_id, name, "investigate", target):
+                st.success("Investigation submitted!")
+                rerun_fragment()
+
+        else:
+            st.info("😴 You are a villager. Sleep peacefully and wait for day.")
+
+    elif name in votes:
+        st.success("✅ You have submitted your night action. Waiting for others...")
+
+    advance_if_done(game, game_id)
+
+@st.fragment
+@metrics.timed("fragment_day_vote")
+def day_vote(game_id, name):
+    """This player's day vote; choosing and submitting only rerun this fragment"""
+    game = load_phase(game_id, DAY)
+    if not game.is_alive(name):
+        return
+    if name in game.votes:
+        user_vote = game.votes[name]
+        if user_vote["action"] == "skip":
+            st.success("✅ You voted to skip elimination. Waiting for others...")
         else:
-            results["death"] = kill_target
-            # Remove killed player
-            if kill_target in game["players"]:
-                game["players"].remove(kill_target)
-            if kill_target in game["roles"]:
-                game["roles"].pop(kill_target)
-    
-    if investigate_result:
-        results["investigation"] = investigate_result
-    
-    return results
-
-init_db()
+            st.success(f"✅ You voted to eliminate {user_vote['target']}. Waiting for others...")
+        return
+
+    st.write("**Vote to eliminate someone:**")
+    votable_players = valid_targets(game, name)
+    if not votable_players:
+        st.write("No one to vote for!")
+        return
+
+    target = st.selectbox("Choose someone to eliminate:", [""] + votable_players)
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Vote to Eliminate") and target and cast_vote(game, game_id, name, "eliminate", target):
+            st.success(f"Voted to eliminate {target}!")
+            rerun_fragment()
+    with col2:
+        if st.button("Skip Vote (No Elimination)") and cast_vote(game, game_id, name, "skip", None):
+            st.success("Voted to skip elimination!")
+            rerun_fragment()
+
+@st.fragment(run_every=POLL_SECONDS)
+@metrics.timed("fragment_vote_status")
+def vote_status(game_id):
+    """The day's running tally; polls on its own so other players' votes show up without a page rerun"""
+    game = load_phase(game_id, DAY)
+    vote_counts, skip_count = tally_day_votes(game)
+
+    st.write("**Current Votes:**")
+    for target, count in vote_counts.items():
+        st.write(f"- {target}: {count} votes")
+    if skip_count > 0:
+        st.write(f"- Skip elimination: {skip_count} votes")
+    st.write(f"**{len(game.votes)}/{len(game.players)} players have voted**")
+
+    # Process votes when everyone has voted
+    advance_if_done(game, game_id)
+
+@st.fragment(run_every=POLL_SECONDS)
+@metrics.timed("fragment_chat")
+def chat(game_id, name, readable, postable):
+    """The game's chat; each poll only fetches messages after the last one this page has"""
+    if st.session_state.get("chat_channels") != (game_id, readable):
+        # A new game or a new role: start the log over with what this player may read
+        st.session_state.chat_channels = (game_id, readable)
+        st.session_state.chat_cursor = 0
+        st.session_state.chat_log = deque(maxlen=CHAT_SHOWN)
+
+    log_box = st.container(height=240)
+    if postable:
+        with st.form("chat_form", clear_on_submit=True, border=False):
+            text = st.text_input("Message", placeholder="Say something...", label_visibility="collapsed")
+            channel = postable[0]
+            if len(postable) > 1:
+                channel = st.radio("To", postable, format_func=CHANNEL_LABELS.get, horizontal=True)
+            if st.form_submit_button("Send") and text.strip():
+                game = load_game(game_id)
+                if game is None:
+                    st.rerun()
+                try:
+                    post_message(game_id, name, channel, check_message(game, name, channel, text))
+                except InvalidAction as e:
+                    st.error(str(e))
+
+    messages = load_messages(game_id, st.session_state.chat_cursor)
+    if messages:
+        st.session_state.chat_cursor = messages[-1][0]
+        st.session_state.chat_log.extend(m for m in messages if m[2] in readable)
+    with log_box:
+        for _, sender, channel, text, _ in st.session_state.chat_log:
+            st.text(f"{'🔪 ' if channel == MAFIA_CHANNEL else ''}{sender}: {text}")
+
+@st.cache_resource
+def open_storage():
+    """Create or migrate the database once per process, not on every rerun"""
+    init_db()
+    return True
+
+@st.cache_resource
+def phase_scheduler():
+    return start_scheduler()
+
+@st.cache_resource
+def instrument_engine():
+    # The engine can't import metrics, so its hot functions are wrapped from here.
+    metrics.instrument(rules, "process_night_actions", "process_day_votes", "check_winner")
+    return True
+
+def profile_requested():
+    """Profile this rerun if the page was opened with ?profile=1 or the Metrics page asked for it"""
+    return st.query_params.get("profile") == "1" or st.session_state.pop("profile_next", False)
+
+open_storage()
+phase_scheduler()
+instrument_engine()
 st.title("🎭 Mafia Party Game")
 st.set_page_config(page_title="Mafia - The Party Game", page_icon="🕵️‍♂️")
 st.markdown(f"[📩 Download the mobile app now!](https://github.com/sortira/mafia/releases/download/apk/The.Mafia.Game.apk)", unsafe_allow_html=True)
 st.markdown("Play the popular party game Mafia with your friends online, no need for one of you to sit out as Narrator! Have fun!")
 st.sidebar.title("🧭 Navigation")
-page = st.sidebar.radio("Go to", ["Game", "Help", "About"])
+page = st.sidebar.radio("Go to", ["Game", "Help", "About"] + (["Metrics"] if metrics.ENABLED else []))
+metrics.count_rerun(st.session_state.setdefault("session_id", uuid.uuid4().hex), st.session_state.get("game_id"))
 
 if page == "Game":
     if "game_id" not in st.session_state:
@@ -161,19 +238,7 @@ if page == "Game":
             host_name = st.text_input("Enter your name (you will be the host):")
             if st.button("Create Game") and host_name:
                 game_id = str(uuid.uuid4())[:6]
-                game_data = {
-                    "players": [host_name],
-                    "host": host_name,
-                    "started": False,
-                    "roles": {},
-                    "phase": "lobby",
-                    "votes": {},
-                    "day_count": 1,
-                    "night_results": {},
-                    "game_over": False,
-                    "winner": ""
-                }
-                save_game(game_id, game_data)
+                create_game(game_id, host_name)
                 st.session_state.game_id = game_id
                 st.session_state.name = host_name
                 st.success(f"Game created! Share this Game ID: `{game_id}`")
@@ -185,17 +250,19 @@ if page == "Game":
             join_id = st.text_input("Enter Game ID:")
             if st.button("Join Game") and join_name and join_id:
                 if game_exists(join_id):
+                    try:
+                        joined = record_event(join_id, JOIN, {"name": join_name}) is not None
+                    except InvalidAction:
+                        joined = False
                     game = load_game(join_id)
-                    if not game["started"] and join_name not in game["players"]:
-                        game["players"].append(join_name)
-                        save_game(join_id, game)
+                    if joined:
                         st.session_state.game_id = join_id
                         st.session_state.name = join_name
                         st.success(f"Joined Game {join_id} as {join_name}")
                         st.rerun()
-                    elif game["started"]:
+                    elif game.started:
                         st.error("Game has already started!")
-                    elif join_name in game["players"]:
+                    elif join_name in game.players:
                         st.session_state.game_id = join_id
                         st.session_state.name = join_name
                         st.success(f"Rejoined Game {join_id} as {join_name}")
@@ -216,313 +283,138 @@ if page == "Game":
             st.session_state.clear()
             st.stop()
 
-        # Check if player is still alive
-        if game["started"] and name not in game["players"]:
-            st.error("💀 You have been eliminated from the game!")
-            st.write("You can still observe the game:")
+        st.session_state.seen_version = game.version
+        watch_game(game_id, page_key(game), game.deadline)
+
+        # Time (and maybe profile) everything this phase renders
+        phase = game.phase if game.started else "lobby"
+        with metrics.timer(f"render_{phase}"), metrics.profiled(f"render_{phase}", force=profile_requested()):
+            # Check if player is still alive
+            if game.started and not game.is_alive(name):
+                st.error("💀 You have been eliminated from the game!")
+                st.write("You can still observe the game:")
             
-        st.header(f"You are {name} in Game {game_id} - Day {game.get('day_count', 1)}")
+            st.header(f"You are {name} in Game {game_id} - Day {game.day_count}")
         
-        # Show game over screen
-        if game.get("game_over", False):
-            st.success("🎉 **GAME OVER** 🎉")
-            winner = game.get("winner", "")
-            if winner == "mafia":
-                st.error("🔪 **MAFIA WINS!** The town has been overrun!")
-            elif winner == "villagers":
-                st.success("🏆 **VILLAGERS WIN!** All mafia have been eliminated!")
+            # Show game over screen
+            if game.game_over:
+                st.success("🎉 **GAME OVER** 🎉")
+                winner = game.winner
+                if winner == "mafia":
+                    st.error("🔪 **MAFIA WINS!** The town has been overrun!")
+                elif winner == "villagers":
+                    st.success("🏆 **VILLAGERS WIN!** All mafia have been eliminated!")
             
-            st.subheader("Final Results:")
-            for player, role in game["roles"].items():
-                emoji = "💀" if player not in game["players"] else "✅"
-                st.write(f"{emoji} **{player}** - {role.upper()}")
+                st.subheader("Final Results:")
+                for player, role in game.roles.items():
+                    emoji = "💀" if not game.is_alive(player) else "✅"
+                    st.write(f"{emoji} **{player}** - {role.upper()}")
             
-            if st.button("🔄 Refresh"):
-                st.rerun()
-            
-            if st.button("🏠 Return to Lobby"):
-                st.session_state.clear()
-                st.rerun()
-            st.stop()
-
-        # Show current players
-        st.write("**Players:**")
-        for p in game["players"]:
-            role_info = ""
-            if game["started"] and p == name:
-                role_info = f" - **{game['roles'].get(p, 'unknown').upper()}**"
-            st.markdown(f"- {p}{role_info}")
-
-        # Show eliminated players
-        if game["started"]:
-            all_original_players = list(game["roles"].keys())
-            eliminated = [p for p in all_original_players if p not in game["players"]]
-            if eliminated:
-                st.write("**Eliminated:**")
-                for p in eliminated:
-                    st.markdown(f"- 💀 {p}")
-
-        if st.button("🔄 Refresh"):
-            st.rerun()
-
-        # LOBBY PHASE
-        if not game["started"]:
-            if name == game["host"] and len(game["players"]) >= 4:
-                if st.button("Start Game"):
-                    players = game["players"][:]
-                    random.shuffle(players)
-                    roles = {}
-                    num_mafia = max(1, len(players) // 3)
-                    
-                    # Assign roles
-                    mafia = players[:num_mafia]
-                    remaining = players[num_mafia:]
-                    
-                    # Ensure we have enough players for special roles
-                    doctor = remaining[0] if len(remaining) > 0 else None
-                    detective = remaining[1] if len(remaining) > 1 else None
-                    
-                    for p in players:
-                        if p in mafia:
-                            roles[p] = "mafia"
-                        elif p == doctor:
-                            roles[p] = "doctor"
-                        elif p == detective:
-                            roles[p] = "detective"
-                        else:
-                            roles[p] = "villager"
-                    
-                    game["roles"] = roles
-                    game["started"] = True
-                    game["phase"] = "night"
-                    game["day_count"] = 1
-                    save_game(game_id, game)
+                if st.button("🏠 Return to Lobby"):
+                    st.session_state.clear()
                     st.rerun()
-            elif name == game["host"]:
-                st.info("Need at least 4 players to start.")
-            else:
-                st.info("Waiting for host to start the game...")
+                st.stop()
 
-        # NIGHT PHASE
-        elif game["phase"] == "night":
-            st.subheader(f"🌙 Night {game.get('day_count', 1)}: Take your action")
-            
-            # Show night results from previous night
-            if game.get("night_results"):
-                results = game["night_results"]
-                if results.get("death"):
-                    st.error(f"💀 **{results['death']}** was killed during the night!")
-                elif results.get("saved"):
-                    st.success(f"✨ **{results['saved']}** was saved by the Doctor!")
-                else:
-                    st.info("🌅 Everyone survived the night!")
-            
-            role = game["roles"].get(name)
-            votes = game.get("votes", {})
-
-            # Only allow alive players to vote
-            if name in game["players"] and name not in votes:
-                if role == "mafia":
-                    other_mafia = [p for p in game["players"] if game["roles"].get(p) == "mafia" and p != name]
-                    if other_mafia:
-                        st.info(f"🤝 Other mafia members: {', '.join(other_mafia)}")
-                    else:
-                        st.info("🤝 You are the only mafia member.")
-                    
-                    target = st.selectbox("Choose someone to kill:", [p for p in game["players"] if p != name])
-                    if st.button("Submit Kill Vote"):
-                        votes[name] = {"action": "kill", "target": target}
-                        game["votes"] = votes
-                        save_game(game_id, game)
-                        st.success("Kill vote submitted!")
-                        st.rerun()
+            # Show current players
+            st.write("**Players:**")
+            for p in game.players:
+                role_info = ""
+                if game.started and p == name:
+                    role_info = f" - **{(game.role_of(p) or 'unknown').upper()}**"
+                st.markdown(f"- {p}{role_info}")
 
-                elif role == "doctor":
-                    target = st.selectbox("Choose someone to save:", game["players"])
-                    if st.button("Submit Save"):
-                        votes[name] = {"action": "save", "target": target}
-                        game["votes"] = votes
-                        save_game(game_id, game)
-                        st.success("Save submitted!")
-                        st.rerun()
+            # Show eliminated players
+            if game.started:
+                eliminated = game.eliminated()
+                if eliminated:
+                    st.write("**Eliminated:**")
+                    for p in eliminated:
+                        st.markdown(f"- 💀 {p}")
 
-                elif role == "detective":
-                    target = st.selectbox("Investigate player:", [p for p in game["players"] if p != name])
-                    if st.button("Submit Investigation"):
-                        votes[name] = {"action": "investigate", "target": target}
-                        game["votes"] = votes
-                        save_game(game_id, game)
-                        st.success("Investigation submitted!")
+            # LOBBY PHASE
+            if not game.started:
+                if name == game.host and len(game.players) >= MIN_PLAYERS:
+                    if st.button("Start Game"):
+                        # The seed is logged with the event so the deal can be replayed
+                        try:
+                            record_event(game_id, START, {"seed": secrets.randbits(32)}, after=set_deadline)
+                        except InvalidAction:
+                            pass  # someone else started it since this rerun loaded the lobby
                         st.rerun()
-
+                elif name == game.host:
+                    st.info(f"Need at least {MIN_PLAYERS} players to start.")
                 else:
-                    st.info("😴 You are a villager. Sleep peacefully and wait for day.")
-            
-            elif name in votes:
-                st.success("✅ You have submitted your night action. Waiting for others...")
+                    st.info("Waiting for host to start the game...")
 
-            # Check if all required players have voted
-            alive_roles = {p: r for p, r in game["roles"].items() if p in game["players"]}
-            required_voters = [p for p, r in alive_roles.items() if r in ["mafia", "doctor", "detective"]]
-            
-            if required_voters and all(p in votes for p in required_voters):
-                # Process night actions
-                results = process_night_actions(game)
-                
-                # Check win condition
-                winner = check_win_condition(game)
-                if winner:
-                    game["game_over"] = True
-                    game["winner"] = winner
-                    save_game(game_id, game)
-                    st.rerun()
-                
-                # Move to day phase
-                game["night_results"] = results
-                game["votes"] = {}
-                game["phase"] = "day"
-                save_game(game_id, game)
-                st.rerun()
+                # Bots join like anyone else and play from this server process
+                if name == game.host:
+                    with st.expander("🤖 Add bot players"):
+                        col1, col2 = st.columns(2)
+                        bot_count = col1.number_input("How many?", min_value=1, max_value=20,
+                                                      value=max(1, MIN_PLAYERS - len(game.players)))
+                        bot_policy = col2.selectbox("Strategy", list(bots.POLICIES))
+                        if st.button("Add Bots"):
+                            bots.add_bots(game_id, int(bot_count), bot_policy)
+                            st.rerun()
 
-        # DAY PHASE
-        elif game["phase"] == "day":
-            st.subheader(f"☀️ Day {game.get('day_count', 1)}: Village Discussion & Voting")
+            # NIGHT PHASE
+            elif game.phase == "night":
+                st.subheader(f"🌙 Night {game.day_count}: Take your action")
             
-            # Show last night's results
-            if game.get("night_results"):
-                results = game["night_results"]
-                if results.get("death"):
-                    st.error(f"💀 **{results['death']}** was found dead this morning!")
-                elif results.get("saved"):
-                    st.success(f"✨ Someone was saved by the Doctor last night!")
-                else:
-                    st.info("🌅 Everyone survived the night!")
-                
-                # Show investigation result only to detective
-                if results.get("investigation") and game["roles"].get(name) == "detective":
-                    st.info(f"🕵️ **Detective Report:** {results['investigation']}")
-            
-            votes = game.get("votes", {})
-            
-            # Voting section for alive players
-            if name in game["players"]:
-                if name not in votes:
-                    st.write("**Vote to eliminate someone:**")
-                    votable_players = [p for p in game["players"] if p != name]
-                    
-                    if votable_players:
-                        target = st.selectbox("Choose someone to eliminate:", [""] + votable_players)
-                        
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            if st.button("Vote to Eliminate") and target:
-                                votes[name] = {"action": "eliminate", "target": target}
-                                game["votes"] = votes
-                                save_game(game_id, game)
-                                st.success(f"Voted to eliminate {target}!")
-                                st.rerun()
-                        
-                        with col2:
-                            if st.button("Skip Vote (No Elimination)"):
-                                votes[name] = {"action": "skip", "target": None}
-                                game["votes"] = votes
-                                save_game(game_id, game)
-                                st.success("Voted to skip elimination!")
-                                st.rerun()
-                    else:
-                        st.write("No one to vote for!")
-                else:
-                    user_vote = votes[name]
-                    if user_vote["action"] == "skip":
-                        st.success("✅ You voted to skip elimination. Waiting for others...")
+                # Show the outcome of the previous day's vote
+                if game.day_results:
+                    results = game.day_results
+                    if results.get("eliminated"):
+                        st.error(f"🗳️ **{results['eliminated']}** was eliminated by majority vote!")
+                        st.info(f"💀 **{results['eliminated']}** was a **{results['role'].upper()}**")
+                    elif results.get("reason") == "tie":
+                        st.info("🤝 No elimination today due to tie vote or majority skip!")
                     else:
-                        st.success(f"✅ You voted to eliminate {user_vote['target']}. Waiting for others...")
-            
-            # Show current vote status
-            alive_players = game["players"]
-            vote_counts = {}
-            skip_count = 0
-            
-            for voter, vote in votes.items():
-                if voter in alive_players:  # Only count votes from alive players
-                    if vote["action"] == "skip":
-                        skip_count += 1
+                        st.info("🤝 No elimination today - everyone voted to skip!")
+
+                # Show night results from previous night
+                if game.night_results:
+                    results = game.night_results
+                    if results.get("death"):
+                        st.error(f"💀 **{results['death']}** was killed during the night!")
+                    elif results.get("saved"):
+                        st.success(f"✨ **{results['saved']}** was saved by the Doctor!")
                     else:
-                        target = vote["target"]
-                        vote_counts[target] = vote_counts.get(target, 0) + 1
+                        st.info("🌅 Everyone survived the night!")
             
-            st.write("**Current Votes:**")
-            for target, count in vote_counts.items():
-                st.write(f"- {target}: {count} votes")
-            if skip_count > 0:
-                st.write(f"- Skip elimination: {skip_count} votes")
-            
-            voted_players = len([v for v in votes.values() if v])
-            st.write(f"**{voted_players}/{len(alive_players)} players have voted**")
+                night_action(game_id, name)
+
+            # DAY PHASE
+            elif game.phase == "day":
+                st.subheader(f"☀️ Day {game.day_count}: Village Discussion & Voting")
             
-            # Process votes when everyone has voted
-            if voted_players == len(alive_players):
-                # Determine elimination target
-                if vote_counts:
-                    max_votes = max(vote_counts.values())
-                    
-                    # Check for ties
-                    tied_players = [p for p, v in vote_counts.items() if v == max_votes]
-                    
-                    if len(tied_players) == 1 and max_votes > skip_count:
-                        # Clear winner
-                        eliminated = tied_players[0]
-                        st.error(f"🗳️ **{eliminated}** has been eliminated by majority vote!")
-                        
-                        # Remove eliminated player
-                        if eliminated in game["players"]:
-                            game["players"].remove(eliminated)
-                        
-                        # Reveal their role
-                        eliminated_role = game["roles"].get(eliminated, "unknown")
-                        st.info(f"💀 **{eliminated}** was a **{eliminated_role.upper()}**")
-                        
+                # Show last night's results
+                if game.night_results:
+                    results = game.night_results
+                    if results.get("death"):
+                        st.error(f"💀 **{results['death']}** was found dead this morning!")
+                    elif results.get("saved"):
+                        st.success(f"✨ Someone was saved by the Doctor last night!")
                     else:
-                        # Tie or skip wins
-                        st.info("🤝 No elimination today due to tie vote or majority skip!")
-                else:
-                    st.info("🤝 No elimination today - everyone voted to skip!")
+                        st.info("🌅 Everyone survived the night!")
                 
-                # Check win condition
-                winner = check_win_condition(game)
-                if winner:
-                    game["game_over"] = True
-                    game["winner"] = winner
-                    save_game(game_id, game)
-                    st.rerun()
-                
-                # Move to next night
-                game["votes"] = {}
-                game["phase"] = "night"
-                game["day_count"] = game.get("day_count", 1) + 1
-                game["night_results"] = {}  # Clear previous night results
-                save_game(game_id, game)
-                
-                st.info("🌙 Moving to night phase...")
-                time.sleep(2)  # Brief pause before refresh
-                st.rerun()
+                    # Show investigation result only to detective
+                    if results.get("investigation") and game.role_of(name) == "detective":
+                        st.info(f"🕵️ **Detective Report:** {results['investigation']}")
+            
+                day_vote(game_id, name)
+                vote_status(game_id)
 
-        # Reset game button for host
-        if name == game["host"]:
-            st.markdown("---")
-            if st.button("🔄 Reset Game (Host Only)", type="secondary"):
-                # Reset game to lobby state
-                game["started"] = False
-                game["phase"] = "lobby"
-                game["roles"] = {}
-                game["votes"] = {}
-                game["day_count"] = 1
-                game["night_results"] = {}
-                game["game_over"] = False
-                game["winner"] = ""
-                save_game(game_id, game)
-                st.success("Game reset to lobby!")
-                st.rerun()
+            st.subheader("💬 Chat")
+            chat(game_id, name, readable_channels(game, name), postable_channels(game, name))
+
+            # Reset game button for host
+            if name == game.host:
+                st.markdown("---")
+                if st.button("🔄 Reset Game (Host Only)", type="secondary"):
+                    record_event(game_id, RESET)
+                    st.success("Game reset to lobby!")
+                    st.rerun()
 elif page == "Help":
     st.header("🆘 Help - How to Play")
     st.markdown("""
@@ -559,3 +451,29 @@ elif page == "About":
     The inspiration behind this was one of my friends at another uni mentioned playing this game with their friends in their hostel and when I checked out the rules, I was sad that one of the people had to sit out as the narrator, which prompted me to build this so as to bypass the need for a narrator.
     Source code available on Github
     """)
+
+elif page == "Metrics":
+    st.header("📈 Metrics")
+    st.caption(f"This server process only. Sessions and games count as active for {metrics.ACTIVE_SECONDS:.0f}s after their last rerun.")
+    sessions, games = metrics.REGISTRY.activity()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Active sessions", sessions)
+    col2.metric("Active games", len(games))
+    col3.metric("Reruns", metrics.REGISTRY.counters.get("reruns", 0))
+
+    st.subheader("Operation timings")
+    st.dataframe(metrics.REGISTRY.summary(), width="stretch")
+    st.subheader("Counters")
+    st.json({**metrics.REGISTRY.counters, "reruns_per_active_game": games, "game_cache": cache_stats()})
+    st.download_button("Download Prometheus metrics", metrics.REGISTRY.render(), file_name="mafia.prom")
+
+    st.subheader("Profiles")
+    if st.button("Profile my next game rerun"):
+        st.session_state.profile_next = True
+        st.success("Your next rerun on the Game page will be profiled.")
+    for report in metrics.REGISTRY.profiles:
+        title = f"{report['label']} at {time.strftime('%H:%M:%S', time.localtime(report['time']))}"
+        with st.expander(title):
+            if report["path"]:
+                st.caption(f"Saved to `{report['path']}`")
+            st.code(report["report"])
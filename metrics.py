@@ -0,0 +1,251 @@
+"""Timing histograms, counters and per-rerun profiling, off unless MAFIA_METRICS=1.
+
+Hot-path functions are wrapped with timed() or instrument() and blocks with
+timer(); each observation lands in a fixed-bucket histogram per operation.
+count_rerun() tracks which sessions and games are active. render() turns
+all of it into Prometheus text, which the scheduler writes to
+MAFIA_METRICS_FILE (for node_exporter's textfile collector) and the app's
+Metrics page shows.
+
+With metrics off, timed() and instrument() leave functions untouched and
+timer() and profiled() hand back one shared no-op context, so the cost is
+a function call at most. profiled() runs cProfile over a rerun, either a
+MAFIA_PROFILE_RATE fraction of them or one asked for explicitly, and keeps
+the last few reports (and .prof files under MAFIA_PROFILE_DIR, if set).
+"""
+import contextlib
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+
+ENABLED = os.environ.get("MAFIA_METRICS", "").lower() in ("1", "true", "yes")
+METRICS_FILE = os.environ.get("MAFIA_METRICS_FILE", "")
+PROFILE_RATE = float(os.environ.get("MAFIA_PROFILE_RATE", "0"))
+PROFILE_DIR = os.environ.get("MAFIA_PROFILE_DIR", "")
+# A session or game counts as active if it reran within this many seconds.
+ACTIVE_SECONDS = float(os.environ.get("MAFIA_ACTIVE_SECONDS", "60"))
+
+# Histogram bucket upper bounds in seconds, Prometheus style.
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PROFILES_KEPT = 5
+
+_NOOP = contextlib.nullcontext()
+
+
+class Histogram:
+    """Observation counts per bucket plus their total, like a Prometheus histogram"""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank, seen, lower = q * self.count, 0, 0.0
+        for bound, n in zip(BUCKETS + (BUCKETS[-1] * 2,), self.counts):
+            if n and seen + n >= rank:
+                return lower + (bound - lower) * (rank - seen) / n
+            seen += n
+            lower = bound
+        return BUCKETS[-1]
+
+
+class Registry:
+    """Every histogram, counter and activity record of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.sessions = {}
+        self.game_reruns = {}
+        self.profiles = deque(maxlen=PROFILES_KEPT)
+
+    def observe(self, op, seconds):
+        with self._lock:
+            histogram = self.histograms.get(op)
+            if histogram is None:
+                histogram = self.histograms[op] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def count_rerun(self, session, game_id):
+        now = time.time()
+        with self._lock:
+            self.counters["reruns"] = self.counters.get("reruns", 0) + 1
+            self.sessions[session] = (now, game_id)
+            if game_id:
+                self.game_reruns[game_id] = self.game_reruns.get(game_id, 0) + 1
+
+    def activity(self, now=None):
+        """(active sessions, {active game: reruns}), forgetting whoever went quiet"""
+        cutoff = (now or time.time()) - ACTIVE_SECONDS
+        with self._lock:
+            for session, (seen, _) in list(self.sessions.items()):
+                if seen < cutoff:
+                    del self.sessions[session]
+            games = {game_id for _, game_id in self.sessions.values() if game_id}
+            for game_id in list(self.game_reruns):
+                if game_id not in games:
+                    del self.game_reruns[game_id]
+            return len(self.sessions), dict(self.game_reruns)
+
+    def summary(self):
+        """One row per operation: count, mean and estimated p50/p95/p99 in milliseconds"""
+        with self._lock:
+            return [
+                {
+                    "operation": op,
+                    "count": h.count,
+                    "mean_ms": h.total / h.count * 1e3 if h.count else 0.0,
+                    "p50_ms": h.quantile(0.5) * 1e3,
+                    "p95_ms": h.quantile(0.95) * 1e3,
+                    "p99_ms": h.quantile(0.99) * 1e3,
+                }
+                for op, h in sorted(self.histograms.items())
+            ]
+
+    def render(self):
+        """Everything in the Prometheus text exposition format"""
+        sessions, games = self.activity()
+        lines = [
+            "# HELP mafia_operation_seconds Time spent in instrumented operations.",
+            "# TYPE mafia_operation_seconds histogram",
+        ]
+        with self._lock:
+            for op, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS, h.counts):
+                    cumulative += n
+                    lines.append(f'mafia_operation_seconds_bucket{{op="{op}",le="{bound}"}} {cumulative}')
+                lines.append(f'mafia_operation_seconds_bucket{{op="{op}",le="+Inf"}} {h.count}')
+                lines.append(f'mafia_operation_seconds_sum{{op="{op}"}} {h.total:.6f}')
+                lines.append(f'mafia_operation_seconds_count{{op="{op}"}} {h.count}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE mafia_{name}_total counter")
+                lines.append(f"mafia_{name}_total {value}")
+        lines += [
+            "# TYPE mafia_active_sessions gauge",
+            f"mafia_active_sessions {sessions}",
+            "# TYPE mafia_active_games gauge",
+            f"mafia_active_games {len(games)}",
+            "# TYPE mafia_game_reruns_total counter",
+        ]
+        lines += [f'mafia_game_reruns_total{{game_id="{g}"}} {n}' for g, n in sorted(games.items())]
+        return "\n".join(lines) + "\n"
+
+    def add_profile(self, profile, label):
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(25)
+        path = None
+        if PROFILE_DIR:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+            profile.dump_stats(path)
+        with self._lock:
+            self.profiles.appendleft({"label": label, "time": time.time(), "path": path, "report": out.getvalue()})
+        self.inc("profiles")
+
+
+REGISTRY = Registry()
+
+
+def timed(op):
+    """Decorator timing every call into op's histogram; returns fn itself when metrics are off"""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                REGISTRY.observe(op, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+@contextlib.contextmanager
+def _timer(op):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(op, time.perf_counter() - start)
+
+def timer(op):
+    """Context manager timing its block into op's histogram"""
+    return _timer(op) if ENABLED else _NOOP
+
+def instrument(module, *names):
+    """Replace module-level functions with timed() wrappers, keyed by their own names.
+
+    For code that can't import this module, like the engine: callers
+    inside the module look the names up at call time and get the wrappers.
+    """
+    if not ENABLED:
+        return
+    for name in names:
+        fn = getattr(module, name)
+        if not hasattr(fn, "__wrapped__"):
+            setattr(module, name, timed(name)(fn))
+
+def inc(name, amount=1):
+    if ENABLED:
+        REGISTRY.inc(name, amount)
+
+def count_rerun(session, game_id=None):
+    if ENABLED:
+        REGISTRY.count_rerun(session, game_id)
+
+
+@contextlib.contextmanager
+def _profiled(label):
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        REGISTRY.add_profile(profile, label)
+
+def profiled(label="rerun", force=False):
+    """Context manager running cProfile over its block when forced or sampled"""
+    if not ENABLED or not (force or (PROFILE_RATE and random.random() < PROFILE_RATE)):
+        return _NOOP
+    return _profiled(label)
+
+
+def write_textfile(path=None):
+    """Write render() to path (default MAFIA_METRICS_FILE) atomically; False if there is nowhere to write"""
+    path = path or METRICS_FILE
+    if not ENABLED or not path:
+        return False
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp, path)
+    return True
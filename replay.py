@@ -0,0 +1,52 @@
+"""Print a game's event log and the state rebuilt from it.
+
+Useful for settling "I voted for X!" disputes. Works on any database,
+whichever MAFIA_STORAGE_MODE it was written in, and on swept games that
+were moved to the archive:
+
+    python replay.py ABC123
+    python replay.py ABC123 --db /path/to/mafia.db --json
+"""
+import argparse
+import json
+import sys
+import time
+
+import storage
+from engine import replay
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("game_id")
+    parser.add_argument("--db", default=storage.DB_PATH)
+    parser.add_argument("--json", action="store_true", help="print events and state as JSON")
+    args = parser.parse_args()
+
+    storage.init_db(args.db)
+    events = storage.game_events(args.game_id)
+    if not events:
+        archived = storage.load_archived_game(args.game_id)
+        events = archived[1] if archived else []
+    if not events:
+        sys.exit(f"no events logged for game {args.game_id}")
+    state = replay((event_type, payload) for _, event_type, payload, _ in events)
+
+    if args.json:
+        print(json.dumps({
+            "events": [
+                {"seq": seq, "type": event_type, "payload": payload, "created": created}
+                for seq, event_type, payload, created in events
+            ],
+            "state": state.to_dict(),
+        }, indent=2))
+        return
+    for seq, event_type, payload, created in events:
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+        print(f"{seq:>5}  {stamp}  {event_type:<15} {json.dumps(payload, sort_keys=True)}")
+    print()
+    print(json.dumps(state.to_dict(), indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Background phase timers.
+
+Every running game stores the wall-clock deadline of its current phase in
+the games table. One daemon thread per process polls for phases whose
+deadline has passed and resolves them as if the missing players had
+skipped, so a game never stalls on an AFK role-holder and no request
+thread has to wait on a timer. Because deadlines live in mafia.db, a
+restarted server picks up where the old one stopped, and several
+processes can run schedulers side by side: transition_game lets only
+one of them advance a given phase.
+
+The same thread sweeps the database when it starts and every
+MAFIA_SWEEP_SECONDS after that, see storage.sweep_games, and rewrites
+MAFIA_METRICS_FILE on every poll when metrics are on.
+"""
+import os
+import threading
+import time
+
+import metrics
+from engine import DAY, NIGHT
+from storage import expired_games, sweep_games, transition_game
+
+PHASE_SECONDS = {
+    NIGHT: float(os.environ.get("MAFIA_NIGHT_SECONDS", "120")),
+    DAY: float(os.environ.get("MAFIA_DAY_SECONDS", "300")),
+}
+POLL_SECONDS = float(os.environ.get("MAFIA_SCHEDULER_POLL_SECONDS", "1"))
+SWEEP_SECONDS = float(os.environ.get("MAFIA_SWEEP_SECONDS", "600"))
+
+
+def set_deadline(game, now=None):
+    """Start the timer for whatever phase the game is now in"""
+    if not game.started or game.game_over or game.phase not in PHASE_SECONDS:
+        game.deadline = None
+    else:
+        game.deadline = (now or time.time()) + PHASE_SECONDS[game.phase]
+
+@metrics.timed("run_due")
+def run_due(now=None):
+    """Resolve every phase whose deadline has passed; returns how many this process advanced"""
+    advanced = 0
+    for game_id, phase, day_count in expired_games(now or time.time()):
+        if transition_game(game_id, phase, day_count, force=True, after=set_deadline) is not None:
+            advanced += 1
+    return advanced
+
+
+class PhaseScheduler(threading.Thread):
+    """Daemon thread that calls run_due every poll interval until stopped, sweeping now and then"""
+
+    def __init__(self, interval=POLL_SECONDS, sweep_interval=SWEEP_SECONDS):
+        super().__init__(name="mafia-phase-scheduler", daemon=True)
+        self.interval = interval
+        self.sweep_interval = sweep_interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        next_sweep = 0.0
+        while not self._stop_event.wait(self.interval):
+            try:
+                run_due()
+                if self.sweep_interval and time.time() >= next_sweep:
+                    next_sweep = time.time() + self.sweep_interval
+                    report = sweep_games()
+                    if report["rows"]:
+                        print(f"sweeper: {report}")
+                metrics.write_textfile()
+            except Exception as e:  # keep the timer alive through a locked or busy database
+                print(f"phase scheduler: {e!r}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def start_scheduler():
+    """Start this process's scheduler thread once and return it"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = PhaseScheduler()
+            _scheduler.start()
+    return _scheduler
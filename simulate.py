@@ -0,0 +1,323 @@
+"""Monte Carlo balance simulator for player counts and role ratios.
+
+Plays whole games in NumPy batches using the same rules as the engine package
+and prints win rates per player count and role configuration.
+
+    python simulate.py --players 4-30 --games 1000000 --workers 4
+    python simulate.py --players 8 --mafia 1,2,3 --policy heuristic
+    python simulate.py --players 4-12 --check 2000
+
+--check replays a batch through engine.resolve_night/resolve_day with the
+exact votes the vectorized kernel drew, and fails if any outcome differs.
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - the app itself does not need NumPy
+    sys.exit("simulate.py needs NumPy: pip install numpy")
+
+import engine
+from engine import GameState
+
+VILLAGER, MAFIA, DOCTOR, DETECTIVE = 0, 1, 2, 3
+ROLE_NAMES = {VILLAGER: engine.VILLAGER, MAFIA: engine.MAFIA, DOCTOR: engine.DOCTOR, DETECTIVE: engine.DETECTIVE}
+NIGHT_ACTION = {MAFIA: "kill", DOCTOR: "save", DETECTIVE: "investigate"}
+
+NO_VOTE = -2
+SKIP = -1
+
+RUNNING, MAFIA_WON, TOWN_WON = 0, 1, 2
+
+POLICIES = ("random", "heuristic")
+DAY_SKIP_RATE = 0.1
+
+
+def role_counts(num_players, num_mafia=None):
+    """(mafia, doctors, detectives) as the Start Game handler deals them"""
+    if num_mafia is None:
+        num_mafia = engine.mafia_count(num_players)
+    remaining = num_players - num_mafia
+    return num_mafia, int(remaining > 0), int(remaining > 1)
+
+def deal(rng, games, num_players, counts):
+    num_mafia, doctors, detectives = counts
+    base = np.zeros(num_players, dtype=np.int8)
+    base[:num_mafia] = MAFIA
+    base[num_mafia:num_mafia + doctors] = DOCTOR
+    base[num_mafia + doctors:num_mafia + doctors + detectives] = DETECTIVE
+    return base[np.argsort(rng.random((games, num_players)), axis=1)]
+
+
+def pick(rng, allowed, rows, seats=None):
+    """Draw one allowed column per row, never a row's own seat.
+
+    Rejection sampling keeps this O(batch) instead of materialising a
+    (games, players, players) choice matrix. Every row must have at least
+    one allowed column other than its seat.
+    """
+    n = allowed.shape[1]
+    out = rng.integers(0, n, size=rows.size)
+    bad = ~allowed[rows, out]
+    if seats is not None:
+        bad |= out == seats
+    idx = np.flatnonzero(bad)
+    while idx.size:
+        out[idx] = rng.integers(0, n, size=idx.size)
+        still = ~allowed[rows[idx], out[idx]]
+        if seats is not None:
+            still |= out[idx] == seats[idx]
+        idx = idx[still]
+    return out
+
+def tally(rows, targets, games, num_players):
+    """Per-game vote counts; the winner is the lowest seat among the top counts"""
+    counts = np.bincount(rows * num_players + targets, minlength=games * num_players)
+    counts = counts.reshape(games, num_players)
+    top = counts.max(axis=1)
+    tied = (counts == top[:, None]).sum(axis=1) > 1
+    return counts.argmax(axis=1), top, tied
+
+def winners(roles, alive):
+    """RUNNING, MAFIA_WON or TOWN_WON per game, as check_winner decides it"""
+    mafia = (alive & (roles == MAFIA)).sum(axis=1)
+    town = (alive & (roles != MAFIA)).sum(axis=1)
+    out = np.full(roles.shape[0], RUNNING, dtype=np.int8)
+    out[mafia >= town] = MAFIA_WON
+    out[mafia == 0] = TOWN_WON
+    return out
+
+
+def night(rng, roles, alive, known, investigated, policy):
+    games, n = roles.shape
+    votes = np.full((games, n), NO_VOTE, dtype=np.int16)
+    every = np.arange(games)
+    town_alive = alive & (roles != MAFIA)
+
+    rows, seats = np.nonzero(alive & (roles == MAFIA))
+    if policy == "heuristic":
+        targets = pick(rng, town_alive, every)[rows]
+    else:
+        targets = pick(rng, alive, rows, seats)
+    votes[rows, seats] = targets
+    kill, _, _ = tally(rows, targets, games, n)
+
+    save = np.full(games, -1)
+    drows, dseats = np.nonzero(alive & (roles == DOCTOR))
+    if drows.size:
+        save[drows] = pick(rng, alive, drows)
+        votes[drows, dseats] = save[drows]
+
+    irows, iseats = np.nonzero(alive & (roles == DETECTIVE))
+    if irows.size:
+        allowed = alive.copy()
+        if policy == "heuristic":
+            fresh = alive & ~investigated
+            fresh[irows, iseats] = False
+            # Fall back to anyone alive once everybody has been looked at.
+            has_fresh = fresh[irows].any(axis=1)
+            allowed[irows[has_fresh]] = fresh[irows[has_fresh]]
+        looked = pick(rng, allowed, irows, iseats)
+        votes[irows, iseats] = looked
+        investigated[irows, looked] = True
+        found = roles[irows, looked] == MAFIA
+        known[irows[found], looked[found]] = True
+
+    dies = kill != save
+    alive[every[dies], kill[dies]] = False
+    return votes
+
+
+def day(rng, roles, alive, known, policy):
+    games, n = roles.shape
+    votes = np.full((games, n), NO_VOTE, dtype=np.int16)
+    rows, seats = np.nonzero(alive)
+    targets = pick(rng, alive, rows, seats)
+
+    if policy == "heuristic":
+        exposed = known & alive
+        has_lead = exposed.any(axis=1)
+        lead = exposed.argmax(axis=1)
+        is_mafia = roles[rows, seats] == MAFIA
+        follow = has_lead[rows] & ~is_mafia & (lead[rows] != seats)
+        targets[follow] = lead[rows[follow]]
+        # Mafia pile onto one town player per game.
+        bandwagon = pick(rng, alive & (roles != MAFIA), np.arange(games))
+        targets[is_mafia] = bandwagon[rows[is_mafia]]
+    else:
+        targets[rng.random(rows.size) < DAY_SKIP_RATE] = SKIP
+
+    votes[rows, seats] = targets
+    cast = targets >= 0
+    top_seat, top, tied = tally(rows[cast], targets[cast], games, n)
+    skips = np.bincount(rows[~cast], minlength=games)
+    out = (top > 0) & ~tied & (top > skips)
+    alive[np.flatnonzero(out), top_seat[out]] = False
+    return votes
+
+
+def play(rng, games, num_players, counts, policy, record=False):
+    """Play a batch to completion; returns (winner, nights, history)"""
+    roles = deal(rng, games, num_players, counts)
+    alive = np.ones((games, num_players), dtype=bool)
+    known = np.zeros_like(alive)
+    investigated = np.zeros_like(alive)
+    ids = np.arange(games)
+
+    result = np.zeros(games, dtype=np.int8)
+    nights = np.zeros(games, dtype=np.int16)
+    history = [] if record else None
+    all_roles = roles.copy()
+
+    def finish(done, won):
+        result[ids[done]] = won[done]
+        keep = ~done
+        return roles[keep], alive[keep], known[keep], investigated[keep], ids[keep]
+
+    while ids.size:
+        nights[ids] += 1
+        night_votes = night(rng, roles, alive, known, investigated, policy)
+        won = winners(roles, alive)
+        if record:
+            history.append(("night", ids.copy(), night_votes))
+        roles, alive, known, investigated, ids = finish(won != RUNNING, won)
+        if not ids.size:
+            break
+        day_votes = day(rng, roles, alive, known, policy)
+        won = winners(roles, alive)
+        if record:
+            history.append(("day", ids.copy(), day_votes))
+        roles, alive, known, investigated, ids = finish(won != RUNNING, won)
+
+    return result, nights, (all_roles, history)
+
+
+def run_chunk(job):
+    num_players, num_mafia, games, policy, seed = job
+    rng = np.random.default_rng(seed)
+    counts = role_counts(num_players, num_mafia)
+    winner, nights, _ = play(rng, games, num_players, counts, policy)
+    return int((winner == MAFIA_WON).sum()), games, int(nights.sum())
+
+
+# --- SCALAR CROSS-CHECK ---
+def replay(roles, history, game):
+    """Feed one game's recorded votes through the engine and return its state"""
+    names = [f"p{i}" for i in range(roles.shape[1])]
+    state = GameState(
+        host=names[0], players=list(names), started=True, phase=engine.NIGHT,
+        roles={names[i]: ROLE_NAMES[int(r)] for i, r in enumerate(roles[game])},
+    )
+    for phase, ids, votes in history:
+        row = np.searchsorted(ids, game)
+        if row >= ids.size or ids[row] != game:
+            continue
+        for seat, target in enumerate(votes[row]):
+            if target == NO_VOTE:
+                continue
+            if phase == "night":
+                action = NIGHT_ACTION[int(roles[game, seat])]
+            else:
+                action = "skip" if target == SKIP else "eliminate"
+            engine.submit_action(state, names[seat], action, None if target == SKIP else names[target])
+        resolved = engine.resolve_night(state) if phase == "night" else engine.resolve_day(state)
+        assert resolved is not None, f"game {game}: engine still waiting for votes"
+    return state
+
+def check(games, num_players, counts, policy, seed):
+    """Compare vectorized outcomes with the scalar engine for one batch"""
+    rng = np.random.default_rng(seed)
+    winner, nights, (roles, history) = play(rng, games, num_players, counts, policy, record=True)
+    compared = mismatched = 0
+    for game in range(games):
+        state = replay(roles, history, game)
+        expected = "mafia" if winner[game] == MAFIA_WON else "villagers"
+        compared += 1
+        if state.winner != expected or state.day_count != nights[game]:
+            mismatched += 1
+    return compared, mismatched
+
+
+def parse_players(text):
+    if "-" in text:
+        lo, hi = text.split("-")
+        return list(range(int(lo), int(hi) + 1))
+    return [int(p) for p in text.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", default="4-30", help="range like 4-30 or list like 5,8,12")
+    parser.add_argument("--mafia", default="auto", help="mafia counts to try, e.g. 1,2,3 (default: the app's ratio)")
+    parser.add_argument("--games", type=int, default=100_000, help="games per configuration")
+    parser.add_argument("--batch", type=int, default=100_000, help="games per NumPy batch")
+    parser.add_argument("--policy", choices=POLICIES, default="random")
+    parser.add_argument("--workers", type=int, default=1, help="processes to spread batches over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the table to this file")
+    parser.add_argument("--check", type=int, default=0, metavar="GAMES",
+                        help="replay this many games per configuration through the engine and compare")
+    args = parser.parse_args()
+
+    configs = []
+    for n in parse_players(args.players):
+        options = [None] if args.mafia == "auto" else [int(m) for m in args.mafia.split(",")]
+        configs += [(n, m) for m in options if m is None or 0 < m < n - m]
+
+    seeds = np.random.SeedSequence(args.seed)
+    if args.check:
+        failed = False
+        for (n, m), seq in zip(configs, seeds.spawn(len(configs))):
+            compared, mismatched = check(args.check, n, role_counts(n, m), args.policy, seq)
+            print(f"check players={n:>3} mafia={role_counts(n, m)[0]:>2}: "
+                  f"{compared} games compared, {mismatched} mismatches")
+            failed |= mismatched > 0
+        sys.exit(1 if failed else 0)
+
+    jobs = []
+    for (n, m), seq in zip(configs, seeds.spawn(len(configs))):
+        chunks = [args.batch] * (args.games // args.batch)
+        if args.games % args.batch:
+            chunks.append(args.games % args.batch)
+        for size, chunk_seed in zip(chunks, seq.spawn(len(chunks))):
+            jobs.append((n, m, size, args.policy, chunk_seed))
+
+    start = time.perf_counter()
+    if args.workers > 1:
+        with ProcessPoolExecutor(args.workers) as pool:
+            results = list(pool.map(run_chunk, jobs))
+    else:
+        results = [run_chunk(job) for job in jobs]
+    elapsed = time.perf_counter() - start
+
+    table = {}
+    for job, (mafia_wins, games, nights) in zip(jobs, results):
+        row = table.setdefault((job[0], job[1]), [0, 0, 0])
+        row[0] += mafia_wins
+        row[1] += games
+        row[2] += nights
+
+    print(f"{'players':>7} {'mafia':>5} {'doc':>3} {'det':>3} {'games':>9} {'mafia win':>10} {'town win':>9} {'nights':>7}")
+    rows = []
+    for (n, m), (mafia_wins, games, nights) in table.items():
+        num_mafia, doctors, detectives = role_counts(n, m)
+        rate = mafia_wins / games
+        rows.append({
+            "players": n, "mafia": num_mafia, "doctors": doctors, "detectives": detectives,
+            "games": games, "mafia_win_rate": rate, "avg_nights": nights / games,
+        })
+        print(f"{n:>7} {num_mafia:>5} {doctors:>3} {detectives:>3} {games:>9} "
+              f"{rate:>9.1%} {1 - rate:>9.1%} {nights / games:>7.2f}")
+    total = sum(r["games"] for r in rows)
+    print(f"{total} games in {elapsed:.1f}s ({total / elapsed * 60:,.0f} games/minute, policy={args.policy})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"policy": args.policy, "seed": args.seed, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Game storage behind one process-wide backend.
+
+MAFIA_STORAGE_BACKEND picks it: "sqlite" (the default, one MAFIA_DB file),
+"memory" (nothing touches disk) or "sharded" (MAFIA_SHARDS SQLite files,
+games assigned by a hash of their id). SQLite-backed games are served
+through a process-wide cache of MAFIA_CACHE_SIZE decoded games (0 turns it
+off). The module-level functions below forward to whichever backend is
+active, so callers never hold one directly.
+"""
+import os
+import threading
+
+from metrics import timed
+from storage.base import (
+    ARCHIVE_AFTER_SECONDS, CHAT_KEEP, LOBBY_TTL_SECONDS, STALE_GAME_SECONDS, StorageBackend, VersionConflict,
+)
+from storage.cache import CachedBackend
+from storage.memory import MemoryBackend
+from storage.sharded import ShardedBackend
+from storage.sqlite import EVENT_SOURCED, STORAGE_MODE, SQLiteBackend
+
+BACKENDS = ("sqlite", "memory", "sharded")
+BACKEND = os.environ.get("MAFIA_STORAGE_BACKEND", "sqlite")
+DB_PATH = os.environ.get("MAFIA_DB", "mafia.db")
+SHARDS = int(os.environ.get("MAFIA_SHARDS", "4"))
+CACHE_SIZE = int(os.environ.get("MAFIA_CACHE_SIZE", "256"))
+
+
+def make_backend(name=None, path=None, shards=None, cache_size=None):
+    """Build a backend from explicit arguments, falling back to the environment"""
+    name = name or BACKEND
+    path = path or DB_PATH
+    cache_size = CACHE_SIZE if cache_size is None else cache_size
+    if name == "memory":
+        # Already holds decoded games; a cache in front would only add copies.
+        return MemoryBackend()
+    if name == "sqlite":
+        backend = SQLiteBackend(path)
+    elif name == "sharded":
+        backend = ShardedBackend(path, shards or SHARDS)
+    else:
+        raise ValueError(f"Unknown storage backend {name!r}, expected one of {BACKENDS}")
+    return CachedBackend(backend, cache_size) if cache_size > 0 else backend
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """The process-wide backend, built from the environment on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = make_backend()
+    return _backend
+
+def set_backend(backend):
+    """Swap in another backend (closing the old one) and return it"""
+    global _backend
+    with _backend_lock:
+        if _backend is not None and _backend is not backend:
+            _backend.close()
+        _backend = backend
+    return backend
+
+def init_db(path=None, backend=None, shards=None, cache_size=None):
+    """Create or migrate the active backend's storage.
+
+    Passing a path, backend name, shard count or cache size first switches
+    to a new backend built from them, which is how tools point storage elsewhere.
+    """
+    if path or backend or shards or cache_size is not None:
+        set_backend(make_backend(backend, path, shards, cache_size))
+    get_backend().init()
+
+def cache_stats():
+    """Hit/miss counters of the game cache, or None when there is no cache"""
+    backend = get_backend()
+    return backend.stats() if isinstance(backend, CachedBackend) else None
+
+
+@timed("create_game")
+def create_game(game_id, host):
+    return get_backend().create_game(game_id, host)
+
+@timed("load_game")
+def load_game(game_id):
+    return get_backend().load_game(game_id)
+
+@timed("save_game")
+def save_game(game_id, game, expected_version=None):
+    return get_backend().save_game(game_id, game, expected_version)
+
+@timed("update_game")
+def update_game(game_id, mutate, retries=20):
+    return get_backend().update_game(game_id, mutate, retries)
+
+@timed("record_event")
+def record_event(game_id, event_type, payload=None, phase=None, day_count=None, after=None):
+    return get_backend().record_event(game_id, event_type, payload, phase, day_count, after)
+
+@timed("transition_game")
+def transition_game(game_id, phase, day_count, force=False, after=None):
+    return get_backend().transition_game(game_id, phase, day_count, force, after)
+
+@timed("submit_vote")
+def submit_vote(game_id, phase, day_count, voter, action, target, deal=None):
+    return get_backend().submit_vote(game_id, phase, day_count, voter, action, target, deal)
+
+def load_votes(game_id):
+    return get_backend().load_votes(game_id)
+
+@timed("post_message")
+def post_message(game_id, sender, channel, text):
+    return get_backend().post_message(game_id, sender, channel, text)
+
+@timed("load_messages")
+def load_messages(game_id, after_seq=0):
+    return get_backend().load_messages(game_id, after_seq)
+
+@timed("game_exists")
+def game_exists(game_id):
+    return get_backend().game_exists(game_id)
+
+@timed("get_version")
+def get_version(game_id):
+    return get_backend().get_version(game_id)
+
+def game_events(game_id, after_seq=0):
+    return get_backend().game_events(game_id, after_seq)
+
+def expired_games(now):
+    return get_backend().expired_games(now)
+
+@timed("sweep_games")
+def sweep_games(now=None, lobby_ttl=None, archive_after=None, stale_after=None, full=False):
+    return get_backend().sweep_games(now, lobby_ttl, archive_after, stale_after, full)
+
+def load_archived_game(game_id):
+    return get_backend().load_archived_game(game_id)
+
+
+__all__ = [
+    "ARCHIVE_AFTER_SECONDS", "BACKEND", "BACKENDS", "CACHE_SIZE", "CHAT_KEEP", "DB_PATH", "EVENT_SOURCED",
+    "LOBBY_TTL_SECONDS", "SHARDS", "STALE_GAME_SECONDS", "STORAGE_MODE", "CachedBackend",
+    "MemoryBackend", "SQLiteBackend", "ShardedBackend", "StorageBackend", "VersionConflict",
+    "cache_stats", "create_game", "expired_games", "game_events", "game_exists", "get_backend",
+    "get_version", "init_db", "load_archived_game", "load_game", "load_messages", "load_votes", "make_backend",
+    "post_message", "record_event", "save_game", "set_backend", "submit_vote", "sweep_games", "transition_game",
+    "update_game",
+]
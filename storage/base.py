@@ -0,0 +1,160 @@
+import os
+
+import metrics
+from engine import DAY_RESOLVED, NIGHT, NIGHT_RESOLVED, InvalidAction, submit_action
+
+# Sweeper limits, in seconds of inactivity: lobbies nobody started, finished
+# games (kept around long enough for players to see the result), and running
+# games nobody has voted in, which the phase timer would otherwise cycle forever.
+LOBBY_TTL_SECONDS = float(os.environ.get("MAFIA_LOBBY_TTL_SECONDS", "3600"))
+ARCHIVE_AFTER_SECONDS = float(os.environ.get("MAFIA_ARCHIVE_AFTER_SECONDS", "600"))
+STALE_GAME_SECONDS = float(os.environ.get("MAFIA_STALE_GAME_SECONDS", "21600"))
+# Chat messages kept per game; older ones are dropped as new ones arrive.
+CHAT_KEEP = int(os.environ.get("MAFIA_CHAT_KEEP", "500"))
+
+
+class VersionConflict(Exception):
+    """Raised when a game changed between loading it and saving it"""
+
+
+class StorageBackend:
+    """Where games live. Every method is safe to call from several threads at once.
+
+    Backends implement the primitives below; update_game and transition_game
+    are built on top of them. Games are engine.GameState objects.
+    """
+
+    def init(self):
+        """Create or migrate whatever the backend needs; safe to call repeatedly"""
+
+    def close(self):
+        """Release connections and files held by this process"""
+
+    def create_game(self, game_id, host):
+        """Open a new lobby, start its event log and return it"""
+        raise NotImplementedError
+
+    def load_game(self, game_id):
+        """The game as stored, or None if it does not exist"""
+        raise NotImplementedError
+
+    def save_game(self, game_id, game, expected_version=None):
+        """Write a whole game and return its new version.
+
+        With expected_version the write only lands if nobody else saved the
+        game since it was loaded, otherwise VersionConflict is raised.
+        Nothing is logged.
+        """
+        raise NotImplementedError
+
+    def record_event(self, game_id, event_type, payload=None, phase=None, day_count=None, after=None):
+        """Apply one engine event to a game atomically and log it.
+
+        With phase/day_count the event only applies while the game is still in
+        that phase. after(game) runs once the event is applied, e.g. to start a
+        phase timer. Engine errors (InvalidAction) propagate and nothing is
+        written. Returns the updated game, or None if the game is missing, has
+        moved on, or the phase isn't finished yet.
+        """
+        raise NotImplementedError
+
+    def submit_vote(self, game_id, phase, day_count, voter, action, target, deal=None):
+        """Append one vote to (phase, day_count) of the given deal; False if the rules refuse it now.
+
+        That covers a vote cast in a phase that is over, in a game that was
+        restarted since (a new deal reuses night 1), or by someone who already
+        voted or no longer may. Without deal only the phase is checked.
+        """
+        raise NotImplementedError
+
+    def load_votes(self, game_id):
+        """Return the votes cast so far in the game's current phase"""
+        raise NotImplementedError
+
+    def post_message(self, game_id, sender, channel, text):
+        """Append a chat message and return it as (seq, sender, channel, text, created); None if the game is gone.
+
+        Only the last CHAT_KEEP messages of a game are kept. Seqs keep counting
+        up regardless, so cursors stay valid. Posting doesn't change the game's version.
+        """
+        raise NotImplementedError
+
+    def load_messages(self, game_id, after_seq=0):
+        """The kept chat messages of a game with a seq above after_seq, oldest first"""
+        raise NotImplementedError
+
+    def game_exists(self, game_id):
+        raise NotImplementedError
+
+    def get_version(self, game_id):
+        """Cheap probe for change detection; None if the game is gone"""
+        raise NotImplementedError
+
+    def game_events(self, game_id, after_seq=0):
+        """The logged events of a game as (seq, type, payload, created) tuples"""
+        raise NotImplementedError
+
+    def expired_games(self, now):
+        """(game_id, phase, day_count) for every running game whose phase timer has run out"""
+        raise NotImplementedError
+
+    def sweep_games(self, now=None, lobby_ttl=None, archive_after=None, stale_after=None, full=False):
+        """Evict idle lobbies and archive finished or abandoned games; returns a report dict"""
+        raise NotImplementedError
+
+    def load_archived_game(self, game_id):
+        """(GameState, events) for a swept game, or None if it was never archived"""
+        raise NotImplementedError
+
+    def update_game(self, game_id, mutate, retries=20):
+        """Load a game, apply mutate(game) and compare-and-swap it back.
+
+        mutate may return False to skip the write. On a conflict the game is
+        reloaded and mutate runs again against the fresh state. Returns the game
+        as last seen, or None if it does not exist. Nothing is logged; game
+        actions go through record_event.
+        """
+        for _ in range(retries):
+            game = self.load_game(game_id)
+            if game is None or mutate(game) is False:
+                return game
+            try:
+                self.save_game(game_id, game, expected_version=game.version)
+                return game
+            except VersionConflict:
+                metrics.inc("db_conflict_retries")
+                continue
+        raise VersionConflict(game_id)
+
+    def transition_game(self, game_id, phase, day_count, force=False, after=None):
+        """Advance a game out of (phase, day_count) exactly once.
+
+        Every client that sees a phase finish may call this; the first one to
+        get there while the game is still in that phase resolves it and saves
+        the result. With force the phase resolves even if votes are missing.
+        Returns the saved game, or None if this caller did not perform the
+        transition.
+        """
+        event_type = NIGHT_RESOLVED if phase == NIGHT else DAY_RESOLVED
+        payload = {"force": True} if force else {}
+        return self.record_event(game_id, event_type, payload, phase=phase, day_count=day_count, after=after)
+
+
+def accept_vote(game, phase, day_count, deal, voter, action, target):
+    """Record a vote on game if it is for the game's current phase and deal and the rules allow it.
+
+    Returns the vote as recorded, or None. Backends call this on the stored
+    game inside their write, so a logged VOTE always replays.
+    """
+    if game is None or (game.phase, game.day_count) != (phase, day_count):
+        return None
+    if deal is not None and game.deal != deal:
+        return None
+    try:
+        return submit_action(game, voter, action, target)
+    except InvalidAction:
+        return None
+
+def empty_sweep_report():
+    return {"lobbies": 0, "finished": 0, "stale": 0, "rows": 0, "archive_bytes": 0,
+            "freed_pages": 0, "bytes": 0, "file_bytes": 0}
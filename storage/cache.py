@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from storage.base import StorageBackend, VersionConflict
+
+# Newest chat messages kept in memory per game, and how often a game's buffer
+# asks the backend for messages other processes posted.
+CHAT_BUFFER = int(os.environ.get("MAFIA_CHAT_BUFFER", "100"))
+CHAT_REFRESH_SECONDS = float(os.environ.get("MAFIA_CHAT_REFRESH_SECONDS", "1"))
+
+
+class ChatBuffer:
+    """Ring buffer of one game's newest chat messages, complete for every seq above floor"""
+
+    __slots__ = ("messages", "floor", "checked")
+
+    def __init__(self, size):
+        self.messages = deque(maxlen=size)
+        self.floor = 0
+        self.checked = 0.0
+
+    @property
+    def last(self):
+        return self.messages[-1][0] if self.messages else self.floor
+
+    def extend(self, messages):
+        for message in messages:
+            if message[0] <= self.last:
+                continue  # another reader got here first
+            if len(self.messages) == self.messages.maxlen:
+                self.floor = self.messages[0][0]
+            self.messages.append(message)
+
+
+class CachedBackend(StorageBackend):
+    """Keeps decoded games in front of another backend, checked by version.
+
+    load_game asks the inner backend for the game's version, which is one
+    indexed lookup, and only loads and decodes the full game when that
+    version differs from the cached copy. Writes made through this backend
+    refresh the cache directly; writes from other processes show up as a
+    version change. At most size games are kept, least recently used
+    first out. Callers always get their own copy.
+
+    Chat gets a ChatBuffer per game, for at most size games too. Reads after
+    a cursor the buffer covers are answered from memory. Messages posted
+    through this backend land in the buffer straight away. Messages other
+    processes post are fetched at most every CHAT_REFRESH_SECONDS.
+    """
+
+    def __init__(self, backend, size):
+        self.backend = backend
+        self.size = size
+        self._lock = threading.Lock()
+        self._games = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._chat = OrderedDict()
+        self.chat_reads = 0
+        self.chat_queries = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._games),
+                "size": self.size,
+                "chat_reads": self.chat_reads,
+                "chat_queries": self.chat_queries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._games.clear()
+            self._chat.clear()
+
+    def _get(self, game_id, version):
+        with self._lock:
+            game = self._games.get(game_id)
+            if game is not None and game.version == version:
+                self._games.move_to_end(game_id)
+                self.hits += 1
+                return game.copy()
+            self.misses += 1
+            return None
+
+    def _put(self, game_id, game):
+        with self._lock:
+            cached = self._games.get(game_id)
+            # Never let a slow reader put back an older game than we already have.
+            if cached is not None and cached.version > game.version:
+                return
+            self._games[game_id] = game.copy()
+            self._games.move_to_end(game_id)
+            while len(self._games) > self.size:
+                self._games.popitem(last=False)
+                self.evictions += 1
+
+    def _drop(self, game_id):
+        with self._lock:
+            self._games.pop(game_id, None)
+            self._chat.pop(game_id, None)
+
+    def init(self):
+        self.backend.init()
+
+    def close(self):
+        self.clear()
+        self.backend.close()
+
+    def load_game(self, game_id):
+        version = self.backend.get_version(game_id)
+        if version is None:
+            self._drop(game_id)
+            return None
+        game = self._get(game_id, version)
+        if game is None:
+            game = self.backend.load_game(game_id)
+            if game is None:
+                self._drop(game_id)
+            else:
+                self._put(game_id, game)
+        return game
+
+    def create_game(self, game_id, host):
+        game = self.backend.create_game(game_id, host)
+        self._put(game_id, game)
+        return game
+
+    def save_game(self, game_id, game, expected_version=None):
+        try:
+            version = self.backend.save_game(game_id, game, expected_version)
+        except VersionConflict:
+            self._drop(game_id)
+            raise
+        self._put(game_id, game)
+        return version
+
+    def record_event(self, game_id, event_type, payload=None, phase=None, day_count=None, after=None):
+        game = self.backend.record_event(game_id, event_type, payload, phase, day_count, after)
+        if game is not None:
+            self._put(game_id, game)
+        return game
+
+    def submit_vote(self, game_id, phase, day_count, voter, action, target, deal=None):
+        # The vote bumps the version, so the next load_game sees the cached copy is stale.
+        return self.backend.submit_vote(game_id, phase, day_count, voter, action, target, deal)
+
+    def load_votes(self, game_id):
+        return self.backend.load_votes(game_id)
+
+    def post_message(self, game_id, sender, channel, text):
+        message = self.backend.post_message(game_id, sender, channel, text)
+        if message is not None:
+            with self._lock:
+                buffer = self._chat.get(game_id)
+                if buffer is not None:
+                    if message[0] == buffer.last + 1:
+                        buffer.extend((message,))
+                    else:
+                        buffer.checked = 0.0  # someone else posted in between; catch up on the next read
+        return message
+
+    def load_messages(self, game_id, after_seq=0):
+        now = time.monotonic()
+        with self._lock:
+            self.chat_reads += 1
+            buffer = self._chat.get(game_id)
+            last = buffer.last if buffer is not None else 0
+            stale = buffer is None or now - buffer.checked >= CHAT_REFRESH_SECONDS
+            if stale:
+                self.chat_queries += 1
+        if stale:
+            fresh = self.backend.load_messages(game_id, last)
+            with self._lock:
+                # Look again: the buffer may have been evicted, or replaced, since the first check
+                buffer = self._chat.get(game_id)
+                if buffer is None or buffer.last < last:
+                    buffer = self._chat[game_id] = ChatBuffer(CHAT_BUFFER)
+                    buffer.floor = last  # fresh only starts after the cursor it was fetched from
+                    while len(self._chat) > self.size:
+                        self._chat.popitem(last=False)
+                buffer.extend(fresh)
+                buffer.checked = now
+        with self._lock:
+            buffer = self._chat.get(game_id)
+            if buffer is not None:
+                self._chat.move_to_end(game_id)
+                if after_seq >= buffer.floor:
+                    return [m for m in buffer.messages if m[0] > after_seq]
+            self.chat_queries += 1
+        # Older than anything buffered, e.g. a page opened on a long chat.
+        return self.backend.load_messages(game_id, after_seq)
+
+    def game_exists(self, game_id):
+        return self.backend.game_exists(game_id)
+
+    def get_version(self, game_id):
+        return self.backend.get_version(game_id)
+
+    def game_events(self, game_id, after_seq=0):
+        return self.backend.game_events(game_id, after_seq)
+
+    def expired_games(self, now):
+        return self.backend.expired_games(now)
+
+    def sweep_games(self, now=None, lobby_ttl=None, archive_after=None, stale_after=None, full=False):
+        report = self.backend.sweep_games(now, lobby_ttl, archive_after, stale_after, full)
+        if report["rows"]:
+            self.clear()
+        return report
+
+    def load_archived_game(self, game_id):
+        return self.backend.load_archived_game(game_id)
@@ -0,0 +1,170 @@
+import copy
+import threading
+import time
+from collections import deque
+
+from engine import CREATE, DAY_RESOLVED, NIGHT_RESOLVED, START, VOTE, GameState, apply_event
+from storage.base import (
+    ARCHIVE_AFTER_SECONDS, CHAT_KEEP, LOBBY_TTL_SECONDS, STALE_GAME_SECONDS, StorageBackend, VersionConflict,
+    accept_vote, empty_sweep_report,
+)
+
+
+class _Record:
+    __slots__ = ("game", "events", "messages", "created", "updated")
+
+    def __init__(self, game, now):
+        self.game = game
+        self.events = []
+        self.messages = deque(maxlen=CHAT_KEEP)
+        self.created = now
+        self.updated = now
+
+
+class MemoryBackend(StorageBackend):
+    """Games in a dict behind one lock; for tests, simulations and single-process demos.
+
+    Nothing survives the process, and every caller gets its own copy of a game,
+    so mutating a loaded game never changes the stored one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._games = {}
+        self._archive = {}
+
+    def close(self):
+        with self._lock:
+            self._games.clear()
+            self._archive.clear()
+
+    def _touch(self, record, event_type=None, payload=None):
+        record.updated = time.time()
+        record.game.version += 1
+        if event_type is not None:
+            record.events.append((len(record.events) + 1, event_type, payload, record.updated))
+
+    def create_game(self, game_id, host):
+        game = GameState.new(host)
+        with self._lock:
+            record = self._games[game_id] = _Record(game, time.time())
+            self._touch(record, CREATE, {"host": host})
+            return copy.deepcopy(game)
+
+    def load_game(self, game_id):
+        with self._lock:
+            record = self._games.get(game_id)
+            return copy.deepcopy(record.game) if record else None
+
+    def save_game(self, game_id, game, expected_version=None):
+        with self._lock:
+            record = self._games.get(game_id)
+            if expected_version is not None and (record is None or record.game.version != expected_version):
+                raise VersionConflict(game_id)
+            stored = copy.deepcopy(game)
+            stored.version = record.game.version if record else 0
+            if record is None:
+                record = self._games[game_id] = _Record(stored, time.time())
+            record.game = stored
+            self._touch(record)
+            game.version = stored.version
+            return game.version
+
+    def record_event(self, game_id, event_type, payload=None, phase=None, day_count=None, after=None):
+        payload = dict(payload or {})
+        with self._lock:
+            record = self._games.get(game_id)
+            if record is None:
+                return None
+            current = record.game
+            if phase is not None and (current.phase, current.day_count, current.game_over) != (phase, day_count, False):
+                return None
+            game = copy.deepcopy(current)
+            if apply_event(game, event_type, payload) is None and event_type in (NIGHT_RESOLVED, DAY_RESOLVED):
+                return None
+            if after:
+                after(game)
+            if game.deadline != current.deadline:
+                payload["deadline"] = game.deadline
+            record.game = game
+            self._touch(record, event_type, payload)
+            return copy.deepcopy(game)
+
+    def submit_vote(self, game_id, phase, day_count, voter, action, target, deal=None):
+        with self._lock:
+            record = self._games.get(game_id)
+            vote = accept_vote(record and record.game, phase, day_count, deal, voter, action, target)
+            if vote is None:
+                return False
+            self._touch(record, VOTE, {"voter": voter, **vote})
+            return True
+
+    def load_votes(self, game_id):
+        with self._lock:
+            record = self._games.get(game_id)
+            return copy.deepcopy(record.game.votes) if record and record.game.started else {}
+
+    def post_message(self, game_id, sender, channel, text):
+        with self._lock:
+            record = self._games.get(game_id)
+            if record is None:
+                return None
+            seq = record.messages[-1][0] + 1 if record.messages else 1
+            message = (seq, sender, channel, text, time.time())
+            record.messages.append(message)
+            return message
+
+    def load_messages(self, game_id, after_seq=0):
+        with self._lock:
+            record = self._games.get(game_id)
+            return [m for m in record.messages if m[0] > after_seq] if record else []
+
+    def game_exists(self, game_id):
+        return game_id in self._games
+
+    def get_version(self, game_id):
+        record = self._games.get(game_id)
+        return record.game.version if record else None
+
+    def game_events(self, game_id, after_seq=0):
+        with self._lock:
+            record = self._games.get(game_id)
+            return copy.deepcopy(record.events[after_seq:]) if record else []
+
+    def expired_games(self, now):
+        with self._lock:
+            return [
+                (game_id, r.game.phase, r.game.day_count) for game_id, r in self._games.items()
+                if r.game.deadline is not None and r.game.deadline <= now and r.game.started and not r.game.game_over
+            ]
+
+    def sweep_games(self, now=None, lobby_ttl=None, archive_after=None, stale_after=None, full=False):
+        # Same rules as the SQLite sweeper; "rows" counts games plus their events and chat messages.
+        now = now or time.time()
+        lobby_ttl = LOBBY_TTL_SECONDS if lobby_ttl is None else lobby_ttl
+        archive_after = ARCHIVE_AFTER_SECONDS if archive_after is None else archive_after
+        stale_after = STALE_GAME_SECONDS if stale_after is None else stale_after
+        report = empty_sweep_report()
+        with self._lock:
+            for game_id, record in list(self._games.items()):
+                game = record.game
+                if not game.started:
+                    kind = "lobbies" if record.updated < now - lobby_ttl else None
+                elif game.game_over:
+                    kind = "finished" if record.updated < now - archive_after else None
+                else:
+                    last_move = max([e[3] for e in record.events if e[1] in (START, VOTE)], default=record.created)
+                    kind = "stale" if record.updated < now - stale_after and last_move < now - stale_after else None
+                if kind is None:
+                    continue
+                if kind != "lobbies":
+                    self._archive[game_id] = (game, record.events)
+                del self._games[game_id]
+                report[kind] += 1
+                report["rows"] += 1 + len(record.events) + len(record.messages)
+        return report
+
+    def load_archived_game(self, game_id):
+        with self._lock:
+            archived = self._archive.get(game_id)
+            return copy.deepcopy(archived) if archived else None
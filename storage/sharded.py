@@ -0,0 +1,81 @@
+import os
+import zlib
+
+from storage.base import StorageBackend, empty_sweep_report
+from storage.sqlite import EVENT_SOURCED, SQLiteBackend
+
+
+def shard_paths(path, shards):
+    """mafia.db -> mafia-shard0.db, mafia-shard1.db, ..."""
+    root, ext = os.path.splitext(path)
+    return [f"{root}-shard{i}{ext or '.db'}" for i in range(shards)]
+
+
+class ShardedBackend(StorageBackend):
+    """Games spread over several SQLite files by a hash of their id.
+
+    Each file has its own writer lock, so lobbies on different shards never
+    wait on each other. A game always lives on the same shard; changing the
+    number of shards strands existing games.
+    """
+
+    def __init__(self, path, shards, event_sourced=EVENT_SOURCED):
+        self.shards = [SQLiteBackend(p, event_sourced) for p in shard_paths(path, shards)]
+
+    def shard(self, game_id):
+        # crc32 rather than hash(): it has to agree across processes and restarts.
+        return self.shards[zlib.crc32(game_id.encode()) % len(self.shards)]
+
+    def init(self):
+        for shard in self.shards:
+            shard.init()
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    def create_game(self, game_id, host):
+        return self.shard(game_id).create_game(game_id, host)
+
+    def load_game(self, game_id):
+        return self.shard(game_id).load_game(game_id)
+
+    def save_game(self, game_id, game, expected_version=None):
+        return self.shard(game_id).save_game(game_id, game, expected_version)
+
+    def record_event(self, game_id, event_type, payload=None, phase=None, day_count=None, after=None):
+        return self.shard(game_id).record_event(game_id, event_type, payload, phase, day_count, after)
+
+    def submit_vote(self, game_id, phase, day_count, voter, action, target, deal=None):
+        return self.shard(game_id).submit_vote(game_id, phase, day_count, voter, action, target, deal)
+
+    def load_votes(self, game_id):
+        return self.shard(game_id).load_votes(game_id)
+
+    def post_message(self, game_id, sender, channel, text):
+        return self.shard(game_id).post_message(game_id, sender, channel, text)
+
+    def load_messages(self, game_id, after_seq=0):
+        return self.shard(game_id).load_messages(game_id, after_seq)
+
+    def game_exists(self, game_id):
+        return self.shard(game_id).game_exists(game_id)
+
+    def get_version(self, game_id):
+        return self.shard(game_id).get_version(game_id)
+
+    def game_events(self, game_id, after_seq=0):
+        return self.shard(game_id).game_events(game_id, after_seq)
+
+    def load_archived_game(self, game_id):
+        return self.shard(game_id).load_archived_game(game_id)
+
+    def expired_games(self, now):
+        return [row for shard in self.shards for row in shard.expired_games(now)]
+
+    def sweep_games(self, now=None, lobby_ttl=None, archive_after=None, stale_after=None, full=False):
+        report = empty_sweep_report()
+        for shard in self.shards:
+            for key, value in shard.sweep_games(now, lobby_ttl, archive_after, stale_after, full).items():
+                report[key] += value
+        return report
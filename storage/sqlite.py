@@ -0,0 +1,820 @@
+import os
+import sqlite3
+import threading
+import time
+import weakref
+import json
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+
+import metrics
+from engine import CREATE, DAY_RESOLVED, NIGHT_RESOLVED, STATE_FIELDS, VOTE, GameState, apply_event, replay
+from storage.base import (
+    ARCHIVE_AFTER_SECONDS, CHAT_KEEP, LOBBY_TTL_SECONDS, STALE_GAME_SECONDS, StorageBackend, VersionConflict,
+    accept_vote, empty_sweep_report,
+)
+
+# "tables" reads games from the players/roles/votes tables; "events" rebuilds
+# them from the latest snapshot plus the event log and stops rewriting the
+# player and role tables. Pick one mode per database file.
+STORAGE_MODE = os.environ.get("MAFIA_STORAGE_MODE", "tables")
+EVENT_SOURCED = STORAGE_MODE == "events"
+# Write a compact snapshot once a game has logged this many events since the last one.
+SNAPSHOT_EVERY = int(os.environ.get("MAFIA_SNAPSHOT_EVERY", "50"))
+
+# Free pages returned to the filesystem per sweep; 0 frees them all.
+VACUUM_PAGES = int(os.environ.get("MAFIA_VACUUM_PAGES", "0"))
+
+# Pragmas applied once to every connection we open. WAL lets readers keep
+# going while a writer commits, and NORMAL sync is durable enough under WAL.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Idle connections kept per database file for the next thread to reuse.
+POOL_SIZE = int(os.environ.get("MAFIA_DB_POOL_SIZE", "8"))
+
+# Size of sqlite3's per-connection prepared statement cache. Every query
+# below is a constant string, so each one is compiled once per connection.
+STATEMENT_CACHE_SIZE = 64
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS games (
+        id TEXT PRIMARY KEY,
+        host TEXT,
+        started INTEGER,
+        phase TEXT,
+        day_count INTEGER DEFAULT 1,
+        night_results TEXT,
+        game_over INTEGER DEFAULT 0,
+        winner TEXT,
+        version INTEGER NOT NULL DEFAULT 0,
+        day_results TEXT,
+        deadline REAL,
+        deal INTEGER NOT NULL DEFAULT 0,
+        created REAL,
+        updated REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_games_deadline ON games (deadline) WHERE deadline IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_games_updated ON games (updated)",
+    """
+    CREATE TABLE IF NOT EXISTS game_players (
+        game_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        seat INTEGER NOT NULL,
+        alive INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (game_id, name)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_game_players_seat ON game_players (game_id, alive, seat)",
+    """
+    CREATE TABLE IF NOT EXISTS game_roles (
+        game_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        role TEXT NOT NULL,
+        PRIMARY KEY (game_id, name)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS votes (
+        game_id TEXT NOT NULL,
+        day_count INTEGER NOT NULL,
+        phase TEXT NOT NULL,
+        voter TEXT NOT NULL,
+        action TEXT NOT NULL,
+        target TEXT,
+        PRIMARY KEY (game_id, day_count, phase, voter)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS game_events (
+        game_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (game_id, seq)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS game_snapshots (
+        game_id TEXT PRIMARY KEY,
+        seq INTEGER NOT NULL,
+        state TEXT NOT NULL
+    ) WITHOUT ROWID
+    """,
+    # Chat is append-only and kept apart from the game, so a message never rewrites older ones.
+    """
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        game_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        sender TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        body TEXT NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (game_id, seq)
+    ) WITHOUT ROWID
+    """,
+    # Swept games: final state and event log as zlib-compressed JSON.
+    """
+    CREATE TABLE IF NOT EXISTS games_archive (
+        id TEXT PRIMARY KEY,
+        host TEXT,
+        winner TEXT,
+        created REAL,
+        archived REAL NOT NULL,
+        data BLOB NOT NULL
+    )
+    """,
+)
+
+# Bumped by every entry added to MIGRATIONS; stored in PRAGMA user_version.
+SCHEMA_VERSION = 5
+
+# Columns added to games after the table first shipped, for older mafia.db files.
+ADDED_COLUMNS = (
+    ("version", "INTEGER NOT NULL DEFAULT 0"),
+    ("day_results", "TEXT"),
+    ("deadline", "REAL"),
+    ("created", "REAL"),
+    ("updated", "REAL"),
+    ("deal", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+SQL_SAVE_GAME = """
+    INSERT INTO games (id, host, started, phase, day_count, night_results, game_over, winner, day_results, deadline, deal, updated, created)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        host = excluded.host, started = excluded.started, phase = excluded.phase,
+        day_count = excluded.day_count, night_results = excluded.night_results,
+        game_over = excluded.game_over, winner = excluded.winner,
+        day_results = excluded.day_results, deadline = excluded.deadline, deal = excluded.deal,
+        updated = excluded.updated, version = games.version + 1
+"""
+SQL_CAS_GAME = """
+    UPDATE games SET
+        host = ?, started = ?, phase = ?, day_count = ?, night_results = ?,
+        game_over = ?, winner = ?, day_results = ?, deadline = ?, deal = ?, updated = ?, version = version + 1
+    WHERE id = ? AND version = ?
+"""
+SQL_LOAD_GAME = """
+    SELECT host, started, phase, day_count, night_results, game_over, winner, version, day_results, deadline, deal
+    FROM games WHERE id = ?
+"""
+SQL_PHASE_KEY = "SELECT phase, day_count, game_over FROM games WHERE id = ?"
+SQL_GET_VERSION = "SELECT version FROM games WHERE id = ?"
+SQL_BUMP_VERSION = "UPDATE games SET version = version + 1, updated = ? WHERE id = ?"
+SQL_APPEND_EVENT = """
+    INSERT INTO game_events (game_id, seq, type, payload, created)
+    VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM game_events WHERE game_id = ?), ?, ?, ?)
+"""
+SQL_LAST_SEQ = "SELECT COALESCE(MAX(seq), 0) FROM game_events WHERE game_id = ?"
+SQL_LOAD_EVENTS = "SELECT seq, type, payload, created FROM game_events WHERE game_id = ? AND seq > ? ORDER BY seq"
+SQL_LOAD_SNAPSHOT = "SELECT seq, state FROM game_snapshots WHERE game_id = ?"
+SQL_SAVE_SNAPSHOT = "INSERT OR REPLACE INTO game_snapshots (game_id, seq, state) VALUES (?, ?, ?)"
+SQL_EXPIRED_GAMES = """
+    SELECT id, phase, day_count FROM games
+    WHERE deadline IS NOT NULL AND deadline <= ? AND started = 1 AND game_over = 0
+"""
+SQL_GAME_EXISTS = "SELECT 1 FROM games WHERE id = ?"
+SQL_HAS_GAMES = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'games'"
+SQL_IDLE_LOBBIES = "SELECT id FROM games WHERE started = 0 AND updated < ?"
+SQL_FINISHED_GAMES = "SELECT id FROM games WHERE game_over = 1 AND updated < ?"
+# Running games nobody has started or voted in since the cutoff; the phase
+# timer keeps advancing them, so updated alone can't tell they're abandoned.
+SQL_STALE_GAMES = """
+    SELECT g.id FROM games g
+    WHERE g.started = 1 AND g.game_over = 0 AND g.updated < ? AND NOT EXISTS (
+        SELECT 1 FROM game_events e
+        WHERE e.game_id = g.id AND e.type IN ('start', 'vote') AND e.created >= ?
+    )
+"""
+SQL_ARCHIVE_GAME = """
+    INSERT OR REPLACE INTO games_archive (id, host, winner, created, archived, data)
+    SELECT id, host, winner, created, ?, ? FROM games WHERE id = ?
+"""
+SQL_LOAD_ARCHIVE = "SELECT data FROM games_archive WHERE id = ?"
+# Every table holding rows for one game, children first.
+GAME_TABLES = ("votes", "game_roles", "game_players", "game_events", "game_snapshots", "chat_messages")
+SQL_MARK_ALL_DEAD = "UPDATE game_players SET alive = 0 WHERE game_id = ?"
+SQL_MARK_DEAD = "UPDATE game_players SET alive = 0 WHERE game_id = ? AND name = ?"
+# A player who comes back takes a new last seat, as Roster.append gives them.
+SQL_UPSERT_PLAYER = """
+    INSERT INTO game_players (game_id, name, seat, alive)
+    VALUES (?, ?, (SELECT COALESCE(MAX(seat), -1) + 1 FROM game_players WHERE game_id = ?), 1)
+    ON CONFLICT (game_id, name) DO UPDATE SET alive = 1, seat = excluded.seat
+"""
+SQL_LOAD_PLAYERS = "SELECT name FROM game_players WHERE game_id = ? AND alive = 1 ORDER BY seat"
+SQL_DELETE_ROLES = "DELETE FROM game_roles WHERE game_id = ?"
+SQL_INSERT_ROLE = "INSERT INTO game_roles (game_id, name, role) VALUES (?, ?, ?)"
+SQL_UPSERT_ROLE = "INSERT OR REPLACE INTO game_roles (game_id, name, role) VALUES (?, ?, ?)"
+SQL_DELETE_ROLE = "DELETE FROM game_roles WHERE game_id = ? AND name = ?"
+SQL_LOAD_ROLES = """
+    SELECT r.name, r.role FROM game_roles r
+    JOIN game_players p ON p.game_id = r.game_id AND p.name = r.name
+    WHERE r.game_id = ? ORDER BY p.seat
+"""
+SQL_DELETE_ALL_VOTES = "DELETE FROM votes WHERE game_id = ?"
+SQL_DELETE_PHASE_VOTES = "DELETE FROM votes WHERE game_id = ? AND day_count = ? AND phase = ?"
+SQL_INSERT_VOTE = "INSERT INTO votes (game_id, day_count, phase, voter, action, target) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_UPSERT_VOTE = "INSERT OR REPLACE INTO votes (game_id, day_count, phase, voter, action, target) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_DELETE_VOTE = "DELETE FROM votes WHERE game_id = ? AND day_count = ? AND phase = ? AND voter = ?"
+SQL_LOAD_VOTES = """
+    SELECT v.voter, v.action, v.target FROM votes v
+    JOIN games g ON g.id = v.game_id AND g.day_count = v.day_count AND g.phase = v.phase
+    WHERE v.game_id = ?
+"""
+# The seq comes from the game's newest kept message; trimming never removes that one.
+SQL_POST_MESSAGE = """
+    INSERT INTO chat_messages (game_id, seq, sender, channel, body, created)
+    SELECT id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM chat_messages WHERE game_id = ?), ?, ?, ?, ?
+    FROM games WHERE id = ?
+"""
+SQL_LAST_MESSAGE = "SELECT MAX(seq) FROM chat_messages WHERE game_id = ?"
+SQL_TRIM_MESSAGES = "DELETE FROM chat_messages WHERE game_id = ? AND seq <= ?"
+SQL_LOAD_MESSAGES = """
+    SELECT seq, sender, channel, body, created FROM chat_messages
+    WHERE game_id = ? AND seq > ? ORDER BY seq
+"""
+
+
+# GameState fields stored as columns of the games row, in SQL_SAVE_GAME order.
+GAME_COLUMNS = (
+    "host", "started", "phase", "day_count", "night_results", "game_over", "winner", "day_results", "deadline", "deal",
+)
+# Results are small dicts; dropping the spaces json.dumps adds by default saves a
+# fair share of each one, and json.loads reads either form.
+COMPACT_SEPARATORS = (",", ":")
+
+
+@lru_cache(maxsize=None)
+def partial_update_sql(columns, checked):
+    """UPDATE for just these games columns, optionally compare-and-swap on version"""
+    assignments = "".join(f"{column} = ?, " for column in columns)
+    where = "id = ? AND version = ?" if checked else "id = ?"
+    return f"UPDATE games SET {assignments}updated = ?, version = version + 1 WHERE {where}"
+
+
+# --- CONNECTION LAYER ---
+class _Lease:
+    """A thread's hold on a pooled connection; dropped with the thread's locals when it exits"""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class ConnectionPool:
+    """Lends each thread one connection and takes it back when the thread exits.
+
+    Streamlit runs every rerun and fragment poll on a fresh thread, so
+    connections outlive their threads: up to POOL_SIZE of them wait idle for
+    the next thread instead of being closed, and the rest are closed.
+    """
+
+    def __init__(self, path, size=None):
+        self.path = path
+        self.size = POOL_SIZE if size is None else size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._idle = []
+        self._lent = set()
+        self._generation = 0
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=5.0,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        # auto_vacuum only takes hold on a brand-new file (it has to come before
+        # WAL writes the header); older files need a one-off vacuum(full=True).
+        # Setting it on a file in use can fail as locked without waiting, so
+        # only empty files get it.
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def connect(self):
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._open()
+            with self._lock:
+                self._lent.add(conn)
+                generation = self._generation
+            lease = self._local.lease = _Lease(conn)
+            weakref.finalize(lease, self._release, conn, generation)
+        return lease.conn
+
+    def _release(self, conn, generation):
+        with self._lock:
+            if generation != self._generation:
+                return  # close_all has closed it already
+            self._lent.discard(conn)
+            # Closing rolls back whatever a thread left open when it died
+            keep = len(self._idle) < self.size and not conn.in_transaction
+            if keep:
+                self._idle.append(conn)
+        if not keep:
+            conn.close()
+
+    def open_connections(self):
+        """Connections currently open: lent to live threads plus idle ones"""
+        with self._lock:
+            return len(self._lent) + len(self._idle)
+
+    def close_all(self):
+        with self._lock:
+            self._generation += 1
+            for conn in self._idle + list(self._lent):
+                conn.close()
+            self._idle.clear()
+            self._lent.clear()
+        self._local = threading.local()
+
+
+@contextmanager
+def transaction(conn, mode="IMMEDIATE"):
+    """Run a block in one transaction; IMMEDIATE takes the write lock up front"""
+    try:
+        conn.execute(f"BEGIN {mode}")
+    except sqlite3.OperationalError as e:
+        count_lock_error(e)
+        raise
+    try:
+        yield conn
+    except BaseException as e:
+        conn.execute("ROLLBACK")
+        count_lock_error(e)
+        raise
+    conn.execute("COMMIT")
+
+def count_lock_error(error):
+    """Count errors from giving up on the lock after busy_timeout"""
+    if isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error)):
+        metrics.inc("db_lock_errors")
+
+
+class SQLiteBackend(StorageBackend):
+    """All games in one SQLite file, shared by every process that opens it"""
+
+    def __init__(self, path, event_sourced=EVENT_SOURCED, partial=True, compact=True):
+        # partial and compact only exist so benchmarks can compare against
+        # whole-row writes and default json.dumps output.
+        self.path = path
+        self.event_sourced = event_sourced
+        self.partial = partial
+        self.separators = COMPACT_SEPARATORS if compact else None
+        self.pool = ConnectionPool(path)
+
+    def connect(self):
+        return self.pool.connect()
+
+    def close(self):
+        self.pool.close_all()
+
+    # --- DATABASE SETUP ---
+    def init(self):
+        conn = self.connect()
+        migrate(conn)
+        if self.event_sourced:
+            with transaction(conn):
+                self._snapshot_unlogged_games(conn)
+
+    def _snapshot_unlogged_games(self, conn):
+        """Give games that predate the event log a starting snapshot to replay from"""
+        rows = conn.execute("""
+            SELECT id FROM games
+            WHERE id NOT IN (SELECT game_id FROM game_snapshots)
+            AND id NOT IN (SELECT game_id FROM game_events)
+        """).fetchall()
+        for (game_id,) in rows:
+            _save_snapshot(conn, game_id, self._read_game(conn, game_id), 0)
+
+    # --- GAME STORAGE ---
+    def create_game(self, game_id, host):
+        game = GameState.new(host)
+        conn = self.connect()
+        with transaction(conn):
+            game.version = self._write_game(conn, game_id, game)
+            _append_event(conn, game_id, CREATE, self._encode({"host": host}))
+        return game
+
+    def save_game(self, game_id, game, expected_version=None):
+        # In events mode the saved game becomes a fresh snapshot.
+        conn = self.connect()
+        with transaction(conn):
+            version = self._write_game(conn, game_id, game, expected_version)
+            if self.event_sourced:
+                _save_snapshot(conn, game_id, game)
+        game.version = version
+        return version
+
+    def _encode(self, value):
+        return json.dumps(value, separators=self.separators)
+
+    def _column(self, game, name):
+        value = getattr(game, name)
+        if name in ("night_results", "day_results"):
+            return self._encode(value)
+        if name in ("started", "game_over"):
+            return int(value)
+        return value
+
+    def _write_game(self, conn, game_id, game, expected_version=None):
+        """Write what changed since the game was loaded; everything if it never was.
+
+        Returns the new version and marks the game clean again.
+        """
+        now = time.time()
+        clean = game._clean if self.partial else None
+        dirty = game.dirty_fields() if clean is not None else set(STATE_FIELDS)
+        if clean is not None:
+            columns = tuple(c for c in GAME_COLUMNS if c in dirty)
+            params = [self._column(game, c) for c in columns] + [now, game_id]
+            if expected_version is not None:
+                params.append(expected_version)
+            if conn.execute(partial_update_sql(columns, expected_version is not None), params).rowcount != 1:
+                if expected_version is not None:
+                    raise VersionConflict(game_id)
+                # The row is gone (swept meanwhile), so write the game out whole.
+                clean, dirty = None, set(STATE_FIELDS)
+        if clean is None:
+            row = tuple(self._column(game, c) for c in GAME_COLUMNS) + (now,)
+            if expected_version is None:
+                conn.execute(SQL_SAVE_GAME, (game_id,) + row + (now,))
+            elif conn.execute(SQL_CAS_GAME, row + (game_id, expected_version)).rowcount != 1:
+                raise VersionConflict(game_id)
+        # In events mode players and roles are rebuilt from the log instead.
+        if not self.event_sourced:
+            if "players" in dirty:
+                _write_players(conn, game_id, game, clean)
+            if "roles" in dirty:
+                _write_roles(conn, game_id, game, clean)
+        if dirty & {"votes", "started", "phase", "day_count"}:
+            _write_votes(conn, game_id, game, clean)
+        game.mark_clean()
+        return conn.execute(SQL_GET_VERSION, (game_id,)).fetchone()[0]
+
+    def record_event(self, game_id, event_type, payload=None, phase=None, day_count=None, after=None):
+        payload = dict(payload or {})
+        conn = self.connect()
+        with transaction(conn):
+            if phase is not None and conn.execute(SQL_PHASE_KEY, (game_id,)).fetchone() != (phase, day_count, 0):
+                return None
+            game = self._read_game(conn, game_id)
+            if game is None:
+                return None
+            deadline = game.deadline
+            if apply_event(game, event_type, payload) is None and event_type in (NIGHT_RESOLVED, DAY_RESOLVED):
+                return None
+            if after:
+                after(game)
+            if game.deadline != deadline:
+                payload["deadline"] = game.deadline
+            game.version = self._write_game(conn, game_id, game)
+            seq = _append_event(conn, game_id, event_type, self._encode(payload))
+            snapshot = conn.execute(SQL_LOAD_SNAPSHOT, (game_id,)).fetchone()
+            if seq - (snapshot[0] if snapshot else 0) >= SNAPSHOT_EVERY:
+                _save_snapshot(conn, game_id, game, seq)
+        return game
+
+    def load_game(self, game_id):
+        conn = self.connect()
+        # One read transaction so the game row and its child rows agree.
+        with transaction(conn, "DEFERRED"):
+            return self._read_game(conn, game_id)
+
+    def _read_game(self, conn, game_id):
+        if self.event_sourced:
+            game = _replay_game(conn, game_id)
+            if game is not None:
+                return game
+        row = conn.execute(SQL_LOAD_GAME, (game_id,)).fetchone()
+        if not row:
+            return None
+        started = bool(row[1])
+        game = GameState(
+            host=row[0],
+            players=[r[0] for r in conn.execute(SQL_LOAD_PLAYERS, (game_id,))],
+            started=started,
+            # Roles and votes only exist once the game has started.
+            roles=dict(conn.execute(SQL_LOAD_ROLES, (game_id,))) if started else {},
+            phase=row[2],
+            votes=_read_votes(conn, game_id) if started else {},
+            day_count=row[3] if row[3] else 1,
+            night_results=json.loads(row[4]) if row[4] else {},
+            game_over=bool(row[5]),
+            winner=row[6] if row[6] else "",
+            version=row[7],
+            day_results=json.loads(row[8]) if row[8] else {},
+            deadline=row[9],
+            deal=row[10],
+        )
+        game.mark_clean()
+        return game
+
+    def game_events(self, game_id, after_seq=0):
+        return _read_events(self.connect(), game_id, after_seq)
+
+    def load_votes(self, game_id):
+        return _read_votes(self.connect(), game_id)
+
+    def submit_vote(self, game_id, phase, day_count, voter, action, target, deal=None):
+        # Votes are their own rows, so concurrent voters never overwrite each other.
+        conn = self.connect()
+        with transaction(conn):
+            vote = accept_vote(self._read_game(conn, game_id), phase, day_count, deal, voter, action, target)
+            if vote is None:
+                return False
+            conn.execute(SQL_INSERT_VOTE, (game_id, day_count, phase, voter, vote["action"], vote["target"]))
+            conn.execute(SQL_BUMP_VERSION, (time.time(), game_id))
+            _append_event(conn, game_id, VOTE, self._encode({"voter": voter, **vote}))
+        return True
+
+    def post_message(self, game_id, sender, channel, text):
+        conn = self.connect()
+        now = time.time()
+        with transaction(conn):
+            if conn.execute(SQL_POST_MESSAGE, (game_id, sender, channel, text, now, game_id)).rowcount != 1:
+                return None
+            seq = conn.execute(SQL_LAST_MESSAGE, (game_id,)).fetchone()[0]
+            if seq > CHAT_KEEP:
+                conn.execute(SQL_TRIM_MESSAGES, (game_id, seq - CHAT_KEEP))
+        return seq, sender, channel, text, now
+
+    def load_messages(self, game_id, after_seq=0):
+        return self.connect().execute(SQL_LOAD_MESSAGES, (game_id, after_seq)).fetchall()
+
+    def expired_games(self, now):
+        return self.connect().execute(SQL_EXPIRED_GAMES, (now,)).fetchall()
+
+    def get_version(self, game_id):
+        row = self.connect().execute(SQL_GET_VERSION, (game_id,)).fetchone()
+        return row[0] if row else None
+
+    def game_exists(self, game_id):
+        return self.connect().execute(SQL_GAME_EXISTS, (game_id,)).fetchone() is not None
+
+    # --- SWEEPER ---
+    def sweep_games(self, now=None, lobby_ttl=None, archive_after=None, stale_after=None, full=False):
+        """Evict idle lobbies, archive finished and abandoned games, then vacuum.
+
+        Lobbies untouched for lobby_ttl seconds are deleted outright. Finished
+        games idle for archive_after seconds, and running games nobody has
+        voted in for stale_after seconds, are moved into games_archive first.
+        Returns counts of games and rows removed, the bytes of data freed
+        ("bytes") and how much the file itself shrank ("file_bytes"). full
+        rewrites the whole file instead of vacuuming incrementally.
+        """
+        now = now or time.time()
+        lobby_ttl = LOBBY_TTL_SECONDS if lobby_ttl is None else lobby_ttl
+        archive_after = ARCHIVE_AFTER_SECONDS if archive_after is None else archive_after
+        stale_after = STALE_GAME_SECONDS if stale_after is None else stale_after
+        conn = self.connect()
+        used_before, file_before = database_size(conn)
+        report = empty_sweep_report()
+        with transaction(conn):
+            lobbies = [r[0] for r in conn.execute(SQL_IDLE_LOBBIES, (now - lobby_ttl,))]
+            finished = [r[0] for r in conn.execute(SQL_FINISHED_GAMES, (now - archive_after,))]
+            cutoff = now - stale_after
+            stale = [r[0] for r in conn.execute(SQL_STALE_GAMES, (cutoff, cutoff))]
+            for game_id in finished + stale:
+                report["archive_bytes"] += self._archive_game(conn, game_id, now)
+            for game_id in lobbies + finished + stale:
+                report["rows"] += _delete_game(conn, game_id)
+        report.update(lobbies=len(lobbies), finished=len(finished), stale=len(stale))
+        report["freed_pages"] = vacuum(conn, full=full)
+        used_after, file_after = database_size(conn)
+        report["bytes"] = used_before - used_after
+        report["file_bytes"] = file_before - file_after
+        return report
+
+    def _archive_game(self, conn, game_id, now):
+        game = self._read_game(conn, game_id)
+        data = {"state": game.to_dict(), "events": _read_events(conn, game_id)}
+        data = zlib.compress(json.dumps(data, separators=COMPACT_SEPARATORS).encode(), 9)
+        conn.execute(SQL_ARCHIVE_GAME, (now, data, game_id))
+        return len(data)
+
+    def load_archived_game(self, game_id):
+        row = self.connect().execute(SQL_LOAD_ARCHIVE, (game_id,)).fetchone()
+        if row is None:
+            return None
+        data = json.loads(zlib.decompress(row[0]))
+        return GameState.from_dict(data["state"]), [tuple(event) for event in data["events"]]
+
+
+# --- MIGRATIONS ---
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Apply the migrations this file hasn't had yet and return their descriptions.
+
+    A brand-new file gets SCHEMA as it stands and is stamped with
+    SCHEMA_VERSION, skipping the migrations. An up-to-date file costs one
+    pragma read. Each migration runs in its own write transaction that also
+    bumps user_version, so it is applied exactly once even when several
+    processes start together.
+    """
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return []
+    with transaction(conn):
+        if conn.execute(SQL_HAS_GAMES).fetchone() is None:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            return []
+    applied = []
+    for version, description, step in MIGRATIONS:
+        with transaction(conn):
+            # Another process may have applied it while we waited for the lock.
+            if schema_version(conn) >= version:
+                continue
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        applied.append(description)
+    return applied
+
+def migrate_json_games(conn):
+    """Convert games rows that still keep players/roles/votes as JSON TEXT"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(games)")]
+    if "players" not in columns:
+        return
+    conn.execute("ALTER TABLE games RENAME TO games_json")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    rows = conn.execute(
+        "SELECT id, host, players, started, roles, phase, votes, day_count, night_results, game_over, winner FROM games_json"
+    ).fetchall()
+    now = time.time()
+    for game_id, host, players, started, roles, phase, votes, day_count, night_results, game_over, winner in rows:
+        day_count = day_count or 1
+        conn.execute(SQL_SAVE_GAME, (game_id, host, started, phase, day_count, night_results, game_over, winner, None, None, 0, now, now))
+        players = json.loads(players) if players else []
+        roles = json.loads(roles) if roles else {}
+        # Players that died at night were already dropped from both lists,
+        # so everyone still known is either alive or a role-holder who died.
+        for name in players:
+            conn.execute(SQL_UPSERT_PLAYER, (game_id, name, game_id))
+        for name in roles:
+            if name not in players:
+                conn.execute(SQL_UPSERT_PLAYER, (game_id, name, game_id))
+                conn.execute("UPDATE game_players SET alive = 0 WHERE game_id = ? AND name = ?", (game_id, name))
+        for name, role in roles.items():
+            conn.execute(SQL_INSERT_ROLE, (game_id, name, role))
+        for voter, vote in (json.loads(votes) if votes else {}).items():
+            conn.execute(SQL_INSERT_VOTE, (game_id, day_count, phase, voter, vote["action"], vote.get("target")))
+    conn.execute("DROP TABLE games_json")
+
+def add_game_columns(conn):
+    """Add the games columns that shipped after the table did"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(games)")]
+    for column, ddl in ADDED_COLUMNS:
+        if column not in columns:
+            conn.execute(f"ALTER TABLE games ADD COLUMN {column} {ddl}")
+    # Games from before timestamps count as touched now, not at the epoch.
+    now = time.time()
+    conn.execute("UPDATE games SET created = ?, updated = ? WHERE updated IS NULL", (now, now))
+
+def create_schema(conn):
+    """Create whichever tables and indexes of SCHEMA the file doesn't have yet"""
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+# (user_version after it, description, step), oldest first. Files from
+# before user_version was tracked are at 0 and run them all, so every step
+# has to cope with finding its change already made. Only ever append.
+MIGRATIONS = (
+    (1, "convert JSON games to player, role and vote tables", migrate_json_games),
+    (2, "add version, results, deadline and timestamp columns to games", add_game_columns),
+    (3, "create missing tables and indexes", create_schema),
+    (4, "create the chat_messages table", create_schema),
+    (5, "add the deal column to games", add_game_columns),
+)
+
+
+def _write_players(conn, game_id, game, clean):
+    if clean is None:
+        conn.execute(SQL_MARK_ALL_DEAD, (game_id,))
+        conn.executemany(SQL_UPSERT_PLAYER, [(game_id, p, game_id) for p in game.players])
+        return
+    conn.executemany(SQL_MARK_DEAD, [(game_id, p) for p in clean.players if p not in game.players])
+    conn.executemany(SQL_UPSERT_PLAYER, [(game_id, p, game_id) for p in game.players if p not in clean.players])
+
+def _write_roles(conn, game_id, game, clean):
+    if clean is None:
+        conn.execute(SQL_DELETE_ROLES, (game_id,))
+        conn.executemany(SQL_INSERT_ROLE, [(game_id, p, r) for p, r in game.roles.items()])
+        return
+    conn.executemany(SQL_DELETE_ROLE, [(game_id, p) for p in clean.roles if p not in game.roles])
+    conn.executemany(SQL_UPSERT_ROLE, [
+        (game_id, p, r) for p, r in game.roles.items() if clean.roles.get(p) != r
+    ])
+
+def _write_votes(conn, game_id, game, clean):
+    day_count, phase = game.day_count, game.phase
+    if clean is not None and (clean.started, clean.phase, clean.day_count) == (game.started, phase, day_count):
+        # Same phase as when loaded: only touch the voters that changed.
+        conn.executemany(SQL_DELETE_VOTE, [
+            (game_id, day_count, phase, voter) for voter in clean.votes if voter not in game.votes
+        ])
+        conn.executemany(SQL_UPSERT_VOTE, [
+            (game_id, day_count, phase, voter, vote["action"], vote.get("target"))
+            for voter, vote in game.votes.items() if clean.votes.get(voter) != vote
+        ])
+        return
+    # A lobby has no vote history; a running game only rewrites the current phase.
+    if game.started:
+        conn.execute(SQL_DELETE_PHASE_VOTES, (game_id, day_count, phase))
+    else:
+        conn.execute(SQL_DELETE_ALL_VOTES, (game_id,))
+    conn.executemany(SQL_INSERT_VOTE, [
+        (game_id, day_count, phase, voter, vote["action"], vote.get("target"))
+        for voter, vote in game.votes.items()
+    ])
+
+def _read_votes(conn, game_id):
+    return {
+        voter: {"action": action, "target": target}
+        for voter, action, target in conn.execute(SQL_LOAD_VOTES, (game_id,))
+    }
+
+
+# --- EVENT LOG ---
+def _append_event(conn, game_id, event_type, payload_json):
+    conn.execute(SQL_APPEND_EVENT, (game_id, game_id, event_type, payload_json, time.time()))
+    return conn.execute(SQL_LAST_SEQ, (game_id,)).fetchone()[0]
+
+def _read_events(conn, game_id, after_seq=0):
+    return [
+        (seq, event_type, json.loads(payload), created)
+        for seq, event_type, payload, created in conn.execute(SQL_LOAD_EVENTS, (game_id, after_seq))
+    ]
+
+def _save_snapshot(conn, game_id, game, seq=None):
+    if seq is None:
+        seq = conn.execute(SQL_LAST_SEQ, (game_id,)).fetchone()[0]
+    state = game.to_dict()
+    del state["version"]
+    conn.execute(SQL_SAVE_SNAPSHOT, (game_id, seq, json.dumps(state, separators=COMPACT_SEPARATORS)))
+
+def _replay_game(conn, game_id):
+    """Latest snapshot plus the events logged after it; None if the game has no log"""
+    version = conn.execute(SQL_GET_VERSION, (game_id,)).fetchone()
+    if version is None:
+        return None
+    snapshot = conn.execute(SQL_LOAD_SNAPSHOT, (game_id,)).fetchone()
+    seq, game = (snapshot[0], GameState.from_dict(json.loads(snapshot[1]))) if snapshot else (0, None)
+    events = [(t, json.loads(p)) for _, t, p, _ in conn.execute(SQL_LOAD_EVENTS, (game_id, seq))]
+    game = replay(events, game)
+    if game is not None:
+        game.version = version[0]
+    return game
+
+
+# --- SWEEPER ---
+def _delete_game(conn, game_id):
+    rows = 0
+    for table in GAME_TABLES:
+        rows += conn.execute(f"DELETE FROM {table} WHERE game_id = ?", (game_id,)).rowcount
+    return rows + conn.execute("DELETE FROM games WHERE id = ?", (game_id,)).rowcount
+
+def database_size(conn):
+    """(bytes in use, bytes in the file); the difference sits on the freelist"""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_size * (pages - free), page_size * pages
+
+def vacuum(conn, full=False, pages=None):
+    """Give free pages back to the filesystem; returns how many were freed.
+
+    Runs an incremental vacuum of up to pages pages (VACUUM_PAGES by default,
+    0 for all). full rewrites the whole file instead, which also switches
+    files created before auto_vacuum was turned on over to incremental mode.
+    """
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if full:
+        conn.execute("VACUUM")
+    elif conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        pages = VACUUM_PAGES if pages is None else pages
+        conn.execute(f"PRAGMA incremental_vacuum({pages})" if pages else "PRAGMA incremental_vacuum").fetchall()
+    else:
+        return 0
+    return free - conn.execute("PRAGMA freelist_count").fetchone()[0]
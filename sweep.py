@@ -0,0 +1,48 @@
+"""Sweep expired games out of the database by hand.
+
+The app's scheduler thread already does this every MAFIA_SWEEP_SECONDS;
+this is for cron jobs, one-off cleanups and old databases:
+
+    python sweep.py
+    python sweep.py --db /path/to/mafia.db --lobby-ttl 600 --json
+    python sweep.py --full-vacuum   # also switch an old file to incremental vacuum
+"""
+import argparse
+import json
+
+import storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=storage.DB_PATH)
+    parser.add_argument("--lobby-ttl", type=float, default=storage.LOBBY_TTL_SECONDS,
+                        help="seconds before an idle lobby is deleted")
+    parser.add_argument("--archive-after", type=float, default=storage.ARCHIVE_AFTER_SECONDS,
+                        help="seconds before a finished game is archived")
+    parser.add_argument("--stale-after", type=float, default=storage.STALE_GAME_SECONDS,
+                        help="seconds without a vote before a running game is archived")
+    parser.add_argument("--full-vacuum", action="store_true", help="rewrite the whole file instead of vacuuming incrementally")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    storage.init_db(args.db)
+    report = storage.sweep_games(
+        lobby_ttl=args.lobby_ttl, archive_after=args.archive_after, stale_after=args.stale_after,
+        full=args.full_vacuum,
+    )
+
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"idle lobbies deleted:    {report['lobbies']}")
+    print(f"finished games archived: {report['finished']}")
+    print(f"stale games archived:    {report['stale']}")
+    print(f"rows removed:            {report['rows']}")
+    print(f"archive bytes written:   {report['archive_bytes']}")
+    print(f"data bytes reclaimed:    {report['bytes']}")
+    print(f"file bytes reclaimed:    {report['file_bytes']} ({report['freed_pages']} pages freed)")
+
+
+if __name__ == "__main__":
+    main()
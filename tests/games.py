@@ -0,0 +1,34 @@
+"""Small games for the tests to play with"""
+from engine import DAY, DETECTIVE, DOCTOR, MAFIA, VILLAGER, GameState, assign_roles, join, resolve_night, submit_action
+
+
+def lobby(count):
+    state = GameState.new("p0")
+    for i in range(1, count):
+        join(state, f"p{i}")
+    return state
+
+def started(count=6, seed=1):
+    state = lobby(count)
+    assign_roles(state, seed=seed)
+    return state
+
+def holders(state, role):
+    return [p for p in state.players if state.role_of(p) == role]
+
+def night_votes(state, kill=None, save=None, investigate=None):
+    """Every night role votes; the mafia all pick kill"""
+    for player in holders(state, MAFIA):
+        submit_action(state, player, "kill", kill)
+    for player, action, target in ((DOCTOR, "save", save), (DETECTIVE, "investigate", investigate)):
+        for holder in holders(state, player):
+            submit_action(state, holder, action, target)
+
+def day_game(count=6):
+    """A game in its first day after a night in which nobody died"""
+    state = started(count)
+    villager = holders(state, VILLAGER)[0]
+    night_votes(state, kill=villager, save=villager, investigate=villager)
+    resolve_night(state)
+    assert state.phase == DAY
+    return state
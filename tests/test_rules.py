@@ -0,0 +1,225 @@
+import pytest
+
+from engine import (
+    DAY, DETECTIVE, DOCTOR, MAFIA, MIN_PLAYERS, NIGHT, VILLAGER, InvalidAction, assign_roles, check_winner, join,
+    mafia_count, resolve_day, resolve_night, submit_action,
+)
+
+from tests.games import day_game, holders, lobby, night_votes, started
+
+
+# --- assign_roles ---
+def test_seeded_deal_is_repeatable():
+    assert dict(started(8, seed=42).roles) == dict(started(8, seed=42).roles)
+    deals = {tuple(sorted(started(8, seed=seed).roles.items())) for seed in range(20)}
+    assert len(deals) > 1
+
+@pytest.mark.parametrize("count", [4, 5, 6, 9, 12, 20])
+def test_deal_sizes(count):
+    state = started(count)
+    assert len(holders(state, MAFIA)) == mafia_count(count) == max(1, count // 3)
+    assert len(holders(state, DOCTOR)) == 1
+    assert len(holders(state, DETECTIVE)) == 1
+    assert set(state.roles) == set(state.players)
+    assert (state.started, state.phase, state.day_count) == (True, NIGHT, 1)
+
+def test_deal_needs_minimum_players():
+    state = lobby(MIN_PLAYERS - 1)
+    with pytest.raises(InvalidAction):
+        assign_roles(state, seed=1)
+    assert not state.started and not state.roles
+
+def test_deal_only_once():
+    state = started()
+    with pytest.raises(InvalidAction):
+        assign_roles(state, seed=2)
+
+def test_join_refuses_duplicates_and_started_games():
+    state = lobby(4)
+    with pytest.raises(InvalidAction):
+        join(state, "p1")
+    assign_roles(state, seed=1)
+    with pytest.raises(InvalidAction):
+        join(state, "late")
+
+
+# --- submit_action ---
+def test_actions_refused_before_start():
+    with pytest.raises(InvalidAction):
+        submit_action(lobby(4), "p0", "eliminate", "p1")
+
+def test_night_actions_belong_to_roles():
+    state = started()
+    villager = holders(state, VILLAGER)[0]
+    mafia = holders(state, MAFIA)[0]
+    with pytest.raises(InvalidAction):
+        submit_action(state, villager, "kill", mafia)
+    with pytest.raises(InvalidAction):
+        submit_action(state, mafia, "save", mafia)
+    with pytest.raises(InvalidAction):
+        submit_action(state, mafia, "eliminate", villager)
+
+def test_targets_must_be_valid():
+    state = started()
+    mafia = holders(state, MAFIA)[0]
+    with pytest.raises(InvalidAction):
+        submit_action(state, mafia, "kill", mafia)
+    with pytest.raises(InvalidAction):
+        submit_action(state, mafia, "kill", "nobody")
+    # The doctor may save themselves
+    doctor = holders(state, DOCTOR)[0]
+    assert submit_action(state, doctor, "save", doctor) == {"action": "save", "target": doctor}
+
+def test_one_vote_per_phase():
+    state = started()
+    mafia = holders(state, MAFIA)[0]
+    villager = holders(state, VILLAGER)[0]
+    submit_action(state, mafia, "kill", villager)
+    with pytest.raises(InvalidAction):
+        submit_action(state, mafia, "kill", villager)
+
+def test_day_actions_and_dead_voters():
+    state = day_game()
+    with pytest.raises(InvalidAction):
+        submit_action(state, "p0", "kill", "p1")
+    assert submit_action(state, "p1", "skip", "p2") == {"action": "skip", "target": None}
+    state.players.remove("p2")
+    with pytest.raises(InvalidAction):
+        submit_action(state, "p2", "skip", None)
+
+
+# --- resolve_night ---
+def test_night_waits_for_every_role():
+    state = started()
+    villager = holders(state, VILLAGER)[0]
+    for mafia in holders(state, MAFIA):
+        submit_action(state, mafia, "kill", villager)
+    assert resolve_night(state) is None
+    assert state.phase == NIGHT
+
+def test_night_kill():
+    state = started()
+    villager, other = holders(state, VILLAGER)[:2]
+    night_votes(state, kill=villager, save=other, investigate=other)
+    results = resolve_night(state)
+    assert results["death"] == villager
+    assert villager not in state.players
+    assert (state.phase, state.night_results, dict(state.votes)) == (DAY, results, {})
+
+def test_night_save():
+    state = started()
+    villager = holders(state, VILLAGER)[0]
+    night_votes(state, kill=villager, save=villager, investigate=villager)
+    results = resolve_night(state)
+    assert results["death"] is None and results["saved"] == villager
+    assert villager in state.players
+
+def test_night_investigation():
+    state = started()
+    villager = holders(state, VILLAGER)[0]
+    mafia = holders(state, MAFIA)[0]
+    night_votes(state, kill=villager, save=villager, investigate=mafia)
+    assert resolve_night(state)["investigation"] == f"{mafia} is a **MAFIA**"
+
+def test_investigating_the_night_victim_reveals_their_role():
+    state = started(6, seed=1)
+    villager = holders(state, VILLAGER)[0]
+    night_votes(state, kill=villager, save=holders(state, MAFIA)[0], investigate=villager)
+    results = resolve_night(state)
+    assert results["death"] == villager
+    assert results["investigation"] == f"{villager} is a **VILLAGER**"
+
+def test_forced_night_resolves_with_missing_votes():
+    state = started()
+    villager = holders(state, VILLAGER)[0]
+    for mafia in holders(state, MAFIA):
+        submit_action(state, mafia, "kill", villager)
+    results = resolve_night(state, force=True)
+    assert results == {"death": villager}
+    assert state.phase == DAY
+
+def test_forced_night_without_votes_kills_nobody():
+    state = started()
+    assert resolve_night(state, force=True) == {}
+    assert len(state.players) == 6 and state.phase == DAY
+
+def test_force_only_resolves_its_own_phase():
+    state = started()
+    assert resolve_day(state, force=True) is None
+    assert state.phase == NIGHT
+
+
+# --- resolve_day ---
+def test_day_majority_eliminates():
+    state = day_game()
+    target = holders(state, MAFIA)[0]
+    for player in state.players:
+        submit_action(state, player, "eliminate", target if player != target else state.players[0])
+    results = resolve_day(state)
+    assert results["eliminated"] == target and results["role"] == MAFIA
+    assert target not in state.players
+
+def test_day_waits_for_everyone():
+    state = day_game()
+    submit_action(state, "p0", "eliminate", "p1")
+    assert resolve_day(state) is None
+    assert state.phase == DAY
+
+def test_day_tie_eliminates_nobody():
+    state = day_game(6)
+    for player in state.players:
+        submit_action(state, player, "eliminate", "p0" if player in ("p1", "p2", "p3") else "p1")
+    results = resolve_day(state)
+    assert results == {"eliminated": None, "reason": "tie"}
+    assert len(state.players) == 6
+    assert (state.phase, state.day_count) == (NIGHT, 2)
+
+def test_day_skips_outvoting_the_leader():
+    state = day_game(6)
+    for player in state.players:
+        if player in ("p1", "p2"):
+            submit_action(state, player, "eliminate", "p0")
+        else:
+            submit_action(state, player, "skip", None)
+    assert resolve_day(state) == {"eliminated": None, "reason": "tie"}
+    assert "p0" in state.players
+
+def test_day_all_skip():
+    state = day_game()
+    for player in state.players:
+        submit_action(state, player, "skip", None)
+    assert resolve_day(state) == {"eliminated": None, "reason": "skip"}
+
+def test_forced_day_counts_missing_votes_as_skips():
+    state = day_game(6)
+    submit_action(state, "p1", "eliminate", "p0")
+    submit_action(state, "p2", "eliminate", "p0")
+    # Two votes against four forced skips
+    results = resolve_day(state, force=True)
+    assert results == {"eliminated": None, "reason": "tie"}
+    assert state.phase == NIGHT
+
+
+# --- check_winner ---
+def test_winner():
+    state = started(6)
+    assert check_winner(state) is None
+    for mafia in holders(state, MAFIA):
+        state.players.remove(mafia)
+    assert check_winner(state) == "villagers"
+
+def test_mafia_win_at_parity():
+    state = started(6)
+    town = [p for p in state.players if state.role_of(p) != MAFIA]
+    for player in town[:-len(holders(state, MAFIA))]:
+        state.players.remove(player)
+    assert check_winner(state) == "mafia"
+
+def test_win_ends_the_game():
+    state = day_game(4)
+    mafia = holders(state, MAFIA)[0]
+    for player in state.players:
+        submit_action(state, player, "eliminate", mafia if player != mafia else state.players[0])
+    resolve_day(state)
+    assert state.game_over and state.winner == "villagers"
+    assert state.day_results["eliminated"] == mafia
@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+import storage
+from engine import DAY, JOIN, NIGHT, START
+from scheduler import PHASE_SECONDS, run_due, set_deadline
+from storage.memory import MemoryBackend
+
+
+@pytest.fixture
+def memory():
+    previous = storage.get_backend()
+    storage.set_backend(MemoryBackend())
+    yield
+    storage.set_backend(previous)
+
+def running_game(game_id):
+    storage.create_game(game_id, "p0")
+    for i in range(1, 4):
+        storage.record_event(game_id, JOIN, {"name": f"p{i}"})
+    return storage.record_event(game_id, START, {"seed": 1}, after=set_deadline)
+
+
+def test_start_sets_the_night_deadline(memory):
+    game = running_game("g")
+    assert game.deadline == storage.load_game("g").deadline
+    assert game.deadline - time.time() == pytest.approx(PHASE_SECONDS[NIGHT], abs=5)
+
+def test_run_due_resolves_expired_phases_only(memory):
+    deadline = running_game("g").deadline
+    assert run_due(now=deadline - 1) == 0
+    assert storage.load_game("g").phase == NIGHT
+
+    assert run_due(now=deadline + 1) == 1
+    game = storage.load_game("g")
+    # Nobody voted, so nobody died, and the day got its own timer
+    assert (game.phase, len(game.players)) == (DAY, 4)
+    assert game.deadline > deadline
+    assert run_due(now=deadline + 1) == 0
+
+def test_expired_day_counts_missing_votes_as_skips(memory):
+    deadline = running_game("g").deadline
+    run_due(now=deadline + 1)
+    day_deadline = storage.load_game("g").deadline
+    assert run_due(now=day_deadline + 1) == 1
+    game = storage.load_game("g")
+    assert game.day_results == {"eliminated": None, "reason": "skip"}
+    assert (game.phase, game.day_count) == (NIGHT, 2)
+    assert game.deadline is not None
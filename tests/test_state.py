@@ -0,0 +1,157 @@
+import copy
+import pickle
+
+import pytest
+
+from engine import (
+    DETECTIVE, DOCTOR, JOIN, MAFIA, NIGHT_RESOLVED, RESET, START, VILLAGER, VOTE, GameState, Roles, Roster, Votes,
+    apply_event, resolve_day, resolve_night, submit_action,
+)
+from storage.sqlite import SQLiteBackend
+
+from tests.games import holders, started
+
+
+# --- Votes ---
+def kill(target):
+    return {"action": "kill", "target": target}
+
+def test_tallies_follow_adds_replacements_and_removals():
+    votes = Votes({"a": kill("x"), "b": kill("x"), "c": kill("y")})
+    assert (votes.count("kill"), dict(votes.targets("kill")), votes.top("kill")) == (3, {"x": 2, "y": 1}, 2)
+    assert votes.leaders("kill") == {"x"}
+
+    votes["b"] = kill("y")
+    assert dict(votes.targets("kill")) == {"x": 1, "y": 2}
+    assert votes.leaders("kill") == {"y"}
+
+    del votes["c"]
+    assert votes.top("kill") == 1 and votes.leaders("kill") == {"x", "y"}
+    votes.pop("a")
+    votes.setdefault("d", {"action": "skip", "target": None})
+    assert (votes.count("kill"), votes.count("skip"), votes.leaders("kill")) == (1, 1, {"y"})
+
+    votes.clear()
+    assert (votes.count("kill"), votes.top("kill"), votes.leaders("kill")) == (0, 0, set())
+
+def test_copies_recount():
+    votes = Votes({"a": kill("x"), "b": kill("y")})
+    for other in (votes.copy(), copy.deepcopy(votes), pickle.loads(pickle.dumps(votes))):
+        assert dict(other.targets("kill")) == {"x": 1, "y": 1}
+        other["c"] = kill("x")
+        assert votes.count("kill") == 2
+
+def test_assigning_a_dict_keeps_the_tallies():
+    state = GameState.new("host")
+    state.votes = {"a": kill("x")}
+    assert isinstance(state.votes, Votes) and state.votes.count("kill") == 1
+
+def test_leader_ties_go_to_the_lowest_seat():
+    state = GameState.new("p0")
+    for player in ("p1", "p2", "p3"):
+        state.players.append(player)
+    votes = Votes({"a": kill("p3"), "b": kill("p1"), "c": kill("p2")})
+    assert votes.leader("kill", state.players.seat) == "p1"
+    # Someone without a seat comes after every seated target
+    votes = Votes({"a": kill("gone"), "b": kill("p2")})
+    assert votes.leader("kill", state.players.seat) == "p2"
+
+def test_tied_kill_takes_the_earliest_seat():
+    state = started(9, seed=3)
+    mafia = holders(state, MAFIA)
+    villagers = holders(state, VILLAGER)
+    # A three-way split, each mafia on a different villager, latest seat first
+    for player, target in zip(mafia, reversed(villagers[:3])):
+        submit_action(state, player, "kill", target)
+    submit_action(state, holders(state, DOCTOR)[0], "save", mafia[0])
+    submit_action(state, holders(state, DETECTIVE)[0], "investigate", mafia[0])
+    assert resolve_night(state)["death"] == villagers[0]
+
+
+# --- Roster and Roles ---
+def test_roster_keeps_seat_order():
+    roster = Roster(["a", "b", "c"])
+    assert roster == ["a", "b", "c"] and roster[1] == "b" and roster.index("c") == 2
+    roster.remove("b")
+    roster.append("d")
+    assert list(roster) == ["a", "c", "d"] and roster[1] == "c"
+    # Seats only grow, so a later joiner always sits after everyone before
+    assert roster.seat("a") < roster.seat("c") < roster.seat("d")
+    assert roster.seat("b") is None and "b" not in roster and len(roster) == 3
+
+def test_roster_refuses_duplicates_and_strangers():
+    roster = Roster(["a"])
+    with pytest.raises(ValueError):
+        roster.append("a")
+    with pytest.raises(ValueError):
+        roster.remove("z")
+
+def test_role_index_follows_deaths_and_role_changes():
+    state = GameState(host="a", players=["a", "b", "c", "d"], roles={"a": MAFIA, "b": MAFIA, "c": VILLAGER})
+    assert state.alive_with_role(MAFIA) == ["a", "b"] and state.alive_count(VILLAGER) == 1
+    state.players.remove("a")
+    assert state.alive_with_role(MAFIA) == ["b"]
+    state.roles["d"] = VILLAGER
+    state.roles["b"] = DOCTOR
+    assert (state.alive_count(MAFIA), state.alive_count(VILLAGER), state.alive_count(DOCTOR)) == (0, 2, 1)
+    state.roles.pop("c")
+    assert state.alive_with_role(VILLAGER) == ["d"]
+    # Dead players keep their role but leave the alive index
+    assert state.eliminated() == ["a"]
+
+def test_reassigning_roles_relinks_the_index():
+    state = GameState(host="a", players=["a", "b"], roles={"a": MAFIA})
+    old = state.roles
+    state.roles = {"b": MAFIA}
+    assert isinstance(state.roles, Roles) and state.alive_with_role(MAFIA) == ["b"]
+    old["a"] = DOCTOR  # no longer linked
+    assert state.alive_count(DOCTOR) == 0
+    state.players = ["b", "c"]
+    assert isinstance(state.players, Roster) and state.alive_with_role(MAFIA) == ["b"]
+
+def test_copies_keep_independent_indexes():
+    state = started(8)
+    mafia = holders(state, MAFIA)
+    for other in (state.copy(), copy.deepcopy(state), pickle.loads(pickle.dumps(state))):
+        assert other.alive_with_role(MAFIA) == mafia
+        other.players.remove(mafia[0])
+        assert other.alive_count(MAFIA) == len(mafia) - 1
+        assert state.alive_count(MAFIA) == len(mafia)
+    assert GameState.from_dict(state.to_dict()).alive_with_role(MAFIA) == mafia
+
+@pytest.mark.parametrize("partial", [True, False])
+def test_rejoining_after_a_reset_seats_the_same_live_and_stored(tmp_path, partial):
+    db = SQLiteBackend(str(tmp_path / "test.db"), partial=partial)
+    db.init()
+    db.create_game("g", "p0")
+    live = GameState.new("p0")
+
+    def both(event_type, payload=None):
+        apply_event(live, event_type, payload or {})
+        db.record_event("g", event_type, payload)
+
+    for i in range(1, 6):
+        both(JOIN, {"name": f"p{i}"})
+    both(START, {"seed": 1})
+    victim, mafia = holders(live, VILLAGER)[0], holders(live, MAFIA)[0]
+    for player in holders(live, MAFIA):
+        both(VOTE, {"voter": player, "action": "kill", "target": victim})
+    both(VOTE, {"voter": holders(live, DOCTOR)[0], "action": "save", "target": mafia})
+    both(VOTE, {"voter": holders(live, DETECTIVE)[0], "action": "investigate", "target": mafia})
+    both(NIGHT_RESOLVED)
+    both(RESET)
+    # The night's victim comes back and sits down after everyone else
+    both(JOIN, {"name": victim})
+    assert live.players[-1] == victim
+    assert list(db.load_game("g").players) == list(live.players)
+    db.close()
+
+def test_large_day_vote_eliminates_through_the_index():
+    state = started(300, seed=7)
+    resolve_night(state, force=True)
+    target = holders(state, MAFIA)[0]
+    for player in state.players:
+        submit_action(state, player, "eliminate", target if player != target else state.players[0])
+    resolve_day(state)
+    assert target not in state.players
+    assert state.alive_count(MAFIA) == 99
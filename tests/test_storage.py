@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+
+from engine import JOIN, MAFIA, NIGHT, RESET, START, VILLAGER
+from storage import cache
+from storage.cache import CachedBackend
+from storage.memory import MemoryBackend
+from storage.sqlite import SQLiteBackend
+
+from tests.games import holders
+
+
+def backend(tmp_path, **kwargs):
+    db = SQLiteBackend(str(tmp_path / "test.db"), **kwargs)
+    db.init()
+    return db
+
+@pytest.fixture(params=["tables", "events", "memory"])
+def any_backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return backend(tmp_path, event_sourced=request.param == "events")
+
+def running(db, game_id="g", players=6):
+    db.create_game(game_id, "p0")
+    for i in range(1, players):
+        db.record_event(game_id, JOIN, {"name": f"p{i}"})
+    return db.record_event(game_id, START, {"seed": 1})
+
+def in_threads(count, fn, at_once=1):
+    for start in range(0, count, at_once):
+        threads = [threading.Thread(target=fn) for _ in range(min(at_once, count - start))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+# --- connection pool ---
+def test_pool_reuses_connections_of_finished_threads(tmp_path):
+    db = backend(tmp_path)
+    db.create_game("g", "host")
+    pool = db.pool
+
+    def rerun():
+        db.game_exists("g")
+        db.load_game("g")
+
+    in_threads(200, rerun)
+    in_threads(60, rerun, at_once=20)
+    # The idle connections plus the one this thread still holds
+    assert pool.open_connections() <= pool.size + 1
+    db.close()
+    assert pool.open_connections() == 0
+
+def test_pool_survives_close(tmp_path):
+    db = backend(tmp_path)
+    db.create_game("g", "host")
+    in_threads(5, lambda: db.load_game("g"), at_once=5)
+    db.close()
+    assert db.load_game("g").host == "host"
+    in_threads(5, lambda: db.load_game("g"))
+
+def test_only_new_files_get_incremental_vacuum(tmp_path):
+    db = backend(tmp_path)
+    assert db.connect().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    db.close()
+    # Opening a file in use leaves it alone instead of asking for the lock
+    db = SQLiteBackend(str(tmp_path / "test.db"))
+    in_threads(40, lambda: db.load_game("g"), at_once=40)
+    assert db.connect().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+# --- chat buffer ---
+def chat_game(db, game_id, messages):
+    db.create_game(game_id, "host")
+    for i in range(messages):
+        db.post_message(game_id, "host", "all", f"m{i}")
+
+def test_chat_polls_survive_evictions(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CHAT_REFRESH_SECONDS", 0.0)
+    db = CachedBackend(backend(tmp_path), 2)
+    games = ["a", "b", "c", "d"]
+    for game_id in games:
+        chat_game(db, game_id, 3)
+    errors = []
+
+    def poll():
+        try:
+            for i in range(300):
+                assert len(db.load_messages(games[i % len(games)])) == 3
+        except Exception as e:
+            errors.append(e)
+
+    in_threads(4, poll, at_once=4)
+    assert errors == []
+
+def test_rebuilt_chat_buffer_only_covers_what_it_fetched(tmp_path, monkeypatch):
+    db = CachedBackend(backend(tmp_path), 4)
+    chat_game(db, "g", 3)
+    assert len(db.load_messages("g")) == 3
+    db.post_message("g", "host", "all", "m3")
+    inner = db.backend.load_messages
+
+    def swept_meanwhile(game_id, after_seq=0):
+        db.clear()  # e.g. a sweep between the cache's two looks at the buffer
+        return inner(game_id, after_seq)
+
+    monkeypatch.setattr(cache, "CHAT_REFRESH_SECONDS", 0.0)
+    monkeypatch.setattr(db.backend, "load_messages", swept_meanwhile)
+    assert [m[3] for m in db.load_messages("g", 3)] == ["m3"]
+    monkeypatch.setattr(db.backend, "load_messages", inner)
+    assert [m[3] for m in db.load_messages("g")] == ["m0", "m1", "m2", "m3"]
+
+
+# --- votes ---
+def test_refused_votes_never_land(any_backend):
+    db = any_backend
+    game = running(db)
+    villager, mafia = holders(game, VILLAGER)[0], holders(game, MAFIA)[0]
+    assert not db.submit_vote("g", NIGHT, 1, villager, "kill", mafia)
+    assert not db.submit_vote("g", NIGHT, 1, mafia, "kill", mafia)
+    assert not db.submit_vote("g", NIGHT, 1, "stranger", "kill", villager)
+    assert db.submit_vote("g", NIGHT, 1, mafia, "kill", villager)
+    assert not db.submit_vote("g", NIGHT, 1, mafia, "kill", villager)
+    assert dict(db.load_game("g").votes) == {mafia: {"action": "kill", "target": villager}}
+
+def test_votes_from_before_a_restart_are_refused(any_backend):
+    db = any_backend
+    old = running(db)
+    mafia = holders(old, MAFIA)[0]
+    target = next(p for p in old.players if p != mafia)
+    db.record_event("g", RESET)
+    new = db.record_event("g", START, {"seed": 1})
+    # Same seed, so the same deal, and night 1 again: only the deal tells them apart
+    assert (new.phase, new.day_count, new.deal) == (NIGHT, 1, old.deal + 1)
+    assert not db.submit_vote("g", NIGHT, 1, mafia, "kill", target, old.deal)
+    assert db.submit_vote("g", NIGHT, 1, mafia, "kill", target, new.deal)
+    assert db.load_game("g").deal == new.deal